@@ -0,0 +1,198 @@
+# backend/benchmarks/fixtures.py
+#
+# Benchmark 用的确定性合成音频与离线小模型：
+#   - tones / chords / drums / noise 四类信号，任意时长，同一 seed 结果逐位一致
+#   - tiny_music_generator()：随机初始化的小型 MusicGen（T5 + EnCodec + decoder），
+#     不访问 Hub，只用于测量生成阶段的开销，不代表音质
+
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+FIXTURE_SR = 32000
+FIXTURE_KINDS = ("tones", "chords", "drums", "noise")
+
+# C 大调音阶（MIDI）
+_SCALE = np.array([60, 62, 64, 65, 67, 69, 71, 72])
+
+
+def _midi_to_hz(m):
+    return 440.0 * 2.0 ** ((np.asarray(m, dtype=np.float64) - 69) / 12)
+
+
+def _envelope(n, sr, attack=0.01, release=0.05):
+    env = np.ones(n)
+    a = min(int(attack * sr), n // 2)
+    r = min(int(release * sr), n // 2)
+    if a:
+        env[:a] = np.linspace(0, 1, a)
+    if r:
+        env[-r:] = np.linspace(1, 0, r)
+    return env
+
+
+def tones(seconds, sr=FIXTURE_SR, seed=0, note_seconds=0.5):
+    """单音旋律：音阶内随机走音，每个音带少量泛音"""
+    rng = np.random.default_rng(seed)
+    n_note = int(note_seconds * sr)
+    total = int(seconds * sr)
+    out = np.zeros(total)
+    t = np.arange(n_note) / sr
+    for start in range(0, total, n_note):
+        f = _midi_to_hz(_SCALE[rng.integers(len(_SCALE))])
+        note = sum(np.sin(2 * np.pi * f * k * t) / k for k in (1, 2, 3))
+        seg = (note * _envelope(n_note, sr))[: total - start]
+        out[start:start + len(seg)] = seg
+    return (0.3 * out / np.max(np.abs(out))).astype(np.float32)
+
+
+def chords(seconds, sr=FIXTURE_SR, seed=0, chord_seconds=2.0):
+    """三和弦进行（I–V–vi–IV 循环，随机转位）"""
+    rng = np.random.default_rng(seed)
+    progression = [(60, 64, 67), (67, 71, 74), (69, 72, 76), (65, 69, 72)]
+    n_chord = int(chord_seconds * sr)
+    total = int(seconds * sr)
+    out = np.zeros(total)
+    t = np.arange(n_chord) / sr
+    for i, start in enumerate(range(0, total, n_chord)):
+        notes = np.array(progression[i % len(progression)]) - 12 * rng.integers(0, 2)
+        chord = sum(np.sin(2 * np.pi * f * t) for f in _midi_to_hz(notes))
+        seg = (chord * _envelope(n_chord, sr, release=0.2))[: total - start]
+        out[start:start + len(seg)] = seg
+    return (0.3 * out / np.max(np.abs(out))).astype(np.float32)
+
+
+def drums(seconds, sr=FIXTURE_SR, seed=0, bpm=120):
+    """鼓 loop：kick（1、3 拍）、snare（2、4 拍）、八分音符 hi-hat"""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sr)
+    out = np.zeros(total)
+    beat = int(60 / bpm * sr)
+
+    n = int(0.25 * sr)
+    t = np.arange(n) / sr
+    kick = np.sin(2 * np.pi * (50 + 100 * np.exp(-t * 30)) * t) * np.exp(-t * 12)
+    snare = rng.standard_normal(n) * np.exp(-t * 25) * 0.6
+    hat = rng.standard_normal(n // 8) * np.exp(-np.arange(n // 8) / sr * 80) * 0.3
+
+    def add(sample, pos):
+        seg = sample[: total - pos]
+        out[pos:pos + len(seg)] += seg
+
+    for i, pos in enumerate(range(0, total, beat)):
+        add(kick if i % 2 == 0 else snare, pos)
+        add(hat, pos)
+        if pos + beat // 2 < total:
+            add(hat, pos + beat // 2)
+    return (0.5 * out / np.max(np.abs(out))).astype(np.float32)
+
+
+def noise(seconds, sr=FIXTURE_SR, seed=0):
+    """低电平粉红噪声（1/f 频谱整形）"""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sr)
+    spec = np.fft.rfft(rng.standard_normal(total))
+    freqs = np.fft.rfftfreq(total, 1 / sr)
+    spec[1:] /= np.sqrt(freqs[1:])
+    out = np.fft.irfft(spec, n=total)
+    return (0.1 * out / np.max(np.abs(out))).astype(np.float32)
+
+
+GENERATORS = {"tones": tones, "chords": chords, "drums": drums, "noise": noise}
+
+
+def make_fixture(kind, seconds, sr=FIXTURE_SR, seed=0):
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown fixture: {kind}")
+    return GENERATORS[kind](seconds, sr=sr, seed=seed)
+
+
+def write_fixtures(out_dir, kinds=FIXTURE_KINDS, lengths=(5.0, 30.0), sr=FIXTURE_SR, seed=0):
+    """写出 wav，返回 {(kind, seconds): path}"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for kind in kinds:
+        for seconds in lengths:
+            path = out_dir / f"{kind}_{seconds:g}s.wav"
+            sf.write(str(path), make_fixture(kind, seconds, sr=sr, seed=seed), sr)
+            paths[(kind, seconds)] = path
+    return paths
+
+
+# ============================================================
+# Tiny MusicGen（离线、随机初始化）
+# ============================================================
+def tiny_music_generator(sr=FIXTURE_SR, seed=0, precision=None):
+    """
+    结构与 musicgen-small 相同、尺寸极小的 MusicGen
+        - EnCodec：32kHz、hop 640（50Hz）、4 个 codebook × 64
+        - decoder：2 层、hidden 32
+        - T5 encoder：1 层，WordLevel 小词表（其余词映射到 <unk>）
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import (
+        EncodecConfig,
+        EncodecFeatureExtractor,
+        MusicgenConfig,
+        MusicgenDecoderConfig,
+        MusicgenForConditionalGeneration,
+        MusicgenProcessor,
+        T5Config,
+        T5TokenizerFast,
+    )
+
+    from backend.inference.generate_music import MusicGenerator
+
+    torch.manual_seed(seed)
+
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2}
+    for word in "a an and with the music rock pop jazz classical happy sad calm energetic "\
+                "guitar piano drums bass melody slow fast bright dark".split():
+        vocab.setdefault(word, len(vocab))
+    tok = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = T5TokenizerFast(
+        tokenizer_object=tok, pad_token="<pad>", eos_token="</s>", unk_token="<unk>", extra_ids=0,
+    )
+
+    codebook_size, num_codebooks = 64, 4
+    text_config = T5Config(
+        vocab_size=len(vocab), d_model=32, d_kv=8, d_ff=64, num_layers=1, num_heads=4,
+    )
+    audio_config = EncodecConfig(
+        sampling_rate=sr,
+        audio_channels=1,
+        target_bandwidths=[2.2],   # 2200 // (50Hz * 10) = 4 个 codebook
+        upsampling_ratios=[8, 5, 4, 4],
+        hidden_size=32,
+        codebook_dim=32,
+        codebook_size=codebook_size,
+        num_filters=4,
+        num_residual_layers=1,
+        num_lstm_layers=1,
+    )
+    decoder_config = MusicgenDecoderConfig(
+        vocab_size=codebook_size,
+        num_codebooks=num_codebooks,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        ffn_dim=64,
+        max_position_embeddings=4096,
+        pad_token_id=codebook_size,
+        bos_token_id=codebook_size,
+    )
+    config = MusicgenConfig.from_sub_models_config(text_config, audio_config, decoder_config)
+    model = MusicgenForConditionalGeneration(config)
+    model.generation_config.decoder_start_token_id = codebook_size
+    model.generation_config.pad_token_id = codebook_size
+    model.generation_config.bos_token_id = codebook_size
+
+    processor = MusicgenProcessor(
+        feature_extractor=EncodecFeatureExtractor(feature_size=1, sampling_rate=sr, padding_value=0.0),
+        tokenizer=tokenizer,
+    )
+    return MusicGenerator.from_components(model, processor, device="cpu", precision=precision)
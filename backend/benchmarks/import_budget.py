@@ -0,0 +1,99 @@
+# backend/benchmarks/import_budget.py
+#
+# 导入耗时预算检查（python -X importtime）：
+#   - 目标模块的累计导入耗时不超过预算
+#   - 禁止在导入阶段拉进的重型依赖（TensorFlow / torch / transformers …）
+#   - librosa（连同 numba / scipy）允许在导入阶段加载，但计入预算并单独列出耗时：
+#     分析路径的每个请求都要用它解码 / 重采样（AudioAsset）并计算特征（style_engine、
+#     transform_cache 在模块级读取 librosa 的默认参数），延迟导入只会把同样的耗时
+#     挪到第一次请求上；常驻服务在 preload 阶段本来就会付出这部分开销。
+#     --librosa-budget-ms 可单独限制它的耗时，防止其依赖链变重时不被察觉。
+# 任一检查失败时退出码为 1，可直接放进 CI。
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.import_budget
+#   python -m backend.benchmarks.import_budget --budget-ms 3000
+#   python -m backend.benchmarks.import_budget --librosa-budget-ms 2000
+
+import argparse
+import subprocess
+import sys
+
+HEAVY_MODULES = ("tensorflow", "tensorflow_hub", "torch", "transformers")
+# 允许在导入阶段加载、但单独统计耗时的依赖（见文件头说明）
+ACCOUNTED_MODULES = ("librosa",)
+
+# 模块 → 导入阶段禁止出现的重型依赖
+TARGETS = {
+    "backend.inference.analyze": HEAVY_MODULES,
+    "backend.inference.style_recognition": HEAVY_MODULES,
+    "backend.inference.emotion_recognition": HEAVY_MODULES,
+    "backend.inference.full_pipeline": HEAVY_MODULES,
+    "backend.inference.evaluate_generated": HEAVY_MODULES,
+}
+
+
+def measure_import(module):
+    """返回 ({模块名: 累计微秒}, 目标模块累计微秒)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+
+    imported = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1].strip())
+        except ValueError:
+            continue  # 表头
+        imported[parts[2].strip()] = cumulative
+    return imported, imported.get(module, 0)
+
+
+def check(budget_ms, librosa_budget_ms=None):
+    failures = []
+    accounted_header = " ".join(f"{m + '(ms)':>13}" for m in ACCOUNTED_MODULES)
+    print(f"{'module':<42} {'import(ms)':>10} {accounted_header}  heavy")
+    for module, forbidden in TARGETS.items():
+        imported, total_us = measure_import(module)
+        heavy = sorted(m for m in imported if m.split(".")[0] in forbidden and "." not in m)
+        # 顶层包的累计耗时已包含在 total_us 中；未出现表示该依赖已被更早的导入加载或未被导入
+        accounted = {m: imported.get(m, 0) / 1000 for m in ACCOUNTED_MODULES}
+        print(f"{module:<42} {total_us / 1000:>10.1f} "
+              + " ".join(f"{accounted[m]:>13.1f}" for m in ACCOUNTED_MODULES)
+              + f"  {', '.join(heavy) or '-'}")
+
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+        if total_us / 1000 > budget_ms:
+            failures.append(f"{module} import took {total_us / 1000:.0f} ms > {budget_ms} ms")
+        if librosa_budget_ms is not None and accounted["librosa"] > librosa_budget_ms:
+            failures.append(
+                f"{module}: librosa import took {accounted['librosa']:.0f} ms > {librosa_budget_ms} ms"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--budget-ms", type=float, default=5000.0, help="每个模块的总导入耗时（含 librosa）")
+    parser.add_argument("--librosa-budget-ms", type=float, default=None, help="librosa 导入耗时上限（默认不单独限制）")
+    args = parser.parse_args()
+
+    failures = check(args.budget_ms, args.librosa_budget_ms)
+    if failures:
+        print("\n❌ Import budget exceeded:")
+        for f in failures:
+            print("  -", f)
+        sys.exit(1)
+    print("\n✅ Import budget OK")
+
+
+if __name__ == "__main__":
+    main()
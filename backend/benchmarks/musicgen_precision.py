@@ -0,0 +1,174 @@
+# backend/benchmarks/musicgen_precision.py
+#
+# MusicGen CPU 精度模式对比（fp32 / bf16 / int8）：
+#   - 加载耗时、生成耗时、tokens/sec
+#   - 峰值 RSS（每个模式在独立子进程中运行，互不干扰）
+#   - 音质代理：以 fp32 输出为 "原曲"，compute_final_score 与 JS 散度
+#     （JS 越小 / 风格情绪分布越接近 fp32 越好）
+# 旋律 prompt 与 pipeline 相同：MelodyExtractor.extract_melody 取最佳 5 秒窗口
+# （--prompt crop 时直接截取开头 5 秒），上下文长度与线上一致。
+# MusicGen 的输出包含 prompt 音频本身，音质代理只比较 prompt 之后新生成的部分。
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.musicgen_precision --modes fp32 bf16 int8 --seconds 8 --json prec.json
+#   python -m backend.benchmarks.musicgen_precision --source some_song.wav --prompt crop
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROMPT = "energetic rock with distorted electric guitars and punchy drums"
+PROMPT_SECONDS = 5.0      # 与 MelodyExtractor.window_seconds 一致
+
+
+def _peak_rss_mb():
+    # Linux: KB；macOS: bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def build_melody_prompt(source, prompt_mode, out_dir, target_style, target_emotion):
+    """按 pipeline 的方式构造旋律 prompt（5 秒、32 kHz），写入 out_dir 并返回路径"""
+    import soundfile as sf
+    from backend.inference.melody_extractor import MelodyExtractor
+    from backend.utils.audio_asset import AudioAsset
+
+    if prompt_mode == "extract":
+        mel, sr = MelodyExtractor().extract_melody(
+            source, target_style=target_style, target_emotion=target_emotion, strength=0.9,
+        )
+    else:
+        y, sr = AudioAsset(source).load(32000)
+        mel = y[: int(PROMPT_SECONDS * sr)]
+
+    path = Path(out_dir) / "melody_prompt.wav"
+    sf.write(str(path), mel, sr)
+    print(f"🎼 Melody prompt: {path} ({len(mel) / sr:.1f}s, {prompt_mode})")
+    return str(path)
+
+
+def run_worker(mode, melody, seconds, out_dir, seed):
+    """子进程：加载指定精度的模型并生成一次，结果以 JSON 打印到 stdout 最后一行"""
+    import soundfile as sf
+    import torch
+    from backend.inference.generate_music import MusicGenerator
+
+    t0 = time.perf_counter()
+    gen = MusicGenerator(precision=mode)
+    load_seconds = time.perf_counter() - t0
+
+    max_new_tokens = int(seconds / gen.seconds_per_token)
+    output = Path(out_dir) / f"precision_{mode}.wav"
+    continuation = Path(out_dir) / f"precision_{mode}_continuation.wav"
+    prompt_samples = len(gen._load_melody(melody)[0])
+
+    torch.manual_seed(seed)
+    t0 = time.perf_counter()
+    audio = gen.generate_with_melody(
+        prompt=PROMPT,
+        melody_path=melody,
+        output_path=None,
+        max_new_tokens=max_new_tokens,
+    )
+    gen_seconds = time.perf_counter() - t0
+
+    # 输出 = prompt 音频 + 新生成部分；音质代理只看后者
+    sf.write(str(output), audio, 32000)
+    sf.write(str(continuation), audio[prompt_samples:], 32000)
+
+    print(json.dumps({
+        "mode": mode,
+        "effective_precision": gen.precision,
+        "load_seconds": load_seconds,
+        "generate_seconds": gen_seconds,
+        "tokens_per_second": max_new_tokens / gen_seconds,
+        "peak_rss_mb": _peak_rss_mb(),
+        "prompt_seconds": prompt_samples / 32000,
+        "output": str(output),
+        "continuation": str(continuation),
+    }))
+
+
+def compare_quality(rows, target_style, target_emotion):
+    from scipy.spatial.distance import jensenshannon
+    import numpy as np
+    from backend.inference.analyze import analyzer
+    from backend.inference.full_pipeline import compute_final_score
+
+    ref = next((r for r in rows if r["mode"] == "fp32"), None)
+    if ref is None:
+        return
+    ref_res = analyzer.analyze(ref["continuation"])
+    for r in rows:
+        res = analyzer.analyze(r["continuation"])
+        score = compute_final_score(ref_res, res, target_style, target_emotion)
+        r["score_vs_fp32"] = score["total"]
+        r["js_vs_fp32"] = float((
+            jensenshannon(np.array(list(ref_res["style_prob"].values())),
+                          np.array(list(res["style_prob"].values())))
+            + jensenshannon(np.array(list(ref_res["emotion_prob"].values())),
+                            np.array(list(res["emotion_prob"].values())))
+        ) / 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MusicGen CPU precision benchmark")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--source", default="backend/test_audio.wav", help="提取旋律 prompt 的源音频")
+    parser.add_argument("--prompt", choices=["extract", "crop"], default="extract",
+                        help="extract：MelodyExtractor 最佳窗口（同 pipeline）；crop：截取开头 5 秒")
+    parser.add_argument("--melody", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--out-dir", default="backend/output/bench_precision")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target-style", default="rock")
+    parser.add_argument("--target-emotion", default="happy")
+    parser.add_argument("--json", default=None)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+
+    if args.worker:
+        run_worker(args.worker, args.melody, args.seconds, args.out_dir, args.seed)
+        return
+
+    melody = build_melody_prompt(args.source, args.prompt, args.out_dir, args.target_style, args.target_emotion)
+
+    rows = []
+    for mode in args.modes:
+        print(f"▶ Running {mode} …")
+        proc = subprocess.run(
+            [sys.executable, "-m", "backend.benchmarks.musicgen_precision",
+             "--worker", mode, "--melody", melody, "--seconds", str(args.seconds),
+             "--out-dir", args.out_dir, "--seed", str(args.seed)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"❌ {mode} failed:\n{proc.stderr}")
+            continue
+        rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    compare_quality(rows, args.target_style, args.target_emotion)
+
+    print("\n==============================")
+    print("   MusicGen Precision")
+    print("==============================\n")
+    print(f"{'mode':>5} {'eff':>5} {'load(s)':>8} {'gen(s)':>8} {'tok/s':>7} {'RSS(MB)':>8} {'score':>6} {'JS':>6}")
+    for r in rows:
+        print(f"{r['mode']:>5} {r['effective_precision']:>5} {r['load_seconds']:>8.2f} "
+              f"{r['generate_seconds']:>8.2f} {r['tokens_per_second']:>7.1f} {r['peak_rss_mb']:>8.0f} "
+              f"{r.get('score_vs_fp32', float('nan')):>6.0f} {r.get('js_vs_fp32', float('nan')):>6.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# backend/benchmarks/pitch_trackers.py
+#
+# f0 后端的精度 / 速度对比（以 pyin 为参照），用于按部署档位选择 MELODY_PITCH_TRACKER：
+#   - 每段 f0 追踪耗时（中位数）与相对 pyin 的加速比
+#   - hook / contour / scale / 总分 与 pyin 的平均绝对差
+#   - voicing 一致率、双方都有声帧的音高误差中位数（cents）
+# 语料：合成单音旋律（fixtures.tones，不同 seed，可叠加噪声），可另加真实音频。
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.pitch_trackers --clips 8 --snr 20
+#   python -m backend.benchmarks.pitch_trackers some_dir/ --trackers pyin yin+ds autocorr+ds
+
+import argparse
+import json
+import statistics
+import time
+
+import librosa
+import numpy as np
+
+from backend.benchmarks.fixtures import tones
+from backend.benchmarks.window_search_report import collect_corpus
+from backend.features.pitch_tracker import tracker_specs
+from backend.inference.melody_scorer import MelodyScorer
+from backend.utils.audio_asset import AudioAsset
+
+SCORES = ("hook", "contour", "scale", "total")
+
+
+def build_corpus(n_clips, seconds, sr, snr_db, inputs):
+    """[(name, clip)]：合成旋律（可加白噪声）+ 真实音频的前 seconds 秒"""
+    corpus = []
+    for seed in range(n_clips):
+        y = tones(seconds, sr=sr, seed=seed)
+        if snr_db is not None:
+            rng = np.random.default_rng(1000 + seed)
+            noise_rms = np.sqrt(np.mean(y ** 2)) / (10 ** (snr_db / 20))
+            y = (y + noise_rms * rng.standard_normal(len(y))).astype(np.float32)
+        corpus.append((f"tones_seed{seed}", y))
+    for path in collect_corpus(inputs):
+        y, _ = AudioAsset(str(path)).load(sr)
+        corpus.append((str(path), y[: int(seconds * sr)]))
+    return corpus
+
+
+def _scores(scorer, f0, onset_env, sr):
+    return {
+        "hook": scorer.hook_score(f0),
+        "contour": scorer.contour_score(f0),
+        "scale": scorer.scale_score(f0),
+        "total": scorer.score_features(f0, onset_env, sr),
+    }
+
+
+def _cents_error(f0, ref):
+    both = ~np.isnan(f0) & ~np.isnan(ref)
+    if not both.any():
+        return float("nan")
+    return float(np.median(np.abs(1200 * np.log2(f0[both] / ref[both]))))
+
+
+def run(specs, corpus, sr, repeat):
+    onsets = [librosa.onset.onset_strength(y=y, sr=sr) for _, y in corpus]
+
+    per_tracker = {}
+    for spec in specs:
+        scorer = MelodyScorer(pitch_tracker=spec)
+        scorer._extract_f0(corpus[0][1], sr)     # 预热（numba JIT 等）
+
+        f0s, times = [], []
+        for _, y in corpus:
+            elapsed = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                f0 = scorer._extract_f0(y, sr)
+                elapsed.append(time.perf_counter() - t0)
+            f0s.append(f0)
+            times.append(statistics.median(elapsed))
+
+        per_tracker[spec] = {
+            "f0": f0s,
+            "seconds": statistics.median(times),
+            "scores": [_scores(scorer, f0, env, sr) for f0, env in zip(f0s, onsets)],
+        }
+
+    ref = per_tracker["pyin"]
+    rows = []
+    for spec in specs:
+        r = per_tracker[spec]
+        row = {
+            "tracker": spec,
+            "seconds": r["seconds"],
+            "speedup": ref["seconds"] / r["seconds"] if r["seconds"] > 0 else float("inf"),
+            "voicing_agreement": float(np.mean([
+                np.mean(np.isnan(f0) == np.isnan(f0_ref)) for f0, f0_ref in zip(r["f0"], ref["f0"])
+            ])),
+            "median_cents": float(np.nanmedian([_cents_error(f0, f0_ref) for f0, f0_ref in zip(r["f0"], ref["f0"])])),
+        }
+        for name in SCORES:
+            row[f"{name}_mad"] = float(np.mean([
+                abs(s[name] - s_ref[name]) for s, s_ref in zip(r["scores"], ref["scores"])
+            ]))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pitch tracker accuracy vs speed")
+    parser.add_argument("inputs", nargs="*", help="额外的真实音频文件或目录")
+    parser.add_argument("--trackers", nargs="+", default=tracker_specs(), choices=tracker_specs())
+    parser.add_argument("--clips", type=int, default=8, help="合成旋律段数")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每段时长（与窗口长度一致）")
+    parser.add_argument("--sr", type=int, default=32000)
+    parser.add_argument("--snr", type=float, default=None, help="叠加白噪声的信噪比（dB）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    specs = ["pyin"] + [s for s in args.trackers if s != "pyin"]
+    corpus = build_corpus(args.clips, args.seconds, args.sr, args.snr, args.inputs)
+    rows = run(specs, corpus, args.sr, args.repeat)
+
+    print("\n==============================")
+    print("   Pitch Tracker Comparison")
+    print("==============================\n")
+    print(f"{len(corpus)} clips × {args.seconds:g}s @ {args.sr} Hz (reference: pyin)\n")
+    print(f"{'tracker':<12} {'ms/clip':>8} {'speedup':>8} {'voicing':>8} {'cents':>7} "
+          + " ".join(f"{'Δ' + n:>8}" for n in SCORES))
+    for r in sorted(rows, key=lambda r: r["seconds"]):
+        print(f"{r['tracker']:<12} {r['seconds'] * 1000:>8.1f} {r['speedup']:>7.1f}x "
+              f"{r['voicing_agreement']:>8.1%} {r['median_cents']:>7.1f} "
+              + " ".join(f"{r[n + '_mad']:>8.3f}" for n in SCORES))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# backend/benchmarks/stages.py
+#
+# 分阶段 benchmark（合成音频，见 fixtures.py）：
+#   decode → extract_style_features → extract_yamnet_embedding
+#   → MelodyExtractor._find_best_window → MelodyScorer.score
+#   → MelodyTransformer.transform_array → MusicGenerator.generate_with_melody（离线小模型）
+#
+# 每个 (阶段, 音频) 记录：
+#   - wall time：预热 1 次后重复 --repeat 次，取中位数 / 最小值
+#   - 峰值内存：单独跑 1 次，tracemalloc 峰值（Python / numpy 分配）+ ru_maxrss 增量
+#     （torch / TF 的原生分配不经过 tracemalloc，只体现在 ru_maxrss 中）
+# 特征缓存在 benchmark 期间关闭。
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.stages run --lengths 5 30 --json bench.json
+#   python -m backend.benchmarks.stages compare baseline.json bench.json --threshold 0.15
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+STAGES = ("decode", "style_features", "yamnet_embedding", "find_best_window",
+          "melody_score", "melody_transform", "musicgen_generate")
+
+
+def _peak_rss_mb():
+    # Linux: KB；macOS: bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(fn, repeat=3):
+    """预热 1 次；repeat 次计时；再单独 1 次 tracemalloc 测峰值"""
+    fn()
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    rss0 = _peak_rss_mb()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_median": statistics.median(times),
+        "wall_min": min(times),
+        "peak_traced_mb": peak / (1024 * 1024),
+        "rss_growth_mb": _peak_rss_mb() - rss0,
+    }
+
+
+# ============================================================
+# Stages
+# ============================================================
+def build_stages(stages, work_dir, gen_tokens):
+    """返回 {stage: fn(path) → 可调用的单次运行}；依赖缺失的阶段在运行时报错并记录"""
+    import numpy as np
+
+    from backend.utils.audio_asset import AudioAsset
+
+    fns = {}
+
+    if "decode" in stages:
+        fns["decode"] = lambda path: (lambda: AudioAsset(path).load(32000))
+
+    if "style_features" in stages:
+        from backend.inference.style_recognition import extract_style_features
+
+        def style_features(path):
+            asset = AudioAsset(path)
+            asset.native()
+            return lambda: extract_style_features(AudioAsset.from_array(*asset.native()))
+        fns["style_features"] = style_features
+
+    if "yamnet_embedding" in stages:
+        from backend.features.yamnet_extract import extract_yamnet_embedding, load_yamnet
+
+        def yamnet_embedding(path):
+            load_yamnet().warmup()
+            asset = AudioAsset(path)
+            asset.native()
+            return lambda: extract_yamnet_embedding(AudioAsset.from_array(*asset.native()))
+        fns["yamnet_embedding"] = yamnet_embedding
+
+    if {"find_best_window", "melody_score"} & set(stages):
+        from backend.inference.melody_extractor import MelodyExtractor
+        extractor = MelodyExtractor()
+
+        def find_best_window(path):
+            y, sr = AudioAsset(path).load(extractor.target_sr)
+            return lambda: extractor._find_best_window(y, sr)
+
+        def melody_score(path):
+            y, sr = AudioAsset(path).load(extractor.target_sr)
+            clip = y[: int(extractor.window_seconds * sr)]
+            return lambda: extractor.scorer.score(clip, sr)
+
+        if "find_best_window" in stages:
+            fns["find_best_window"] = find_best_window
+        if "melody_score" in stages:
+            fns["melody_score"] = melody_score
+
+    if "melody_transform" in stages:
+        from backend.inference.melody_transformer import MelodyTransformer
+        transformer = MelodyTransformer()
+
+        def melody_transform(path):
+            y, sr = AudioAsset(path).load(transformer.target_sr)
+
+            def run():
+                np.random.seed(0)
+                transformer.transform_array(y, sr, attempt=2)
+            return run
+        fns["melody_transform"] = melody_transform
+
+    if "musicgen_generate" in stages:
+        from backend.benchmarks.fixtures import tiny_music_generator
+        state = {}
+
+        def musicgen_generate(path):
+            import torch
+
+            if "gen" not in state:
+                state["gen"] = tiny_music_generator()
+            gen = state["gen"]
+            out = Path(work_dir) / f"gen_{Path(path).stem}.wav"
+
+            def run():
+                torch.manual_seed(0)
+                gen.generate_with_melody(
+                    prompt="happy rock music with guitar and drums",
+                    melody_path=str(path),
+                    output_path=str(out),
+                    max_new_tokens=gen_tokens,
+                )
+            return run
+        fns["musicgen_generate"] = musicgen_generate
+
+    return fns
+
+
+def run(args):
+    from backend.benchmarks.fixtures import write_fixtures
+    from backend.utils.feature_cache import set_feature_cache
+
+    set_feature_cache(None)
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="music_bench_"))
+    fixtures = write_fixtures(work_dir / "fixtures", kinds=args.kinds, lengths=args.lengths, seed=args.seed)
+
+    results = {}
+    for stage in args.stages:
+        try:
+            make = build_stages([stage], work_dir, args.gen_tokens)[stage]
+        except Exception as e:
+            print(f"⚠ {stage}: unavailable ({e!r})")
+            results[stage] = {"error": repr(e)}
+            continue
+
+        # 生成阶段很慢，只跑最短的音频
+        lengths = [min(args.lengths)] if stage == "musicgen_generate" else args.lengths
+        for (kind, seconds), path in fixtures.items():
+            if seconds not in lengths:
+                continue
+            name = f"{stage}/{kind}_{seconds:g}s"
+            try:
+                results[name] = measure(make(path), repeat=args.repeat)
+            except Exception as e:
+                print(f"⚠ {name}: failed ({e!r})")
+                results[name] = {"error": repr(e)}
+                continue
+            r = results[name]
+            print(f"{name:<40} {r['wall_median'] * 1000:>10.1f} ms  "
+                  f"{r['peak_traced_mb']:>8.1f} MB  (+{r['rss_growth_mb']:.0f} MB RSS)")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved: {args.json}")
+    return report
+
+
+# ============================================================
+# Compare
+# ============================================================
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        base = json.load(f)["results"]
+    with open(args.current, encoding="utf-8") as f:
+        cur = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'stage':<40} {'base(ms)':>10} {'cur(ms)':>10} {'Δtime':>8} {'base(MB)':>9} {'cur(MB)':>9} {'Δmem':>8}")
+    for name in sorted(set(base) | set(cur)):
+        b, c = base.get(name), cur.get(name)
+        if not b or not c or "error" in b or "error" in c:
+            print(f"{name:<40} {'(missing or failed)':>30}")
+            continue
+
+        dt = c["wall_median"] / b["wall_median"] - 1 if b["wall_median"] > 0 else 0.0
+        dm = c["peak_traced_mb"] / b["peak_traced_mb"] - 1 if b["peak_traced_mb"] > 0 else 0.0
+        flag = ""
+        if dt > args.threshold:
+            regressions.append(f"{name}: time {dt:+.0%}")
+            flag += " ⏱"
+        if dm > args.mem_threshold:
+            regressions.append(f"{name}: memory {dm:+.0%}")
+            flag += " 🧠"
+        print(f"{name:<40} {b['wall_median'] * 1000:>10.1f} {c['wall_median'] * 1000:>10.1f} {dt:>+8.0%} "
+              f"{b['peak_traced_mb']:>9.1f} {c['peak_traced_mb']:>9.1f} {dm:>+8.0%}{flag}")
+
+    if regressions:
+        print("\n❌ Regressions:")
+        for r in regressions:
+            print("  -", r)
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level benchmark with synthetic fixtures")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="运行 benchmark")
+    p_run.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    p_run.add_argument("--kinds", nargs="+", default=["tones", "chords", "drums", "noise"])
+    p_run.add_argument("--lengths", type=float, nargs="+", default=[5.0, 30.0])
+    p_run.add_argument("--repeat", type=int, default=3)
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--gen-tokens", type=int, default=50, help="小模型生成的 token 数")
+    p_run.add_argument("--work-dir", default=None, help="fixtures 与中间文件目录（默认临时目录）")
+    p_run.add_argument("--json", default=None)
+
+    p_cmp = sub.add_parser("compare", help="与 baseline 对比，超出阈值退出码 1")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=0.15, help="耗时回退阈值（相对）")
+    p_cmp.add_argument("--mem-threshold", type=float, default=0.25, help="内存回退阈值（相对）")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
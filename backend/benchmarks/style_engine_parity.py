@@ -0,0 +1,114 @@
+# backend/benchmarks/style_engine_parity.py
+#
+# 共享 STFT 引擎 vs 原实现（legacy）的 68 维风格特征一致性：
+#   - 逐维相对误差（按特征组汇总：tempo / rms / centroid / chroma / mel / contrast / tonnetz）
+#   - style_model 的 argmax 标签是否一致、概率最大差
+#   - 两种引擎的耗时
+# 任一文件超出容差时退出码为 1。
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.style_engine_parity backend/test_audio.wav some_dir/
+#   python -m backend.benchmarks.style_engine_parity --synthetic 5 30
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from backend.benchmarks.window_search_report import collect_corpus
+from backend.utils.audio_asset import AudioAsset
+
+GROUPS = {
+    "tempo": slice(0, 1),
+    "rms": slice(1, 2),
+    "centroid": slice(2, 3),
+    "chroma": slice(3, 15),
+    "mel": slice(15, 55),
+    "contrast": slice(55, 62),
+    "tonnetz": slice(62, 68),
+}
+
+
+def _timed(fn, asset):
+    t0 = time.perf_counter()
+    out = fn(asset)
+    return out, time.perf_counter() - t0
+
+
+def compare_file(path, rtol, atol):
+    from backend.inference.style_recognition import (
+        _compute_style_features,
+        _compute_style_features_shared,
+    )
+
+    asset = AudioAsset(str(path))
+    asset.native()
+    legacy, t_legacy = _timed(_compute_style_features, asset)
+    shared, t_shared = _timed(_compute_style_features_shared, asset)
+    legacy, shared = legacy.reshape(-1), shared.reshape(-1)
+
+    rel = np.abs(shared - legacy) / np.maximum(np.abs(legacy), 1e-8)
+    row = {
+        "file": str(path),
+        "legacy_seconds": t_legacy,
+        "shared_seconds": t_shared,
+        "max_rel": {name: float(rel[s].max()) for name, s in GROUPS.items()},
+    }
+    # tonnetz 等接近 0 的维度相对误差没有意义，判定用 rtol + atol
+    row["ok"] = bool(np.allclose(shared, legacy, rtol=rtol, atol=atol))
+
+    try:
+        from backend.inference.style_recognition import _style_model
+
+        probs = _style_model().predict_proba(np.stack([legacy, shared]))
+        row["label_match"] = bool(np.argmax(probs[0]) == np.argmax(probs[1]))
+        row["max_prob_diff"] = float(np.max(np.abs(probs[0] - probs[1])))
+        row["ok"] = row["ok"] and row["label_match"]
+    except Exception as e:
+        row["model_error"] = repr(e)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-STFT style feature parity check")
+    parser.add_argument("inputs", nargs="*", help="音频文件或目录")
+    parser.add_argument("--synthetic", type=float, nargs="*", default=None,
+                        help="额外生成指定时长（秒）的合成音频（tones / chords / drums / noise）")
+    parser.add_argument("--rtol", type=float, default=1e-3, help="逐维相对误差容差")
+    parser.add_argument("--atol", type=float, default=1e-4, help="逐维绝对误差容差")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    files = collect_corpus(args.inputs)
+    if args.synthetic:
+        from backend.benchmarks.fixtures import write_fixtures
+        files += list(write_fixtures(tempfile.mkdtemp(prefix="style_parity_"), lengths=args.synthetic).values())
+    if not files:
+        parser.error("no input audio")
+
+    rows = [compare_file(f, args.rtol, args.atol) for f in files]
+
+    print("\n==============================")
+    print("   Style Engine Parity")
+    print("==============================\n")
+    print(f"{'file':<32} {'legacy(s)':>9} {'shared(s)':>9} {'worst group':>18} {'label':>6}")
+    for r in rows:
+        worst = max(r["max_rel"], key=r["max_rel"].get)
+        label = {True: "same", False: "DIFF"}.get(r.get("label_match"), "-")
+        print(f"{r['file'][-32:]:<32} {r['legacy_seconds']:>9.2f} {r['shared_seconds']:>9.2f} "
+              f"{worst:>9} {r['max_rel'][worst]:>8.1e} {label:>6} {'✅' if r['ok'] else '❌'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+    if not all(r["ok"] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# backend/benchmarks/tonality_check.py
+#
+# 向量化调性引擎 vs 原逐主音循环：
+#   - 整曲调性是否一致（同一份 chroma，两种打分方式）
+#   - 打分耗时（不含 CQT）、单首 vs 批量矩阵乘
+#   - 逐帧时间线的段数（--smooth 秒平滑）
+# 任一文件调性不一致时退出码为 1。
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.tonality_check backend/test_audio.wav some_dir/
+#   python -m backend.benchmarks.tonality_check --synthetic 5 30 --smooth 4
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import librosa
+import numpy as np
+
+from backend.benchmarks.window_search_report import collect_corpus
+from backend.features.tonality import (
+    KeyAnalysis,
+    MAJOR_PROFILE,
+    MINOR_PROFILE,
+    PITCH_NAMES,
+    keys_from_chroma_batch,
+    score_keys,
+)
+from backend.utils.audio_asset import AudioAsset
+
+
+def legacy_key(chroma):
+    """原 MelodyExtractor._detect_key 的打分循环"""
+    chroma_mean = np.mean(chroma, axis=1)
+    chroma_mean /= np.linalg.norm(chroma_mean) + 1e-9
+    major = MAJOR_PROFILE / np.linalg.norm(MAJOR_PROFILE)
+    minor = MINOR_PROFILE / np.linalg.norm(MINOR_PROFILE)
+
+    best, tonic, mode = -1, 0, "major"
+    for t in range(12):
+        if np.dot(chroma_mean, np.roll(major, t)) > best:
+            best, tonic, mode = np.dot(chroma_mean, np.roll(major, t)), t, "major"
+        if np.dot(chroma_mean, np.roll(minor, t)) > best:
+            best, tonic, mode = np.dot(chroma_mean, np.roll(minor, t)), t, "minor"
+    return f"{PITCH_NAMES[tonic]} {mode}"
+
+
+def _timed(fn, repeat=20):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized tonality engine check")
+    parser.add_argument("inputs", nargs="*", help="音频文件或目录")
+    parser.add_argument("--synthetic", type=float, nargs="*", default=None,
+                        help="额外生成指定时长（秒）的合成音频")
+    parser.add_argument("--sr", type=int, default=32000)
+    parser.add_argument("--smooth", type=float, default=4.0, help="时间线平滑窗口（秒）")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    files = collect_corpus(args.inputs)
+    if args.synthetic:
+        from backend.benchmarks.fixtures import write_fixtures
+        files += list(write_fixtures(tempfile.mkdtemp(prefix="tonality_"), lengths=args.synthetic).values())
+    if not files:
+        parser.error("no input audio")
+
+    chromas, rows = [], []
+    for path in files:
+        y, sr = AudioAsset(str(path)).load(args.sr)
+        chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
+        chromas.append(chroma)
+
+        legacy, t_legacy = _timed(lambda: legacy_key(chroma))
+        ka, t_vec = _timed(lambda: KeyAnalysis(score_keys(chroma), sr))
+        rows.append({
+            "file": str(path),
+            "legacy": legacy,
+            "vectorized": ka.name,
+            "legacy_ms": t_legacy * 1000,
+            "vectorized_ms": t_vec * 1000,
+            "segments": len(ka.segments(args.smooth)),
+            "ok": legacy == ka.name,
+        })
+
+    batch, t_batch = _timed(lambda: keys_from_chroma_batch(chromas))
+    for r, (_, _, name) in zip(rows, batch):
+        r["ok"] = r["ok"] and name == r["legacy"]
+
+    print("\n==============================")
+    print("   Tonality Engine Check")
+    print("==============================\n")
+    print(f"{'file':<32} {'legacy':>10} {'vector':>10} {'loop ms':>8} {'vec ms':>8} {'segs':>5}")
+    for r in rows:
+        print(f"{r['file'][-32:]:<32} {r['legacy']:>10} {r['vectorized']:>10} "
+              f"{r['legacy_ms']:>8.3f} {r['vectorized_ms']:>8.3f} {r['segments']:>5} {'✅' if r['ok'] else '❌'}")
+    print(f"\nBatch ({len(chromas)} tracks, one matmul): {t_batch * 1000:.3f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "batch_ms": t_batch * 1000}, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+    if not all(r["ok"] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
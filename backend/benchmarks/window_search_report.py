@@ -0,0 +1,118 @@
+# backend/benchmarks/window_search_report.py
+#
+# 对比 coarse-to-fine 窗口搜索与穷举搜索：
+#   - 选中窗口是否一致（起点误差 ≤ tolerance 视为一致）
+#   - coarse 选中窗口的完整评分 / 穷举最佳评分
+#   - 两种模式的耗时
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.window_search_report backend/test_audio.wav some_dir/ \
+#       --top-k 3 5 8 --refine-hop 0.1 --json report.json
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from backend.inference.melody_extractor import MelodyExtractor
+from backend.utils.audio_asset import AudioAsset
+
+AUDIO_EXTS = {".wav", ".mp3", ".flac", ".ogg", ".m4a"}
+
+
+def collect_corpus(inputs):
+    files = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            files.extend(sorted(f for f in p.rglob("*") if f.suffix.lower() in AUDIO_EXTS))
+        else:
+            files.append(p)
+    return files
+
+
+def _timed_search(extractor, y, sr):
+    t0 = time.perf_counter()
+    start, _ = extractor._find_best_window(y, sr)
+    return start, time.perf_counter() - t0
+
+
+def run_report(files, top_ks=(5,), refine_hop=0.1, tolerance=0.25):
+    exhaustive = MelodyExtractor(search_mode="exhaustive")
+    sr = exhaustive.target_sr
+    win = int(exhaustive.window_seconds * sr)
+
+    rows = []
+    for path in files:
+        y, _ = AudioAsset(path).load(sr)
+        ref_start, ref_time = _timed_search(exhaustive, y, sr)
+        ref_score = exhaustive.scorer.score(y[ref_start:ref_start+win], sr)
+
+        for k in top_ks:
+            coarse = MelodyExtractor(
+                search_mode="coarse",
+                coarse_top_k=k,
+                refine_hop_seconds=refine_hop,
+            )
+            start, t = _timed_search(coarse, y, sr)
+            score = coarse.scorer.score(y[start:start+win], sr)
+            rows.append({
+                "file": str(path),
+                "top_k": k,
+                "exhaustive_start_s": ref_start / sr,
+                "coarse_start_s": start / sr,
+                "match": abs(start - ref_start) <= tolerance * sr,
+                "score_ratio": score / ref_score if ref_score > 0 else 1.0,
+                "exhaustive_time_s": ref_time,
+                "coarse_time_s": t,
+            })
+    return rows
+
+
+def summarize(rows):
+    summary = {}
+    for k in sorted({r["top_k"] for r in rows}):
+        sub = [r for r in rows if r["top_k"] == k]
+        ex_t = sum(r["exhaustive_time_s"] for r in sub)
+        co_t = sum(r["coarse_time_s"] for r in sub)
+        summary[k] = {
+            "files": len(sub),
+            "match_rate": sum(r["match"] for r in sub) / len(sub),
+            "mean_score_ratio": sum(r["score_ratio"] for r in sub) / len(sub),
+            "exhaustive_time_s": ex_t,
+            "coarse_time_s": co_t,
+            "speedup": ex_t / co_t if co_t > 0 else float("inf"),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coarse vs exhaustive window search report")
+    parser.add_argument("inputs", nargs="*", default=["backend/test_audio.wav"])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5])
+    parser.add_argument("--refine-hop", type=float, default=0.1)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="起点误差（秒）")
+    parser.add_argument("--json", default=None, help="保存明细与汇总")
+    args = parser.parse_args()
+
+    files = collect_corpus(args.inputs)
+    rows = run_report(files, args.top_k, args.refine_hop, args.tolerance)
+    summary = summarize(rows)
+
+    print("\n==============================")
+    print("   Window Search Report")
+    print("==============================\n")
+    print(f"files={len(files)}  refine_hop={args.refine_hop}s  tolerance={args.tolerance}s\n")
+    print(f"{'top_k':>5}  {'match':>6}  {'score':>6}  {'exh(s)':>8}  {'coarse(s)':>9}  {'speedup':>7}")
+    for k, s in summary.items():
+        print(f"{k:>5}  {s['match_rate']:>6.1%}  {s['mean_score_ratio']:>6.3f}  "
+              f"{s['exhaustive_time_s']:>8.2f}  {s['coarse_time_s']:>9.2f}  {s['speedup']:>6.1f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "summary": summary}, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# backend/benchmarks/yamnet_startup.py
+#
+# YAMNet 冷启动耗时拆分：
+#   import（TF / TF Hub） → load（SavedModel / Hub） → warmup（首次 trace）
+#   → 预热后不同长度输入的单次调用（验证固定签名不会 retrace）
+#
+# 用法（仓库根目录，建议每次新进程运行）：
+#   YAMNET_MODEL_DIR=/models/yamnet python -m backend.benchmarks.yamnet_startup --json startup.json
+
+import argparse
+import json
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YAMNet startup benchmark")
+    parser.add_argument("--model-dir", default=None, help="本地 SavedModel 目录（默认读 YAMNET_MODEL_DIR）")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[1.0, 5.0, 30.0],
+                        help="预热后测试的输入时长（秒）")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    import numpy as np
+    from backend.features.yamnet_extract import YAMNET_SR, YamnetModel
+    import_seconds = time.perf_counter() - t0
+
+    model = YamnetModel(model_dir=args.model_dir)
+    model.load()
+    model.warmup()
+
+    calls = {}
+    for seconds in args.lengths:
+        waveform = np.random.default_rng(0).uniform(-0.1, 0.1, int(YAMNET_SR * seconds)).astype(np.float32)
+        t0 = time.perf_counter()
+        model(waveform)
+        calls[f"{seconds:g}s"] = time.perf_counter() - t0
+
+    result = {
+        "source": model.source,
+        "import_seconds": import_seconds,
+        "load_seconds": model.load_seconds,
+        "warmup_seconds": model.warmup_seconds,
+        "call_seconds": calls,
+    }
+
+    print("\n==============================")
+    print("   YAMNet Startup")
+    print("==============================\n")
+    print(f"source:  {result['source']}")
+    print(f"import:  {import_seconds:.2f}s")
+    print(f"load:    {model.load_seconds:.2f}s")
+    print(f"warmup:  {model.warmup_seconds:.2f}s")
+    for k, v in calls.items():
+        print(f"call {k:>6}: {v * 1000:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
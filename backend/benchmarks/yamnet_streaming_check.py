@@ -0,0 +1,95 @@
+# backend/benchmarks/yamnet_streaming_check.py
+#
+# 流式 YAMNet embedding 与整段加载的一致性 / 内存对比：
+#   - max |Δ|、余弦相似度（应 ≥ 0.9999）
+#   - 两种方式的耗时与 tracemalloc 峰值（numpy 缓冲区；TF 内部分配不计入）
+#
+# 用法（仓库根目录）：
+#   python -m backend.benchmarks.yamnet_streaming_check long_set.wav other.flac --chunk-patches 64
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from backend.features.yamnet_extract import (
+    YAMNET_SR,
+    _compute_yamnet_embedding,
+    extract_yamnet_embedding_streaming,
+    load_yamnet,
+)
+from backend.utils.audio_asset import AudioAsset
+
+
+def _run(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        out = fn()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return out, elapsed, peak / (1024 * 1024)
+
+
+def check(files, block_seconds, chunk_patches, min_cosine):
+    load_yamnet().warmup()
+
+    rows = []
+    for path in files:
+        stream, t_stream, mb_stream = _run(
+            lambda: extract_yamnet_embedding_streaming(
+                str(path), block_seconds=block_seconds, chunk_patches=chunk_patches
+            )
+        )
+        full, t_full, mb_full = _run(lambda: _compute_yamnet_embedding(AudioAsset(str(path)), YAMNET_SR))
+
+        cosine = float(np.dot(full, stream) / (np.linalg.norm(full) * np.linalg.norm(stream) + 1e-12))
+        rows.append({
+            "file": str(path),
+            "max_abs_diff": float(np.max(np.abs(full - stream))),
+            "cosine": cosine,
+            "full_seconds": t_full,
+            "stream_seconds": t_stream,
+            "full_peak_mb": mb_full,
+            "stream_peak_mb": mb_stream,
+            "ok": cosine >= min_cosine,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming YAMNet parity check")
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("--block-seconds", type=float, default=30.0)
+    parser.add_argument("--chunk-patches", type=int, default=64)
+    parser.add_argument("--min-cosine", type=float, default=0.9999)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    rows = check(args.inputs, args.block_seconds, args.chunk_patches, args.min_cosine)
+
+    print("\n==============================")
+    print("   YAMNet Streaming Parity")
+    print("==============================\n")
+    print(f"{'file':<40} {'max|Δ|':>9} {'cosine':>8} {'full(s)':>8} {'strm(s)':>8} {'full MB':>8} {'strm MB':>8}")
+    for r in rows:
+        print(f"{r['file'][-40:]:<40} {r['max_abs_diff']:>9.2e} {r['cosine']:>8.5f} "
+              f"{r['full_seconds']:>8.2f} {r['stream_seconds']:>8.2f} "
+              f"{r['full_peak_mb']:>8.0f} {r['stream_peak_mb']:>8.0f} {'✅' if r['ok'] else '❌'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved: {args.json}")
+
+    if not all(r["ok"] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# backend/features/pitch_tracker.py
+#
+# 可替换的 f0 追踪后端（MelodyScorer / MelodyExtractor / MelodyTimeline 共用）
+#
+#   pyin      librosa.pyin（原实现，最准也最慢：每帧 HMM + 多阈值 YIN）
+#   yin       librosa.yin + 帧能量静音门限（无概率 voicing）
+#   autocorr  NumPy 向量化自相关：分块 rFFT → 归一化 ACF 峰值 + 抛物线插值，
+#             归一化峰值低于 AUTOCORR_VOICING 视为无声
+#
+# 后缀 "+ds"：先降采样到支持 fmax 的最低采样率（≥ DOWNSAMPLE_FACTOR × fmax，
+# 且整除 sr / frame_length / hop_length），frame / hop 按同一比例缩小，
+# 帧中心时间与帧数保持不变，下游评分（按帧数设定的 skip 等）不受影响。
+# 32 kHz、fmax = 1046.5 Hz 时为 8 kHz：样本数 1/4，每帧运算量约 1/16。
+#
+# 选择方式：构造参数 pitch_tracker="yin+ds"，或环境变量 MELODY_PITCH_TRACKER（默认 pyin）。
+# 各后端与 pyin 的评分差异见 benchmarks/pitch_trackers.py。
+
+import os
+
+import librosa
+import numpy as np
+
+PITCH_TRACKERS = ("pyin", "yin", "autocorr")
+PITCH_TRACKER_ENV = "MELODY_PITCH_TRACKER"
+DOWNSAMPLE_SUFFIX = "+ds"
+
+FMIN = 65.4      # C2
+FMAX = 1046.5    # C6
+
+# 降采样后采样率下限 = 4 × fmax：二次谐波仍低于 Nyquist，并给重采样滤波器留出过渡带
+DOWNSAMPLE_FACTOR = 4.0
+
+# 帧 RMS 低于整段最大帧 RMS 的该比例（-40 dB）视为静音（yin / autocorr）
+SILENCE_RATIO = 0.01
+# 归一化自相关峰值阈值（autocorr voicing）
+AUTOCORR_VOICING = 0.5
+# autocorr 每次处理的帧数（限制 rFFT 缓冲区大小）
+AUTOCORR_CHUNK_FRAMES = 1024
+
+
+def tracker_specs():
+    """所有可选的 tracker 名称（含降采样变体）"""
+    return [name + suffix for name in PITCH_TRACKERS for suffix in ("", DOWNSAMPLE_SUFFIX)]
+
+
+def get_pitch_tracker(tracker=None):
+    """
+    tracker: PitchTracker 实例 / 名称（"pyin"、"yin+ds" ...）/ None（读 MELODY_PITCH_TRACKER）
+    """
+    if isinstance(tracker, PitchTracker):
+        return tracker
+    spec = tracker or os.environ.get(PITCH_TRACKER_ENV, "pyin")
+    method = spec[: -len(DOWNSAMPLE_SUFFIX)] if spec.endswith(DOWNSAMPLE_SUFFIX) else spec
+    return PitchTracker(method, downsample=spec.endswith(DOWNSAMPLE_SUFFIX))
+
+
+class PitchTracker:
+    """
+    track(y, sr, frame_length, hop_length) → f0 (n_frames,)，无声帧为 NaN
+    n_frames = 1 + len(y) // hop_length（center=True，与 librosa.pyin 相同）
+    """
+
+    def __init__(self, method="pyin", downsample=False, fmin=FMIN, fmax=FMAX):
+        if method not in PITCH_TRACKERS:
+            raise ValueError(f"Unknown pitch tracker: {method}")
+        self.method = method
+        self.downsample = downsample
+        self.fmin = fmin
+        self.fmax = fmax
+
+    @property
+    def spec(self):
+        return self.method + (DOWNSAMPLE_SUFFIX if self.downsample else "")
+
+    def __repr__(self):
+        return f"PitchTracker({self.spec!r})"
+
+    def decimation(self, sr, frame_length, hop_length):
+        """满足 fmax 的最大整数降采样倍数（不降采样时为 1）"""
+        if not self.downsample:
+            return 1
+        min_sr = DOWNSAMPLE_FACTOR * self.fmax
+        best = 1
+        for k in range(2, hop_length + 1):
+            if sr / k < min_sr:
+                break
+            if sr % k == 0 and hop_length % k == 0 and frame_length % k == 0:
+                best = k
+        return best
+
+    def track(self, y, sr, frame_length=2048, hop_length=512):
+        n_frames = 1 + len(y) // hop_length
+
+        k = self.decimation(sr, frame_length, hop_length)
+        if k > 1:
+            y = librosa.resample(np.asarray(y, dtype=np.float32), orig_sr=sr, target_sr=sr // k)
+            sr, frame_length, hop_length = sr // k, frame_length // k, hop_length // k
+
+        f0 = _BACKENDS[self.method](y, sr, frame_length, hop_length, self.fmin, self.fmax)
+        return _fit_frames(np.asarray(f0, dtype=np.float64), n_frames)
+
+
+def _fit_frames(f0, n_frames):
+    """降采样后长度取整可能使帧数差 1：截断或以 NaN 补齐"""
+    if len(f0) >= n_frames:
+        return f0[:n_frames]
+    return np.concatenate([f0, np.full(n_frames - len(f0), np.nan)])
+
+
+def _silent_frames(y, frame_length, hop_length):
+    rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
+    return rms < SILENCE_RATIO * (rms.max() if rms.size else 0.0) + 1e-8
+
+
+# ============================================================
+# Backends
+# ============================================================
+def _pyin(y, sr, frame_length, hop_length, fmin, fmax):
+    try:
+        f0, _, _ = librosa.pyin(
+            y, fmin=fmin, fmax=fmax, sr=sr,
+            frame_length=frame_length, hop_length=hop_length,
+        )
+    except TypeError:
+        f0, _, _ = librosa.pyin(y, fmin, fmax, sr=sr)
+    return f0
+
+
+def _yin(y, sr, frame_length, hop_length, fmin, fmax):
+    f0 = librosa.yin(
+        y, fmin=fmin, fmax=fmax, sr=sr,
+        frame_length=frame_length, hop_length=hop_length,
+    )
+    silent = _silent_frames(y, frame_length, hop_length)[: len(f0)]
+    f0[silent] = np.nan
+    return f0
+
+
+def _autocorr(y, sr, frame_length, hop_length, fmin, fmax):
+    y = np.asarray(y, dtype=np.float64)
+    padded = np.pad(y, frame_length // 2)
+    frames = librosa.util.frame(padded, frame_length=frame_length, hop_length=hop_length)   # (L, T)
+
+    lag_min = max(int(np.floor(sr / fmax)), 1)
+    lag_max = min(int(np.ceil(sr / fmin)), frame_length - 2)
+    n_fft = 1 << int(np.ceil(np.log2(2 * frame_length)))
+
+    f0 = np.full(frames.shape[1], np.nan)
+    for a in range(0, frames.shape[1], AUTOCORR_CHUNK_FRAMES):
+        chunk = frames[:, a:a + AUTOCORR_CHUNK_FRAMES]
+        chunk = chunk - chunk.mean(axis=0, keepdims=True)
+
+        # 线性（非循环）自相关：补零到 ≥ 2L 后 |FFT|² → iFFT
+        spec = np.fft.rfft(chunk, n=n_fft, axis=0)
+        acf = np.fft.irfft(spec.real ** 2 + spec.imag ** 2, n=n_fft, axis=0)[: lag_max + 2]
+        energy = acf[0]
+        acf = acf / (energy + 1e-12)
+
+        band = acf[lag_min: lag_max + 1]
+        peak = np.argmax(band, axis=0)
+        lag = peak + lag_min
+        cols = np.arange(chunk.shape[1])
+        strength = band[peak, cols]
+
+        # 抛物线插值（亚采样精度）
+        left, center, right = acf[lag - 1, cols], acf[lag, cols], acf[lag + 1, cols]
+        denom = left - 2 * center + right
+        shift = 0.5 * (left - right) / np.where(np.abs(denom) > 1e-12, denom, np.inf)
+        period = lag + np.clip(shift, -0.5, 0.5)
+
+        voiced = (strength >= AUTOCORR_VOICING) & (peak > 0) & (peak < band.shape[0] - 1) & (energy > 0)
+        f0[a:a + chunk.shape[1]] = np.where(voiced, sr / period, np.nan)
+
+    silent = _silent_frames(y, frame_length, hop_length)[: len(f0)]
+    f0[silent] = np.nan
+    return f0
+
+
+_BACKENDS = {"pyin": _pyin, "yin": _yin, "autocorr": _autocorr}
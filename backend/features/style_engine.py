@@ -0,0 +1,83 @@
+# backend/features/style_engine.py
+#
+# 共享 STFT 的风格特征引擎
+#
+# 原实现中 beat_track / spectral_centroid / chroma_stft / melspectrogram /
+# spectral_contrast / effects.harmonic 各自对整段信号做一次 STFT（共 6 次）。
+# 这里只算一次复数 STFT D（n_fft=2048, hop=512，与 librosa 默认一致），其余全部由 D 派生：
+#   |D|      → spectral_centroid、spectral_contrast
+#   |D|²     → chroma_stft（含 tuning 估计）、mel(40)、mel(128) → onset 包络 → tempo
+#   hpss(D)  → istft → harmonic → tonnetz（CQT，本身不走 STFT）
+# RMS 仍在时域按帧计算：librosa 由 S 求 RMS 带窗函数，与时域结果不一致，且时域本身很便宜。
+# STFT / HPSS 走 transform_cache，任务 scope 内与其它模块共享。
+#
+# 输出与 style_recognition._compute_style_features 完全相同的 68 维布局：
+#   [tempo, rms, centroid] + chroma(12) + mel(40) + contrast(7) + tonnetz(6)
+
+import librosa
+import numpy as np
+
+from backend.utils import transform_cache
+from backend.utils.safe_librosa import safe_rms
+from backend.utils.transform_cache import librosa_default
+
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# 各特征函数内部 STFT 的 pad_mode 默认值随 librosa 版本变化（0.10 起为 "constant"），
+# 直接读取当前版本的默认值，保证与逐个调用时一致
+STFT_PAD_MODE = librosa_default(
+    librosa.feature.spectral_centroid, "pad_mode", librosa_default(librosa.stft, "pad_mode", "reflect")
+)
+HARMONIC_PAD_MODE = librosa_default(
+    librosa.effects.harmonic, "pad_mode", librosa_default(librosa.stft, "pad_mode", "reflect")
+)
+
+
+def compute_style_features_shared(y, sr) -> np.ndarray:
+    """(y, sr) → (1, 68)，与原实现逐维一致（浮点误差内）"""
+    # 没有外层任务 scope 时也保证 STFT 在本函数内只算一次
+    with transform_cache.transform_scope():
+        return _compute(y, sr)
+
+
+def _compute(y, sr):
+    D = transform_cache.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH, pad_mode=STFT_PAD_MODE)
+    S_mag = np.abs(D)
+    S_pow = S_mag ** 2
+
+    # ---- tempo：onset 包络来自 128 mel 的 dB 谱（与 beat_track 内部一致） ----
+    mel128 = librosa.feature.melspectrogram(S=S_pow, sr=sr, n_mels=128, fmax=0.5 * sr)
+    onset_env = librosa.onset.onset_strength(
+        S=librosa.power_to_db(mel128), sr=sr, hop_length=HOP_LENGTH, aggregate=np.median,
+    )
+    tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=HOP_LENGTH)
+    tempo = float(np.atleast_1d(tempo)[0])
+
+    # ---- RMS（时域） ----
+    rms = safe_rms(y, sr).mean()
+
+    # ---- centroid / chroma / mel / contrast ----
+    centroid = librosa.feature.spectral_centroid(S=S_mag, sr=sr)[0].mean()
+    chroma = librosa.feature.chroma_stft(S=S_pow, sr=sr).mean(axis=1)
+    mel = librosa.feature.melspectrogram(S=S_pow, sr=sr, n_mels=40).mean(axis=1)
+    contrast = librosa.feature.spectral_contrast(S=S_mag, sr=sr).mean(axis=1)
+
+    # ---- tonnetz（pad_mode 相同时 harmonic 由同一个 D 做 HPSS；部分音频会失败，兜底） ----
+    try:
+        harmonic = transform_cache.harmonic(
+            y, n_fft=N_FFT, hop_length=HOP_LENGTH, pad_mode=HARMONIC_PAD_MODE,
+        )
+        tonnetz = librosa.feature.tonnetz(y=harmonic, sr=sr).mean(axis=1)
+    except Exception:
+        tonnetz = np.zeros(6)
+
+    feature = np.concatenate([
+        [tempo, rms, centroid],
+        chroma,
+        mel,
+        contrast,
+        tonnetz,
+    ])
+
+    return feature.reshape(1, -1)
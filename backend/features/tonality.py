@@ -0,0 +1,153 @@
+# backend/features/tonality.py
+#
+# 向量化调性引擎（Krumhansl-Schmuckler 模板）
+#
+# 24 个调（12 主音 × 大/小调）的模板预先排成 (24, 12) 矩阵，
+# 一次 chroma_cqt + 一次矩阵乘即可得到所有调在每一帧上的得分：
+#   scores = KEY_PROFILES @ chroma          # (24, T)
+# 模板打分是线性的，任意时间段的平均 chroma 得分 = 该段逐帧得分的平均，
+# 因此整曲调性、逐帧时间线、任意窗口的局部调性都由同一份 scores 派生（累加和 O(1) 查询）。
+# 对 chroma 均值做归一化只是正数缩放，不影响 argmax，结果与逐主音循环一致。
+#
+# 行顺序为 [C major, C minor, C# major, C# minor, ...]，argmax 取第一个最大值，
+# 与原循环（先大调后小调、严格 >）的平局处理相同。
+#
+#   ka = analyze_tonality(y, sr)
+#   ka.name                         # "A minor"
+#   ka.local_key(start, end)        # 样本区间的局部调性 (tonic, mode, name)
+#   ka.segments(smooth_seconds=4)   # [(start_s, end_s, name), ...]
+#   detect_keys_batch([y1, y2], sr) # 多首歌的平均 chroma 堆叠后一次矩阵乘
+
+import numpy as np
+
+from backend.utils import transform_cache
+
+PITCH_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+MODES = ("major", "minor")
+
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+
+def _build_profiles():
+    major = MAJOR_PROFILE / np.linalg.norm(MAJOR_PROFILE)
+    minor = MINOR_PROFILE / np.linalg.norm(MINOR_PROFILE)
+    rows = []
+    for t in range(12):
+        rows.append(np.roll(major, t))
+        rows.append(np.roll(minor, t))
+    return np.stack(rows)
+
+
+KEY_PROFILES = _build_profiles()    # (24, 12)
+KEY_NAMES = [f"{PITCH_NAMES[i // 2]} {MODES[i % 2]}" for i in range(24)]
+
+
+def key_from_index(index):
+    """模板行号 → (tonic_pc, mode, name)"""
+    index = int(index)
+    return index // 2, MODES[index % 2], KEY_NAMES[index]
+
+
+def score_keys(chroma):
+    """
+    chroma: (12,) / (12, T) → (24,) / (24, T) 模板得分
+    """
+    return KEY_PROFILES @ np.asarray(chroma, dtype=np.float64)
+
+
+class KeyAnalysis:
+    """
+    单次 CQT 得到的调性结果
+        frame_scores: (24, T) 逐帧模板得分
+        tonic / mode / name: 整曲调性
+    """
+
+    def __init__(self, frame_scores, sr, hop_length=512):
+        self.frame_scores = frame_scores
+        self.sr = sr
+        self.hop_length = hop_length
+        # 前缀和：任意帧区间的得分和 = cum[:, b] - cum[:, a]
+        self._cum = np.concatenate(
+            [np.zeros((24, 1)), np.cumsum(frame_scores, axis=1)], axis=1
+        )
+        self.scores = self._range_scores(0, self.n_frames)
+        self.tonic, self.mode, self.name = key_from_index(np.argmax(self.scores))
+
+    @property
+    def n_frames(self):
+        return self.frame_scores.shape[1]
+
+    def _range_scores(self, a, b):
+        a = int(np.clip(a, 0, self.n_frames))
+        b = int(np.clip(b, a, self.n_frames))
+        if b == a:
+            return np.zeros(24)
+        return (self._cum[:, b] - self._cum[:, a]) / (b - a)
+
+    def _frame(self, sample):
+        return int(round(sample / self.hop_length))
+
+    def local_key(self, start, end):
+        """样本区间 [start, end) 的局部调性；区间为空时退回整曲调性"""
+        a, b = self._frame(start), self._frame(end)
+        if b <= a:
+            return self.tonic, self.mode, self.name
+        return key_from_index(np.argmax(self._range_scores(a, b)))
+
+    def frame_keys(self, smooth_seconds=0.0):
+        """
+        逐帧调性（模板行号，(T,)）
+        smooth_seconds > 0 时对以每帧为中心的窗口求平均得分（= 窗口平均 chroma 打分）
+        """
+        if self.n_frames == 0:
+            return np.zeros(0, dtype=int)
+        half = int(smooth_seconds * self.sr / self.hop_length) // 2
+        if half <= 0:
+            return np.argmax(self.frame_scores, axis=0)
+        idx = np.arange(self.n_frames)
+        a = np.clip(idx - half, 0, self.n_frames)
+        b = np.clip(idx + half + 1, 0, self.n_frames)
+        sums = self._cum[:, b] - self._cum[:, a]
+        return np.argmax(sums / (b - a), axis=0)
+
+    def segments(self, smooth_seconds=4.0):
+        """合并相邻同调帧 → [(start_seconds, end_seconds, name), ...]"""
+        keys = self.frame_keys(smooth_seconds)
+        if keys.size == 0:
+            return []
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [keys.size]])
+        sec = self.hop_length / self.sr
+        return [(float(s * sec), float(e * sec), KEY_NAMES[keys[s]]) for s, e in zip(starts, ends)]
+
+
+def analyze_tonality(y, sr, hop_length=512):
+    """(y, sr) → KeyAnalysis；chroma_cqt 走 transform_cache，任务内与其它模块共享"""
+    if hop_length == 512:
+        chroma = transform_cache.chroma_cqt(y, sr)
+    else:
+        chroma = transform_cache.chroma_cqt(y, sr, hop_length=hop_length)
+    return KeyAnalysis(score_keys(chroma), sr, hop_length=hop_length)
+
+
+# ============================================================
+# Batch
+# ============================================================
+def keys_from_chroma_batch(chromas):
+    """
+    chromas: 每首歌的 (12, T_i) chroma 列表
+    平均 chroma 堆叠成 (N, 12)，一次矩阵乘得到 (N, 24) 得分
+    返回 [(tonic_pc, mode, name), ...]
+    """
+    if not len(chromas):
+        return []
+    means = np.stack([np.asarray(c, dtype=np.float64).mean(axis=1) for c in chromas])
+    scores = means @ KEY_PROFILES.T
+    return [key_from_index(i) for i in np.argmax(scores, axis=1)]
+
+
+def detect_keys_batch(signals, sr):
+    """多首歌的整曲调性（每首一次 CQT，打分一次矩阵乘）"""
+    return keys_from_chroma_batch([transform_cache.chroma_cqt(y, sr) for y in signals])
@@ -1,55 +1,218 @@
 # backend/features/yamnet_extract.py
 
 import os
+import threading
+import time
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
-import librosa
+
+from backend.utils.audio_asset import as_audio_asset
+from backend.utils.feature_cache import file_fingerprint, get_feature_cache, make_key
 
 # ==============================
 # 🔥 YAMNet 模型（懒加载）
 # ==============================
 YAMNET_MODEL_HANDLE = "https://tfhub.dev/google/yamnet/1"
+# 本地 SavedModel 目录（离线部署），优先于 TF Hub
+YAMNET_MODEL_DIR_ENV = "YAMNET_MODEL_DIR"
 _yamnet = None
+_yamnet_lock = threading.Lock()
+
+# YAMNet 分帧（16kHz）：patch 窗 0.96s / hop 0.48s，STFT 窗 25ms / hop 10ms
+# 至少 0.975s（=0.96 + 0.025 - 0.010）才能得到第一个 patch
+YAMNET_SR = 16000
+YAMNET_PATCH_HOP = 7680
+YAMNET_MIN_SAMPLES = 15600
+
+# 超过该时长（秒）且尚未解码的文件走分块流式提取，内存与时长无关
+YAMNET_STREAMING_MIN_SECONDS = 600.0
 
 
-def load_yamnet():
+class YamnetModel:
     """
-    懒加载 YAMNet（只加载一次）
+    YAMNet 封装
+        - model_dir（或环境变量 YAMNET_MODEL_DIR）指向本地 SavedModel 时完全离线加载，
+          否则回退到 TF Hub
+        - 固定输入签名 [None] float32：任意长度波形共用一个 trace，不会反复 retrace
+        - warmup()：上线前用假波形跑一次，把 trace / 初始化开销挪到流量之前
+    调用方式与 hub 模型一致：scores, embeddings, spectrogram = model(waveform)
+    """
+
+    def __init__(self, model_dir=None, handle=YAMNET_MODEL_HANDLE):
+        self.model_dir = model_dir or os.environ.get(YAMNET_MODEL_DIR_ENV) or None
+        self.handle = handle
+        self._model = None
+        self._fn = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def source(self):
+        return self.model_dir or self.handle
+
+    @property
+    def fingerprint(self):
+        """
+        模型身份（用于特征缓存 key）：
+        本地目录 → 绝对路径 + saved_model.pb / variables.index 的大小与 mtime；TF Hub → handle
+        """
+        if self._fingerprint is None:
+            if self.model_dir:
+                parts = [f"dir:{os.path.abspath(self.model_dir)}"]
+                for rel in ("saved_model.pb", os.path.join("variables", "variables.index")):
+                    path = os.path.join(self.model_dir, rel)
+                    parts.append(file_fingerprint(path) if os.path.exists(path) else "-")
+                self._fingerprint = ":".join(parts)
+            else:
+                self._fingerprint = f"hub:{self.handle}"
+        return self._fingerprint
+
+    def load(self):
+        if self._model is not None:
+            return self
+        # 并发的首次调用只加载一次
+        with self._lock:
+            if self._model is not None:
+                return self
+            # TensorFlow / TF Hub 较重，只在真正需要 YAMNet 时导入
+            import tensorflow as tf
+            import tensorflow_hub as hub
+
+            print(f"🎧 Loading YAMNet model from {self.source} ...")
+            t0 = time.perf_counter()
+            if self.model_dir:
+                model = tf.saved_model.load(self.model_dir)
+            else:
+                model = hub.load(self.handle)
+
+            self._fn = tf.function(
+                lambda waveform: model(waveform),
+                input_signature=[tf.TensorSpec(shape=[None], dtype=tf.float32)],
+            )
+            # _model 最后赋值：锁外的快速路径看到 _model 时 _fn 已就绪
+            self._model = model
+            self.load_seconds = time.perf_counter() - t0
+            print(f"✅ YAMNet loaded successfully! ({self.load_seconds:.2f}s)")
+        return self
+
+    def warmup(self, seconds=1.0):
+        """用静音波形触发 trace（只需一次，之后任意长度输入都复用）"""
+        self.load()
+        t0 = time.perf_counter()
+        self(np.zeros(int(YAMNET_SR * seconds), dtype=np.float32))
+        self.warmup_seconds = time.perf_counter() - t0
+        print(f"🔥 YAMNet warmup done ({self.warmup_seconds:.2f}s)")
+        return self
+
+    def __call__(self, waveform):
+        import tensorflow as tf
+
+        self.load()
+        return self._fn(tf.convert_to_tensor(waveform, dtype=tf.float32))
+
+
+def get_yamnet(model_dir=None):
+    """
+    进程内唯一的 YamnetModel（未必已加载）
+    model_dir 与已创建实例的目录不同时报错：同一进程只使用一个 YAMNet，避免缓存串用
     """
     global _yamnet
-    if _yamnet is None:
-        print("🎧 Loading YAMNet model ...")
-        _yamnet = hub.load(YAMNET_MODEL_HANDLE)
-        print("✅ YAMNet loaded successfully!")
-    return _yamnet
+    with _yamnet_lock:
+        if _yamnet is None:
+            _yamnet = YamnetModel(model_dir=model_dir)
+        elif model_dir is not None and (
+            _yamnet.model_dir is None
+            or os.path.abspath(model_dir) != os.path.abspath(_yamnet.model_dir)
+        ):
+            raise ValueError(
+                f"YAMNet already configured from {_yamnet.source}; cannot switch to {model_dir}"
+            )
+        return _yamnet
+
+
+def load_yamnet(model_dir=None):
+    """
+    懒加载 YAMNet（只加载一次）
+    model_dir: 本地 SavedModel 目录，不传则读取 YAMNET_MODEL_DIR，再回退到 TF Hub
+    """
+    return get_yamnet(model_dir).load()
+
+
+def yamnet_fingerprint():
+    """当前 YAMNet 的模型指纹（不触发加载），供依赖 embedding 的缓存 key 使用"""
+    return get_yamnet().fingerprint
+
+
+def warmup_yamnet(model_dir=None):
+    """服务启动时调用：加载 + 预热"""
+    return load_yamnet(model_dir).warmup()
 
 
 # ==============================
 # 🔥 提取 YAMNet embedding（最终统一版）
 # ==============================
-def extract_yamnet_embedding(audio_path, target_sr=16000):
+def extract_yamnet_embedding(audio, target_sr=16000, streaming=None):
     """
-    输入：音频路径（wav/mp3）
+    输入：音频路径（wav/mp3）或 AudioAsset
     输出：长度为 1024 的 embedding（np.array）
     工作流程：
-        1. librosa 读取音频（自动转 mono）
+        1. 读取音频（自动转 mono，AudioAsset 只解码一次）
         2. 重采样到 16kHz
         3. YAMNet 输出多帧 embedding
         4. 对所有帧取平均（稳定输入）
+    streaming: True 强制分块流式读取（见 extract_yamnet_embedding_streaming）；
+               None 时对未解码且长于 YAMNET_STREAMING_MIN_SECONDS 的文件自动启用
+    设置 MUSIC_FEATURE_CACHE_DIR 后，同一音频内容直接读缓存
     """
+    asset = as_audio_asset(audio)
+
+    if streaming is None:
+        streaming = _should_stream(asset)
+    if streaming and target_sr == YAMNET_SR and asset.path is not None and not asset.is_decoded:
+        compute = lambda: extract_yamnet_embedding_streaming(asset.path)
+    else:
+        compute = lambda: _compute_yamnet_embedding(asset, target_sr)
+
+    cache = get_feature_cache()
+    if cache is not None:
+        key = _cache_key(asset, target_sr)
+        return cache.get_or_compute(key, compute)
+
+    return compute()
+
 
+def _should_stream(asset):
+    if asset.path is None or asset.is_decoded:
+        return False
+    try:
+        import soundfile as sf
+        return sf.info(asset.path).duration > YAMNET_STREAMING_MIN_SECONDS
+    except Exception:
+        # soundfile 打不开的格式走整段解码
+        return False
+
+
+def _cache_key(asset, target_sr):
+    return make_key(
+        asset.content_hash(),
+        "yamnet_embedding",
+        {"model": yamnet_fingerprint(), "sr": target_sr},
+    )
+
+
+def _compute_yamnet_embedding(asset, target_sr):
     yamnet = load_yamnet()
 
     # ---------------------------
-    # ① 使用 librosa 读取音频
+    # ① 读取 16kHz 视图
     # ---------------------------
-    y, sr = librosa.load(audio_path, sr=target_sr, mono=True)
+    y, sr = asset.load(target_sr)
 
     # ---------------------------
-    # ② 转为 Tensor
+    # ② 转为 float32（YamnetModel 内部转 Tensor）
     # ---------------------------
-    waveform = tf.constant(y, dtype=tf.float32)
+    waveform = np.asarray(y, dtype=np.float32)
 
     # ---------------------------
     # ③ 调用 YAMNet
@@ -68,6 +231,160 @@ def extract_yamnet_embedding(audio_path, target_sr=16000):
     return emb  # np.array shape=(1024,)
 
 
+# ==============================
+# 🔥 流式提取（长录音，内存恒定）
+# ==============================
+def _iter_resampled_blocks(path, block_seconds):
+    """按块读取文件 → mono → 有状态重采样到 16kHz（块边界无接缝）"""
+    import soundfile as sf
+
+    info = sf.info(path)
+    blocksize = max(int(block_seconds * info.samplerate), 1)
+
+    resampler = None
+    if info.samplerate != YAMNET_SR:
+        import soxr
+        # 与 librosa.resample 默认的 soxr_hq 一致
+        resampler = soxr.ResampleStream(info.samplerate, YAMNET_SR, 1, dtype="float32", quality="HQ")
+
+    for block in sf.blocks(path, blocksize=blocksize, dtype="float32", always_2d=True):
+        y = block.mean(axis=1)
+        yield resampler.resample_chunk(y) if resampler is not None else y
+    if resampler is not None:
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def extract_yamnet_embedding_streaming(path, block_seconds=30.0, chunk_patches=64):
+    """
+    分块流式计算 YAMNet 平均 embedding，结果与整段加载一致（仅重采样边界的浮点误差）
+
+    YAMNet 第 k 个 patch 覆盖 [k·7680, k·7680 + 15600)。每次取
+    15600 + (m−1)·7680 个采样点正好得到 m 个完整 patch，与整段计算时的帧逐个相同；
+    之后前移 m·7680 继续。文件读完后总 patch 数 P 已知，剩余 P − consumed 个
+    patch 由缓冲区尾部（YAMNet 自行补零）得到。只保留 embedding 的累加和。
+    内存上限约为 chunk_patches × 0.48s + block_seconds 的 16kHz 波形。
+    """
+    yamnet = load_yamnet()
+    chunk_len = YAMNET_MIN_SAMPLES + (chunk_patches - 1) * YAMNET_PATCH_HOP
+    advance = chunk_patches * YAMNET_PATCH_HOP
+
+    buffer = np.zeros(0, dtype=np.float32)
+    total = None
+    consumed = 0      # 已计算的 patch 数
+    seen = 0          # 已读入的 16kHz 采样点数
+
+    def accumulate(waveform):
+        nonlocal total
+        _, embeddings, _ = yamnet(waveform)
+        part = embeddings.numpy().sum(axis=0, dtype=np.float64)
+        total = part if total is None else total + part
+        return len(embeddings)
+
+    for block in _iter_resampled_blocks(path, block_seconds):
+        seen += len(block)
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= chunk_len:
+            consumed += accumulate(buffer[:chunk_len])
+            buffer = buffer[advance:]
+
+    num_patches = _yamnet_num_patches(seen)
+    if num_patches > consumed:
+        consumed += accumulate(buffer)
+
+    return (total / consumed).astype(np.float32)
+
+
+# ==============================
+# 🔥 批量提取（多段拼接，一次 YAMNet 调用）
+# ==============================
+def _yamnet_num_patches(n):
+    """单独输入 n 个采样点时 YAMNet 输出的帧数（与其内部补零规则一致）"""
+    extra = max(0, n - YAMNET_MIN_SAMPLES)
+    return 1 + -(-extra // YAMNET_PATCH_HOP)
+
+
+def _yamnet_segment_length(n):
+    """
+    拼接时每段占用的长度：YAMNet 补零后的长度，再向上取整到 patch hop 的整数倍
+    → 每段起点都落在 patch 网格上，该段的 patch 只覆盖本段（含补零），
+      与单独调用得到的帧完全相同
+    """
+    padded = YAMNET_MIN_SAMPLES + (_yamnet_num_patches(n) - 1) * YAMNET_PATCH_HOP
+    return -(-padded // YAMNET_PATCH_HOP) * YAMNET_PATCH_HOP
+
+
+def _run_yamnet_batch(yamnet, batch, assets, results, cache):
+    """
+    batch: [(index, y_16k, seg_len, decoded_before)]，拼接后调用一次 YAMNet
+    结果写入 results / cache 后释放视图：16 kHz 视图总是释放，
+    原本未解码的文件音频连同原始波形一起释放（调用方已解码的保持不变）
+    """
+    waveform = np.zeros(sum(seg_len for _, _, seg_len, _ in batch), dtype=np.float32)
+    spans = []
+    offset = 0
+    for i, y, seg_len, _ in batch:
+        waveform[offset:offset+len(y)] = y
+        first = offset // YAMNET_PATCH_HOP
+        spans.append((i, first, first + _yamnet_num_patches(len(y))))
+        offset += seg_len
+
+    _, embeddings, _ = yamnet(waveform)
+    embeddings = embeddings.numpy()
+
+    for i, a, b in spans:
+        results[i] = np.mean(embeddings[a:b], axis=0)
+        if cache is not None:
+            cache.put(_cache_key(assets[i], YAMNET_SR), results[i])
+
+    for i, _, _, decoded_before in batch:
+        assets[i].release(None if not decoded_before else YAMNET_SR)
+
+
+def extract_yamnet_embeddings(audios, max_batch_seconds=600.0):
+    """
+    输入：音频路径 / AudioAsset 列表
+    输出：(N, 1024) embedding，逐条与 extract_yamnet_embedding 一致
+
+    多条音频按 patch 网格对齐后拼接成一条波形，
+    总长不超过 max_batch_seconds 时只调用一次 YAMNet，
+    再按各段帧偏移切回，逐条求平均。
+    每批填满立即运行并释放该批的波形，内存只与单批长度有关（不随输入总长增长）。
+    """
+    assets = [as_audio_asset(a) for a in audios]
+    results = [None] * len(assets)
+
+    # ---- 缓存命中的直接返回 ----
+    cache = get_feature_cache()
+    pending = []
+    for i, asset in enumerate(assets):
+        if cache is not None:
+            cached = cache.get(_cache_key(asset, YAMNET_SR))
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append(i)
+
+    # ---- 贪心打包：每批填满即运行，写出后释放该批音频的缓存视图 ----
+    max_batch_samples = int(max_batch_seconds * YAMNET_SR)
+    yamnet = load_yamnet() if pending else None
+    batch, batch_len = [], 0
+    for i in pending:
+        decoded_before = assets[i].is_decoded
+        y, _ = assets[i].load(YAMNET_SR)
+        seg_len = _yamnet_segment_length(len(y))
+        if batch and batch_len + seg_len > max_batch_samples:
+            _run_yamnet_batch(yamnet, batch, assets, results, cache)
+            batch, batch_len = [], 0
+        batch.append((i, y, seg_len, decoded_before))
+        batch_len += seg_len
+    if batch:
+        _run_yamnet_batch(yamnet, batch, assets, results, cache)
+
+    if not results:
+        return np.zeros((0, 1024), dtype=np.float32)
+    return np.stack(results)
+
+
 # ==============================
 # 🔥 单文件测试
 # ==============================
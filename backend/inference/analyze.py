@@ -1,30 +1,149 @@
 # backend/inference/analyze.py
 
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from .emotion_recognition import predict_emotion
-from .style_recognition import predict_style
+from .emotion_recognition import predict_emotion, predict_emotion_many
+from .style_recognition import predict_style, predict_style_many
+from backend.features.yamnet_extract import load_yamnet
+from backend.models.registry import registry
+from backend.utils.audio_asset import as_audio_asset
+from backend.utils.tracing import span
+
+
+def _timed(fn, asset, name=None):
+    t0 = time.perf_counter()
+    with span(name or fn.__name__) as s:
+        result = fn(asset)
+        s.set(label=result[0])
+    return result, time.perf_counter() - t0
+
+
+def _traced_many(fn, assets, name, **kwargs):
+    with span(name, batch_size=len(assets)):
+        return fn(assets, **kwargs)
 
 
 class Analyzer:
-    def __init__(self):
+    def __init__(self, concurrent=False, executor=None):
+        """
+        concurrent: 默认是否并行执行 style / emotion 两个分支
+        executor:   并行模式使用的 Executor（不传则懒创建 2 线程池）
+        """
         self.root = Path(__file__).resolve().parent.parent
+        self.concurrent = concurrent
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="analyzer"
+                )
+            return self._executor
+
+    def preload(self, style=True, emotion=True):
+        """显式加载模型（默认第一次 analyze 时才加载）"""
+        if style:
+            registry.preload(["style_model", "style_label_encoder"])
+        if emotion:
+            registry.preload(["emotion_model"])
+            load_yamnet().warmup()
+        return self
 
-    def analyze(self, audio_path: str) -> dict:
-        audio_path = str(audio_path)
+    @staticmethod
+    def _as_asset(audio):
+        if isinstance(audio, Path):
+            audio = str(audio)
+        return as_audio_asset(audio)
 
-        # 风格、概率
-        style, style_prob = predict_style(audio_path)
+    def analyze(self, audio, concurrent=None) -> dict:
+        """
+        audio: 音频路径或 AudioAsset（两个分支共享同一次解码）
+        concurrent: None 时使用构造参数；True 时 style 分支交给 executor，
+                    emotion 分支在当前线程执行，两者重叠
+        返回值额外包含 "timings"：各分支耗时（秒）
+        """
+        asset = self._as_asset(audio)
+        if concurrent is None:
+            concurrent = self.concurrent
 
-        # 情绪、概率
-        emotion, emotion_prob = predict_emotion(audio_path)
+        t0 = time.perf_counter()
+        with span("analyze", concurrent=bool(concurrent)) as s:
+            if concurrent:
+                (style, style_prob), t_style, (emotion, emotion_prob), t_emotion = \
+                    self._analyze_concurrent(asset)
+            else:
+                # 风格、概率
+                (style, style_prob), t_style = _timed(predict_style, asset, "analyze.style")
+
+                # 情绪、概率
+                (emotion, emotion_prob), t_emotion = _timed(predict_emotion, asset, "analyze.emotion")
+
+            # 特征缓存全部命中时两个分支都不解码；只在已解码时记录时长，不为 tracing 额外解码
+            if asset.is_decoded:
+                s.set(audio_duration=asset.duration)
 
         return {
             "style": style,
             "emotion": emotion,
             "style_prob": style_prob,
-            "emotion_prob": emotion_prob
+            "emotion_prob": emotion_prob,
+            "timings": {
+                "style": t_style,
+                "emotion": t_emotion,
+                "total": time.perf_counter() - t0,
+            },
         }
 
+    def _analyze_concurrent(self, asset):
+        # 复制当前 context，style 分支的 span 挂在同一个父 span 下
+        ctx = contextvars.copy_context()
+        style_future = self.executor.submit(ctx.run, _timed, predict_style, asset, "analyze.style")
+        try:
+            emotion_res, t_emotion = _timed(predict_emotion, asset, "analyze.emotion")
+        except BaseException:
+            # emotion 失败：style 未开始则取消；已在运行则等待结束，
+            # style 自身的异常优先抛出（与顺序执行时的报错顺序一致）
+            if not style_future.cancel():
+                style_future.result()
+            raise
+        style_res, t_style = style_future.result()
+        return style_res, t_style, emotion_res, t_emotion
+
+    def analyze_many(self, audios, max_workers=None) -> list:
+        """
+        批量分析，返回与 analyze 相同结构的 dict 列表
+            - style 特征在线程池中并行提取，YAMNet 批量分支同时进行
+            - 每个模型对整批只调用一次 predict_proba，标签取 argmax
+        """
+        assets = [self._as_asset(a) for a in audios]
+        if not assets:
+            return []
+
+        with span("analyze_many", batch_size=len(assets)), \
+                ThreadPoolExecutor(max_workers=max_workers) as pool:
+            emotion_future = pool.submit(
+                contextvars.copy_context().run, _traced_many, predict_emotion_many, assets,
+                "analyze_many.emotion",
+            )
+            styles = _traced_many(predict_style_many, assets, "analyze_many.style", executor=pool)
+            emotions = emotion_future.result()
+
+        return [
+            {
+                "style": style,
+                "emotion": emotion,
+                "style_prob": style_prob,
+                "emotion_prob": emotion_prob
+            }
+            for (style, style_prob), (emotion, emotion_prob) in zip(styles, emotions)
+        ]
+
 
 # 全局单例
 analyzer = Analyzer()
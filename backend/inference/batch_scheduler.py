@@ -0,0 +1,166 @@
+# backend/inference/batch_scheduler.py
+#
+# 分析请求的动态 micro-batching：
+#   - 多个线程并发 submit()，后台线程最多攒 max_batch_size 个或等待 max_latency_ms
+#   - 每批只调用一次 Analyzer.analyze_many（YAMNet 拼接推理 + 每个分类器一次 predict_proba）
+#   - 结果通过 Future 分发回各调用方
+#
+# 用法：
+#   batcher = AnalysisBatcher(max_batch_size=16, max_latency_ms=20)
+#   result = batcher.analyze("song.wav")         # 阻塞
+#   future = batcher.submit(asset)                # 非阻塞
+#   batcher.metrics()                             # 批填充率等统计
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .analyze import analyzer as default_analyzer
+
+_STOP = object()
+
+
+class AnalysisBatcher:
+
+    def __init__(self, analyzer=None, max_batch_size=8, max_latency_ms=20.0, max_workers=None):
+        """
+        max_batch_size: 每批最多请求数
+        max_latency_ms: 第一个请求到达后最多额外等待多久再发车
+        max_workers:    传给 analyze_many 的线程数
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.analyzer = analyzer or default_analyzer
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.max_workers = max_workers
+
+        self._queue = queue.Queue()
+        self._metrics_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._size_hist = {}
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._loop, name="analysis-batcher", daemon=True)
+        self._thread.start()
+
+    # ----------------------------------
+    # Public API
+    # ----------------------------------
+    def submit(self, audio) -> Future:
+        if self._closed:
+            raise RuntimeError("AnalysisBatcher is closed")
+        future = Future()
+        self._queue.put((audio, future, time.perf_counter()))
+        return future
+
+    def analyze(self, audio, timeout=None) -> dict:
+        return self.submit(audio).result(timeout)
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            batches = self._batches
+            return {
+                "batches": batches,
+                "items": self._items,
+                "mean_batch_size": self._items / batches if batches else 0.0,
+                # 实际批大小 / max_batch_size
+                "fill_rate": self._items / (batches * self.max_batch_size) if batches else 0.0,
+                "batch_size_hist": dict(sorted(self._size_hist.items())),
+                "mean_queue_wait": self._wait_total / self._items if self._items else 0.0,
+                "mean_batch_seconds": self._run_total / batches if batches else 0.0,
+            }
+
+    # ----------------------------------
+    # Scheduler loop
+    # ----------------------------------
+    def _collect(self):
+        """阻塞等第一个请求，再在截止时间内尽量攒满一批；返回 (batch, stop)"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            # 已被调用方取消的请求不进批
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+
+        # close() 之后仍在队列里的请求：取消
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[1].cancel()
+
+    def _run_batch(self, batch):
+        t_start = time.perf_counter()
+        audios = [audio for audio, _, _ in batch]
+        try:
+            results = self.analyzer.analyze_many(audios, max_workers=self.max_workers)
+        except Exception:
+            # 整批失败时逐个重跑，坏文件不拖累同批的其他请求
+            results = []
+            for audio in audios:
+                try:
+                    results.append(self.analyzer.analyze(audio))
+                except Exception as e:
+                    results.append(e)
+        t_batch = time.perf_counter() - t_start
+
+        waits = [t_start - t_submit for _, _, t_submit in batch]
+        with self._metrics_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._size_hist[len(batch)] = self._size_hist.get(len(batch), 0) + 1
+            self._wait_total += sum(waits)
+            self._run_total += t_batch
+
+        for (_, future, _), result, wait in zip(batch, results, waits):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+                continue
+            result.setdefault("timings", {})
+            result["timings"].update({
+                "queue_wait": wait,
+                "batch": t_batch,
+                "batch_size": len(batch),
+            })
+            future.set_result(result)
@@ -0,0 +1,87 @@
+# ============================
+# MusicGen conditioning cache
+# ============================
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ConditioningCache:
+    """
+    MusicGen 条件输入的内存 LRU 缓存
+
+    - 文本：key = prompt 文本哈希 → (input_ids, attention_mask, T5 last_hidden_state)
+    - 旋律：key = 波形内容哈希 + 采样率 → EnCodec codes（decoder_input_ids）
+    条目数超过 max_entries 时淘汰最久未用的。
+
+    复用范围：
+    - 文本：PromptBuilder 的条件文本不含 attempt / creativity，同一任务的各 attempt
+      prompt 相同，attempt ≥ 2 直接命中
+    - 旋律：attempt ≥ 2 的旋律经过随机变形，任务内不会命中；
+      attempt 1 的旋律在同一源音频的重复请求之间命中
+    stats() 按类型给出命中 / 未命中次数，用于核对实际复用情况。
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._kind_counts = {}   # kind → [hits, misses]
+
+    @staticmethod
+    def text_key(prompt):
+        return ("text", hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def melody_key(mel, sr):
+        digest = hashlib.sha1(np.ascontiguousarray(mel, dtype=np.float32).tobytes()).hexdigest()
+        return ("melody", digest, int(sr))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            counts = self._kind_counts.setdefault(key[0], [0, 0])
+            if value is None:
+                self.misses += 1
+                counts[1] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            counts[0] += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, fn):
+        value = self.get(key)
+        if value is None:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """{"entries", "text_hits", "text_misses", "melody_hits", "melody_misses"}"""
+        with self._lock:
+            out = {"entries": len(self._entries)}
+            for kind in ("text", "melody"):
+                hits, misses = self._kind_counts.get(kind, (0, 0))
+                out[f"{kind}_hits"] = hits
+                out[f"{kind}_misses"] = misses
+            return out
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,15 +1,22 @@
 import os
 import numpy as np
-import joblib
-import librosa
 
-from backend.features.yamnet_extract import extract_yamnet_embedding
+from backend.models.registry import registry
+from backend.features.yamnet_extract import (
+    extract_yamnet_embedding,
+    extract_yamnet_embeddings,
+    yamnet_fingerprint,
+)
+from backend.utils.audio_asset import AudioAsset, as_audio_asset
+from backend.utils.feature_cache import file_fingerprint, get_feature_cache, make_key
 
 # === 路径 ===
-MODEL_PATH = "backend/models/emotion_model.pkl"
+MODEL_PATH = registry.path("emotion_model")
 
-# === 加载模型 ===
-emotion_model = joblib.load(MODEL_PATH)
+
+# === 模型（首次使用时加载） ===
+def _emotion_model():
+    return registry.get("emotion_model")
 
 # === 你自己的标签顺序 ===
 emotion_labels = [
@@ -22,18 +29,52 @@ emotion_labels = [
 ]
 
 
-def predict_emotion(audio_path: str):
+def _emotion_prob_key(asset):
+    return make_key(
+        asset.content_hash(), "emotion_prob",
+        {"model": file_fingerprint(MODEL_PATH), "yamnet": yamnet_fingerprint()},
+    )
+
+
+def _emotion_results_from_proba(probs):
     """
-    输入音频路径，返回:
+    (N, 6) 概率 → [(emotion, prob_dict)]
+    标签取 argmax（与 XGBoost predict 一致），不再单独调用 predict
+    """
+    probs = np.atleast_2d(probs)
+    idx = np.argmax(probs, axis=1)
+    model_classes = getattr(_emotion_model(), "classes_", None)
+    if model_classes is not None:
+        idx = np.asarray(model_classes)[idx]
+    return [
+        (
+            emotion_labels[int(idx[n])],
+            {emotion_labels[i]: float(prob[i]) for i in range(len(emotion_labels))},
+        )
+        for n, prob in enumerate(probs)
+    ]
+
+
+def predict_emotion(audio):
+    """
+    输入音频路径或 AudioAsset，返回:
         emotion_label: str
         prob_dict: dict[label -> prob]
     """
 
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    if not isinstance(audio, AudioAsset) and not os.path.exists(audio):
+        raise FileNotFoundError(f"Audio file not found: {audio}")
+    asset = as_audio_asset(audio)
+
+    # 0. 概率缓存命中：跳过 YAMNet 与模型推理
+    cache = get_feature_cache()
+    if cache is not None:
+        cached = cache.get(_emotion_prob_key(asset))
+        if cached is not None:
+            return _emotion_results_from_proba(cached)[0]
 
     # 1. 提取 YAMNet embedding
-    embedding = extract_yamnet_embedding(audio_path)
+    embedding = extract_yamnet_embedding(asset)
 
     # 2. 平均多帧（训练一致）
     if len(embedding.shape) > 1:
@@ -41,19 +82,50 @@ def predict_emotion(audio_path: str):
 
     embedding = embedding.reshape(1, -1)
 
-    # 3. 预测类别
-    pred_idx = emotion_model.predict(embedding)[0]
-    emotion = emotion_labels[pred_idx]
-
-    # 4. 预测概率（XGBoost / sklearn 模型支持 predict_proba）
+    # 3. 预测概率（XGBoost / sklearn 模型支持 predict_proba），类别取 argmax
     try:
-        prob = emotion_model.predict_proba(embedding)[0]
-        prob_dict = {emotion_labels[i]: float(prob[i]) for i in range(len(emotion_labels))}
+        prob = _emotion_model().predict_proba(embedding)[0]
     except Exception:
         # 万一模型没有 prob 能力（不太可能）
+        pred_idx = _emotion_model().predict(embedding)[0]
+        emotion = emotion_labels[pred_idx]
         prob_dict = {emotion_labels[i]: (1.0 if i == pred_idx else 0.0) for i in range(len(emotion_labels))}
+        return emotion, prob_dict
+
+    if cache is not None:
+        cache.put(_emotion_prob_key(asset), prob)
+    return _emotion_results_from_proba(prob)[0]
+
 
-    return emotion, prob_dict
+def predict_emotion_many(audios):
+    """
+    批量情绪识别：
+        - YAMNet 走 extract_yamnet_embeddings（拼接后一次调用）
+        - predict_proba 对整个 (N, 1024) 矩阵只调用一次
+    返回与 predict_emotion 相同的 (emotion, prob_dict) 列表
+    """
+    assets = [as_audio_asset(a) for a in audios]
+    results = [None] * len(assets)
+
+    cache = get_feature_cache()
+    pending = []
+    for i, asset in enumerate(assets):
+        if cache is not None:
+            cached = cache.get(_emotion_prob_key(asset))
+            if cached is not None:
+                results[i] = _emotion_results_from_proba(cached)[0]
+                continue
+        pending.append(i)
+
+    if pending:
+        embeddings = extract_yamnet_embeddings([assets[i] for i in pending])
+        probs = _emotion_model().predict_proba(embeddings)
+        for i, prob, res in zip(pending, probs, _emotion_results_from_proba(probs)):
+            results[i] = res
+            if cache is not None:
+                cache.put(_emotion_prob_key(assets[i]), prob)
+
+    return results
 
 
 if __name__ == "__main__":
@@ -5,16 +5,28 @@
 # - Melody-aware multi-attempt generation
 # - Auto early-stop at high score
 
+import time
+from contextlib import contextmanager
 from pathlib import Path
 import numpy as np
 import librosa
+import soundfile as sf
 from scipy.spatial.distance import jensenshannon
 
 from backend.inference.analyze import analyzer
 from backend.inference.prompt_builder import PromptBuilder
+from backend.inference.melody_cache import MelodyExtractionCache
 from backend.inference.melody_extractor import MelodyExtractor
 from backend.inference.melody_transformer import MelodyTransformer
-from backend.inference.generate_music import MusicGenerator
+from backend.inference.pipelined import PipelinedExecutor
+from backend.utils.audio_asset import AudioAsset, as_audio_asset
+from backend.utils.thread_budget import (
+    configure_analysis_threads,
+    configure_generate_threads,
+    resolve_thread_budget,
+)
+from backend.utils.tracing import span, traced
+from backend.utils.transform_cache import transform_scoped
 
 
 # ============================================================
@@ -98,18 +110,68 @@ def compute_final_score(orig, gen, target_style, target_emotion):
     return result
 
 
+# MusicGen 输出采样率
+GENERATED_SR = 32000
+
+
+@contextmanager
+def _stage(timings, name, **attrs):
+    """
+    累计各阶段耗时（秒）到 timings[name]；timings 为 None 时不记录
+    同时开一个同名 tracing span（attrs 作为 span 属性）
+    """
+    t0 = time.perf_counter()
+    try:
+        with span(name, **attrs) as s:
+            yield s
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+
+
 # ============================================================
 # Full pipeline
 # ============================================================
 
 class FullMusicPipeline:
 
-    def __init__(self):
+    def __init__(self, concurrent_analysis=False, pitch_tracker=None, thread_budget=None):
+        """
+        thread_budget: (分析线程, 生成线程) / "A:G" / "auto"；不传读 MUSIC_THREAD_BUDGET，
+                       都未设置时不修改线程数（见 utils/thread_budget.py）
+                       TF 线程数只能在模型加载前设置，因此在构造时生效
+        """
+        self.thread_budget = resolve_thread_budget(thread_budget)
+        if self.thread_budget is not None:
+            configure_analysis_threads(self.thread_budget[0])
         self.analyzer = analyzer
-        self.prompt_builder = PromptBuilder()
-        self.melody_extractor = MelodyExtractor()
+        # style / emotion 两个分析分支是否并行（每个 attempt 都会分析一次）
+        self.concurrent_analysis = concurrent_analysis
+        # f0 后端（pyin / yin / autocorr，可加 +ds）；不传读 MELODY_PITCH_TRACKER
+        self.prompt_builder = PromptBuilder(pitch_tracker=pitch_tracker)
+        # 最佳窗口 / 调性 / 旋律片段每个源音频只算一次，build_melody_info 与各 attempt 共用
+        self.melody_extractor = MelodyExtractor(
+            pitch_tracker=pitch_tracker,
+            cache=MelodyExtractionCache(),
+        )
         self.melody_transformer = MelodyTransformer()
-        self.music_gen = MusicGenerator()
+        self._music_gen = None
+
+    @property
+    def music_gen(self):
+        """MusicGen（torch / transformers）在第一次生成时才导入并加载"""
+        if self._music_gen is None:
+            from backend.inference.generate_music import MusicGenerator
+            if self.thread_budget is not None:
+                configure_generate_threads(self.thread_budget[1])
+            self._music_gen = MusicGenerator()
+        return self._music_gen
+
+    def preload(self):
+        """服务启动时显式加载全部模型（分类器、YAMNet、MusicGen）"""
+        self.analyzer.preload()
+        _ = self.music_gen
+        return self
 
     @staticmethod
     def guidance_for_attempt(a):
@@ -118,19 +180,18 @@ class FullMusicPipeline:
     # ----------------------------------
     # Melody info
     # ----------------------------------
-    def build_melody_info(self, audio_path):
+    def build_melody_info(self, audio):
 
-        tmp = self.melody_extractor.extract_melody_to_wav(
-            audio_path,
+        # 旋律片段直接在内存中传递，不再写临时 wav
+        source = as_audio_asset(audio)
+        # 整曲调性与所选窗口的局部调性来自同一次 CQT
+        y, sr, info = self.melody_extractor.extract_melody(
+            source,
             strength=0.9,
             weaken_level=0,
-            output_path="backend/output/_tmp_analysis_melody.wav",
+            return_info=True,
         )
 
-        y_full, sr_full = self.melody_extractor._load_audio(audio_path)
-        tonic_pc, mode, key_name = self.melody_extractor._detect_key(y_full, sr_full)
-
-        y, sr = self.melody_extractor._load_audio(tmp)
         f0 = self.melody_extractor._extract_f0(y, sr)
 
         if f0 is None:
@@ -159,7 +220,8 @@ class FullMusicPipeline:
         rhythm_score = float(scorer.rhythm_score(y, sr))
 
         return {
-            "key": key_name,
+            "key": info["key"],
+            "window_key": info["window_key"],
             "f0_valid": f0_valid,
             "pitch_range": pitch_range,
             "hook_score": hook_score,
@@ -168,28 +230,150 @@ class FullMusicPipeline:
             "contour_score": contour_score,
         }
 
+    # ----------------------------------
+    # Attempt helpers
+    # ----------------------------------
+    def _prepare_attempt(self, source, melody_info, target_style, target_emotion,
+                         output_dir, attempt, prev_score, save_intermediates=False):
+        """
+        构建某一次 attempt 的 prompt / melody / guidance
+        melody 为内存中的 AudioAsset；save_intermediates=True 时另存旋律 wav
+        """
+
+        # --- prompt ---
+        with span("prompt_build", attempt=attempt):
+            prompt = self.prompt_builder.build_prompt(
+                melody_info=melody_info,
+                target_style=target_style,
+                target_emotion=target_emotion,
+                attempt=attempt,
+                creativity=1.0,
+            )
+
+        print(f"\n🧠 Prompt (attempt {attempt}):")
+        print(prompt)
+
+        # --- melody extract ---
+        mel, sr = self.melody_extractor.extract_melody(
+            source,
+            target_style=target_style,
+            target_emotion=target_emotion,
+            strength=0.9,
+            weaken_level=attempt - 1,
+        )
+        if save_intermediates:
+            sf.write(str(output_dir / f"melody_attempt_{attempt}.wav"), mel, sr)
+
+        # --- melody transform ---
+        with span("melody.transform", attempt=attempt):
+            mel, sr = self.melody_transformer.transform_array(
+                mel, sr,
+                attempt=attempt,
+                prev_score=prev_score,
+            )
+        if save_intermediates and attempt > 1:
+            sf.write(str(output_dir / f"melody_attempt_{attempt}_t{attempt}.wav"), mel, sr)
+
+        return {
+            "attempt": attempt,
+            "prompt": prompt,
+            "melody": AudioAsset.from_array(mel, sr),
+            "guidance": self.guidance_for_attempt(attempt),
+            "out_file": output_dir / f"generated_attempt_{attempt}.wav",
+        }
+
+    def _generate_candidate(self, cand, target_style, cancel_event=None):
+        """单个 attempt 的 MusicGen 生成，返回 32kHz float32 数组"""
+        return self.music_gen.generate_with_melody(
+            prompt=cand["prompt"],
+            melody_path=cand["melody"],
+            output_path=None,
+            target_seconds=15.0,
+            guidance_scale=cand["guidance"],
+            temperature=1.0,
+            top_p=0.95,
+            do_sample=True,
+
+            # ======================================================
+            # ★★★ 新增：传入 style=target_style
+            # ======================================================
+            style=target_style,
+            cancel_event=cancel_event,
+        )
+
+    def _score_candidate(self, orig, audio, target_style, target_emotion):
+        """分析生成结果（路径或 AudioAsset）并打分"""
+
+        # --- analyze ---
+        gen = self.analyzer.analyze(audio, concurrent=self.concurrent_analysis)
+
+        # --- score ---
+        score_info = compute_final_score(orig, gen, target_style, target_emotion)
+        score_total = score_info["total"]
+
+        print("\n📊 Score Breakdown:")
+        print(f"  Total Score:  {score_total:.2f} / 100")
+        print(f"  Style Gain:   {score_info['style_gain']:+.3f}")
+        print(f"  Emotion Gain: {score_info['emotion_gain']:+.3f}")
+        print(f"  Escape:       {score_info['escape']:+.3f}")
+        print(f"  JS Diverg.:   {score_info['js']:.3f}")
+        print(f"  Confidence:   {score_info['confidence']:.3f}")
+
+        return gen, score_total
+
     # ----------------------------------
     # Main process
     # ----------------------------------
+    @traced("pipeline.process")
+    @transform_scoped
     def process(self, audio_path, target_style, target_emotion,
-                output_dir="backend/output", max_attempts=4):
+                output_dir="backend/output", max_attempts=4,
+                generation_mode="sequential", early_stop=True,
+                batch_guidance=None, max_batch_size=None, timings=None,
+                save_intermediates=False):
+        """
+        generation_mode:
+            - "sequential": 逐个 attempt 生成 + 评分，early_stop=True 时 ≥90 分提前结束
+            - "batched":    先构建全部 attempt 的 prompt / melody / guidance，
+                            按 guidance 分组批量 generate，再统一评分取最优
+            - "pipelined":  与 sequential 结果相同；后台线程生成 attempt N+1 的同时
+                            主线程分析 / 评分 attempt N，early stop 时取消进行中的生成
+                            （配合 thread_budget 拆分 TF / torch 线程）
+        batch_guidance: batched 模式下所有候选共用的 guidance（→ 只需一次 generate）
+                 None 时取 attempt 1 的 guidance；传 "per_attempt" 时保留各 attempt 自己的
+                 guidance（3.8 / 3.6 / 3.4 / 3.2，按 guidance 分组，每组各 generate 一次）
+        max_batch_size: batched 模式下每次 generate 的最大 batch
+        timings: 传入 dict 时累计各阶段耗时（analyze_original / melody_info /
+                 prepare / generate / score，单位秒；pipelined 模式下 generate 与 score 重叠）
+        save_intermediates: 旋律、变形旋律与每个 attempt 的生成结果都写 wav；
+                 默认各阶段只在内存中传递数组，最后只写最佳结果
+        返回最佳结果的 wav 路径
+        """
+        if generation_mode not in ("sequential", "batched", "pipelined"):
+            raise ValueError(f"Unknown generation_mode: {generation_mode}")
 
         audio_path = Path(audio_path)
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
 
+        # 原音频只解码一次，各阶段共享（16k / 32k 视图懒生成）
+        source = as_audio_asset(str(audio_path))
+
         # ======================================================
         # ★★★ 新增：打印原音乐 style / emotion
         # ======================================================
         print("🔍 Analyzing original audio…")
-        orig = self.analyzer.analyze(str(audio_path))
+        with _stage(timings, "analyze_original") as s:
+            orig = self.analyzer.analyze(source, concurrent=self.concurrent_analysis)
+            s.set(style=orig["style"], emotion=orig["emotion"])
         print(f"🎵 Original Style:   {orig['style']}")
         print(f"😊 Original Emotion: {orig['emotion']}")
 
         # --- Melody info ---
         print("\n🎼 Extracting melody info…")
         try:
-            melody_info = self.build_melody_info(str(audio_path))
+            with _stage(timings, "melody_info"):
+                melody_info = self.build_melody_info(source)
         except Exception as e:
             print("[WARN] melody info failed:", e)
             melody_info = {
@@ -207,88 +391,153 @@ class FullMusicPipeline:
         best_score = -1
         best_output = None
         best_result = None
+        best_audio = None
+
+        if generation_mode == "batched":
+            print("\n🎶 Batched multi-candidate generation…")
+            # 默认所有候选共用一个 guidance，才能合并成一次 generate
+            shared_guidance = self.guidance_for_attempt(1) if batch_guidance is None else batch_guidance
+            candidates = []
+            for attempt in range(1, max_attempts + 1):
+                print(f"\n========== Candidate {attempt}/{max_attempts} ==========")
+                with _stage(timings, "prepare", attempt=attempt):
+                    cand = self._prepare_attempt(
+                        source, melody_info, target_style, target_emotion,
+                        output_dir, attempt, prev_score=best_score,
+                        save_intermediates=save_intermediates,
+                    )
+                if batch_guidance != "per_attempt":
+                    cand["guidance"] = shared_guidance
+                candidates.append(cand)
+
+            # --- generate（同 guidance 的候选合并为一批） ---
+            groups = {}
+            for cand in candidates:
+                groups.setdefault(cand["guidance"], []).append(cand)
+
+            for guidance, group in groups.items():
+                print(f"\n🎧 Generating {len(group)} MusicGen candidates (guidance={guidance})…")
+                with _stage(timings, "generate", attempts=[c["attempt"] for c in group],
+                            guidance=guidance):
+                    audios = self.music_gen.generate_batch_with_melody(
+                        prompts=[c["prompt"] for c in group],
+                        melody_paths=[c["melody"] for c in group],
+                        output_paths=None,
+                        target_seconds=15.0,
+                        guidance_scale=guidance,
+                        temperature=1.0,
+                        top_p=0.95,
+                        do_sample=True,
+                        max_batch_size=max_batch_size,
+                    )
+                for cand, audio in zip(group, audios):
+                    cand["audio"] = audio
+                    if save_intermediates:
+                        sf.write(str(cand["out_file"]), audio, GENERATED_SR)
+
+            # --- score all, pick best ---
+            for cand in candidates:
+                print(f"\n========== Score candidate {cand['attempt']}/{max_attempts} ==========")
+                with _stage(timings, "score", attempt=cand["attempt"]) as s:
+                    gen, score_total = self._score_candidate(
+                        orig, AudioAsset.from_array(cand["audio"], GENERATED_SR),
+                        target_style, target_emotion,
+                    )
+                    s.set(score=score_total)
+                if score_total > best_score:
+                    best_score = score_total
+                    best_output = str(cand["out_file"])
+                    best_result = gen
+                    best_audio = cand["audio"]
+
+        elif generation_mode == "pipelined":
+            print("\n🎶 Pipelined multi-attempt generation…")
+            # 生成线程只读 best_score（prepare 的 prev_score），评分在主线程更新
+            state = {"best_score": best_score}
+
+            def produce(attempt, cancel_event):
+                print(f"\n========== Attempt {attempt}/{max_attempts} (generate) ==========")
+                with _stage(timings, "prepare", attempt=attempt):
+                    cand = self._prepare_attempt(
+                        source, melody_info, target_style, target_emotion,
+                        output_dir, attempt, prev_score=state["best_score"],
+                        save_intermediates=save_intermediates,
+                    )
+                print("\n🎧 Generating MusicGen output…")
+                with _stage(timings, "generate", attempt=attempt, guidance=cand["guidance"]):
+                    audio = self._generate_candidate(cand, target_style, cancel_event=cancel_event)
+                if save_intermediates:
+                    sf.write(str(cand["out_file"]), audio, GENERATED_SR)
+                return cand, audio
+
+            # 模型在主线程加载（加载失败直接抛出；torch 线程预算在此生效）
+            _ = self.music_gen
+            with PipelinedExecutor(produce, range(1, max_attempts + 1)) as pipe:
+                for attempt, (cand, audio) in pipe:
+                    print(f"\n========== Attempt {attempt}/{max_attempts} (score) ==========")
+                    with _stage(timings, "score", attempt=attempt) as s:
+                        gen, score_total = self._score_candidate(
+                            orig, AudioAsset.from_array(audio, GENERATED_SR),
+                            target_style, target_emotion,
+                        )
+                        s.set(score=score_total)
+
+                    if score_total > best_score:
+                        best_score = state["best_score"] = score_total
+                        best_output = str(cand["out_file"])
+                        best_result = gen
+                        best_audio = audio
+
+                    if early_stop and score_total >= 90:
+                        print("✨ High-quality result achieved (A+). Early stop (cancel in-flight generation).")
+                        break
 
-        print("\n🎶 Multi-attempt generation…")
-        for attempt in range(1, max_attempts + 1):
-
-            print(f"\n========== Attempt {attempt}/{max_attempts} ==========")
-
-            # --- prompt ---
-            prompt = self.prompt_builder.build_prompt(
-                melody_info=melody_info,
-                target_style=target_style,
-                target_emotion=target_emotion,
-                attempt=attempt,
-                creativity=1.0,
-            )
-
-            print("\n🧠 Prompt:")
-            print(prompt)
-
-            # --- melody extract ---
-            raw = self.melody_extractor.extract_melody_to_wav(
-                str(audio_path),
-                target_style=target_style,
-                target_emotion=target_emotion,
-                strength=0.9,
-                output_path=output_dir / f"melody_attempt_{attempt}.wav",
-                weaken_level=attempt - 1,
-            )
-
-            # --- melody transform ---
-            transformed = self.melody_transformer.transform(
-                raw,
-                attempt=attempt,
-                prev_score=best_score,
-            )
-
-            # --- generate ---
-            out_file = output_dir / f"generated_attempt_{attempt}.wav"
-            print("\n🎧 Generating MusicGen output…")
-
-            self.music_gen.generate_with_melody(
-                prompt=prompt,
-                melody_path=str(transformed),
-                output_path=str(out_file),
-                target_seconds=15.0,
-                guidance_scale=self.guidance_for_attempt(attempt),
-                temperature=1.0,
-                top_p=0.95,
-                do_sample=True,
+        else:
+            print("\n🎶 Multi-attempt generation…")
+            for attempt in range(1, max_attempts + 1):
+
+                print(f"\n========== Attempt {attempt}/{max_attempts} ==========")
+
+                with _stage(timings, "prepare", attempt=attempt):
+                    cand = self._prepare_attempt(
+                        source, melody_info, target_style, target_emotion,
+                        output_dir, attempt, prev_score=best_score,
+                        save_intermediates=save_intermediates,
+                    )
+
+                # --- generate ---
+                out_file = cand["out_file"]
+                print("\n🎧 Generating MusicGen output…")
+
+                with _stage(timings, "generate", attempt=attempt, guidance=cand["guidance"]):
+                    audio = self._generate_candidate(cand, target_style)
+                if save_intermediates:
+                    sf.write(str(out_file), audio, GENERATED_SR)
+
+                with _stage(timings, "score", attempt=attempt) as s:
+                    gen, score_total = self._score_candidate(
+                        orig, AudioAsset.from_array(audio, GENERATED_SR),
+                        target_style, target_emotion,
+                    )
+                    s.set(score=score_total)
 
                 # ======================================================
-                # ★★★ 新增：传入 style=target_style
+                # ★★★ 新增：best-of，仅 3 行
                 # ======================================================
-                style=target_style,
-            )
-
-            # --- analyze ---
-            gen = self.analyzer.analyze(str(out_file))
-
-            # --- score ---
-            score_info = compute_final_score(orig, gen, target_style, target_emotion)
-            score_total = score_info["total"]
+                if score_total > best_score:
+                    best_score = score_total
+                    best_output = str(out_file)
+                    best_result = gen
+                    best_audio = audio
 
-            print("\n📊 Score Breakdown:")
-            print(f"  Total Score:  {score_total:.2f} / 100")
-            print(f"  Style Gain:   {score_info['style_gain']:+.3f}")
-            print(f"  Emotion Gain: {score_info['emotion_gain']:+.3f}")
-            print(f"  Escape:       {score_info['escape']:+.3f}")
-            print(f"  JS Diverg.:   {score_info['js']:.3f}")
-            print(f"  Confidence:   {score_info['confidence']:.3f}")
-
-            # ======================================================
-            # ★★★ 新增：best-of，仅 3 行
-            # ======================================================
-            if score_total > best_score:
-                best_score = score_total
-                best_output = str(out_file)
-                best_result = gen
+                # --- early stop（你的逻辑，不动） ---
+                if early_stop and score_total >= 90:
+                    print("✨ High-quality result achieved (A+). Early stop.")
+                    break
 
-            # --- early stop（你的逻辑，不动） ---
-            if score_total >= 90:
-                print("✨ High-quality result achieved (A+). Early stop.")
-                break
+        # 中间结果未落盘时只写最佳结果
+        if best_audio is not None and not save_intermediates:
+            sf.write(best_output, best_audio, GENERATED_SR)
 
         print("\n🎉 Final Result")
         print("Best Score:", best_score)
@@ -299,6 +548,8 @@ class FullMusicPipeline:
             print("Best Style: N/A")
             print("Best Emotion: N/A")
         print("Best File:", best_output)
+        if self._music_gen is not None and self._music_gen.conditioning_cache is not None:
+            print("Conditioning cache:", self._music_gen.conditioning_cache.stats())
 
         return best_output
 
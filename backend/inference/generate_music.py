@@ -2,33 +2,193 @@
 # MusicGenerator vFinal (anti-mid-collapse)
 # ============================
 
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
 import time
 from pathlib import Path
 import numpy as np
-import librosa
 import soundfile as sf
 import torch
-from transformers import AutoProcessor, MusicgenForConditionalGeneration
+from transformers import (
+    AutoProcessor,
+    MusicgenForConditionalGeneration,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
+from transformers.modeling_outputs import BaseModelOutput
+
+from backend.inference.conditioning_cache import ConditioningCache
+from backend.inference.musicgen_streamer import MusicgenStreamer, StreamingPostProcessor
+from backend.utils.audio_asset import as_audio_asset
+from backend.utils.tracing import span
+
+# CPU 推理精度：fp32（默认）/ bf16 autocast / int8 动态量化（decoder 的 Linear）
+PRECISIONS = ("fp32", "bf16", "int8")
+PRECISION_ENV = "MUSICGEN_PRECISION"
+
+
+def cpu_supports_bf16():
+    """CPU 是否有原生 bf16 指令（AVX512-BF16 / AMX），否则 bf16 反而更慢"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+class GenerationCancelled(Exception):
+    """cancel_event 被设置，生成在中途终止（结果丢弃）"""
+
+
+class _CancelCriteria(StoppingCriteria):
+    """每个解码步检查一次 cancel_event，设置后 generate 在当前步结束"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
 
 class MusicGenerator:
-    def __init__(self, model_name="facebook/musicgen-small", device=None):
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.processor = AutoProcessor.from_pretrained(model_name)
-        self.model = MusicgenForConditionalGeneration.from_pretrained(
+    def __init__(self, model_name="facebook/musicgen-small", device=None, precision=None,
+                 conditioning_cache_size=32):
+        """
+        conditioning_cache_size: 文本编码 / 旋律 codes 缓存条目上限，0 表示关闭
+        precision: CPU 推理精度（不传则读 MUSICGEN_PRECISION，默认 fp32）
+            - "fp32": 原始精度
+            - "bf16": generate 包在 torch.autocast(cpu, bfloat16) 中；硬件不支持时回退 fp32
+            - "int8": decoder 的 nn.Linear 动态 int8 量化
+        CUDA 上始终使用 fp16（与原逻辑一致）
+        """
+        self._resolve_device(device, precision)
+
+        processor = AutoProcessor.from_pretrained(model_name)
+        model = MusicgenForConditionalGeneration.from_pretrained(
             model_name,
-            torch_dtype=torch.float16 if self.device=="cuda" else torch.float32
-        ).to(self.device)
+            torch_dtype=torch.float16 if self.device=="cuda" else torch.float32,
+            low_cpu_mem_usage=True,
+        )
+        self._attach(model, processor, conditioning_cache_size)
+        print(f"[MusicGen] Loaded {model_name} on {self.device} ({self.precision})")
+
+    @classmethod
+    def from_components(cls, model, processor, device=None, precision=None,
+                        conditioning_cache_size=32):
+        """
+        用已构建好的 model / processor 创建（不访问 Hub）
+        例如 benchmark 中随机初始化的小型 MusicGen 配置
+        """
+        self = cls.__new__(cls)
+        self._resolve_device(device, precision)
+        self._attach(model, processor, conditioning_cache_size)
+        return self
+
+    def _resolve_device(self, device, precision):
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+
+        precision = precision or os.environ.get(PRECISION_ENV, "fp32")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        if self.device == "cuda":
+            precision = "fp16"
+        elif precision == "bf16" and not cpu_supports_bf16():
+            print("[MusicGen] bf16 not supported on this CPU → fp32")
+            precision = "fp32"
+        self.precision = precision
+
+    def _attach(self, model, processor, conditioning_cache_size):
+        self.processor = processor
+        self.model = model.to(self.device)
         if self.device=="cuda":
             self.model = self.model.half()
+        elif self.precision == "int8":
+            torch.ao.quantization.quantize_dynamic(
+                self.model.decoder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        self.model.eval()
 
         self.seconds_per_token = 0.0305
+        self.conditioning_cache = (
+            ConditioningCache(conditioning_cache_size) if conditioning_cache_size else None
+        )
+
+    def _precision_context(self):
+        if self.precision == "bf16":
+            return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
 
-    def _load_melody(self, path):
-        y, sr = sf.read(path)
-        if y.ndim>1: y = y.mean(axis=1)
-        if sr != 32000:
-            y = librosa.resample(y, sr, 32000)
-        return y.astype(np.float32), 32000
+    def _load_melody(self, melody):
+        """melody: 路径或 AudioAsset（内存数组用 AudioAsset.from_array）→ 32kHz mono float32"""
+        y, sr = as_audio_asset(melody).load(32000)
+        return y.astype(np.float32), sr
+
+    # ----------------------------------
+    # Conditioning（文本编码 / 旋律 codes，走缓存）
+    # ----------------------------------
+    def _encode_text(self, prompt):
+        def compute():
+            tok = self.processor.tokenizer(
+                [prompt], padding=True, return_tensors="pt"
+            ).to(self.device)
+            with torch.no_grad(), self._precision_context():
+                hidden = self.model.text_encoder(
+                    input_ids=tok["input_ids"],
+                    attention_mask=tok["attention_mask"],
+                ).last_hidden_state
+            return tok["input_ids"], tok["attention_mask"], hidden
+
+        return self.conditioning_cache.get_or_compute(
+            ConditioningCache.text_key(prompt), compute
+        )
+
+    def _encode_melody(self, mel, sr):
+        def compute():
+            feats = self.processor.feature_extractor(
+                mel, sampling_rate=sr, return_tensors="pt"
+            ).to(self.device)
+            with torch.no_grad():
+                codes = self.model.audio_encoder.encode(
+                    feats["input_values"],
+                    padding_mask=feats.get("padding_mask"),
+                ).audio_codes
+            # (frames=1, bsz, codebooks, seq) → (bsz * codebooks, seq)
+            _, bsz, codebooks, seq_len = codes.shape
+            return codes[0].reshape(bsz * codebooks, seq_len)
+
+        return self.conditioning_cache.get_or_compute(
+            ConditioningCache.melody_key(mel, sr), compute
+        )
+
+    def _build_inputs(self, prompt, mel, sr, guidance_scale):
+        """
+        model.generate 的条件输入
+        缓存关闭时走 processor 原路径；开启时文本 hidden states 与旋律 codes 复用缓存，
+        并按 MusicGen 内部规则为 CFG 拼接无条件分支（全零 hidden / mask）
+        """
+        if self.conditioning_cache is None:
+            return self.processor(
+                text=[prompt],
+                audio=[mel],
+                sampling_rate=sr,
+                return_tensors="pt"
+            ).to(self.device)
+
+        input_ids, attention_mask, hidden = self._encode_text(prompt)
+        decoder_input_ids = self._encode_melody(mel, sr)
+
+        if guidance_scale is not None and guidance_scale > 1:
+            hidden = torch.cat([hidden, torch.zeros_like(hidden)], dim=0)
+            attention_mask = torch.cat([attention_mask, torch.zeros_like(attention_mask)], dim=0)
+
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "encoder_outputs": BaseModelOutput(last_hidden_state=hidden),
+            "decoder_input_ids": decoder_input_ids,
+        }
 
     @staticmethod
     def _mid_collapse_fix(audio, sr):
@@ -62,27 +222,38 @@ class MusicGenerator:
         return audio
 
     def generate_with_melody(
-        self, prompt, melody_path, output_path,
+        self, prompt, melody_path, output_path=None,
         target_seconds=20.0,
         guidance_scale=3.0,
         temperature=1.0,
         top_p=0.95,
         do_sample=True,
         max_new_tokens=None,
+        style=None,
+        cancel_event=None,
     ):
+        """
+        melody_path: 旋律 wav 路径或 AudioAsset
+        output_path: 为 None 时不写文件，直接返回 32kHz float32 数组；否则写 wav 并返回路径
+        style: 目标风格（full_pipeline 传入，当前不参与生成）
+        cancel_event: threading.Event；生成中被设置时在下一个解码步停止并抛 GenerationCancelled
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+
         mel, sr = self._load_melody(melody_path)
 
         if max_new_tokens is None:
             max_new_tokens = int(target_seconds / self.seconds_per_token)
 
-        inputs = self.processor(
-            text=[prompt],
-            audio=[mel],
-            sampling_rate=sr,
-            return_tensors="pt"
-        ).to(self.device)
+        with span("musicgen.conditioning") as s:
+            inputs = self._build_inputs(prompt, mel, sr, guidance_scale)
+            if self.conditioning_cache is not None:
+                s.set(**self.conditioning_cache.stats())
 
-        with torch.no_grad():
+        with span("musicgen.generate", tokens=max_new_tokens, guidance=guidance_scale,
+                  precision=self.precision, melody_seconds=len(mel) / sr), \
+                torch.no_grad(), self._precision_context():
             audio = self.model.generate(
                 **inputs,
                 do_sample=do_sample,
@@ -90,10 +261,153 @@ class MusicGenerator:
                 top_p=top_p,
                 guidance_scale=guidance_scale,
                 max_new_tokens=max_new_tokens,
+                stopping_criteria=StoppingCriteriaList(
+                    [_CancelCriteria(cancel_event)] if cancel_event is not None else []
+                ),
             )
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+
+        with span("musicgen.postprocess"):
+            audio = audio[0].cpu().float().numpy().reshape(-1)
+            audio = self._postprocess(audio, sr)
+
+        if output_path is None:
+            return audio.astype(np.float32)
 
-        audio = audio[0].cpu().numpy().reshape(-1)
+        sf.write(output_path, audio, 32000)
+        print(f"[MusicGen] Saved: {output_path}")
+        return output_path
 
+    # ----------------------------------
+    # Streaming
+    # ----------------------------------
+    def iter_generate_with_melody(
+        self, prompt, melody_path, output_path=None,
+        target_seconds=20.0,
+        guidance_scale=3.0,
+        temperature=1.0,
+        top_p=0.95,
+        do_sample=True,
+        max_new_tokens=None,
+        play_seconds=1.5,
+        finalize=True,
+        stats=None,
+    ):
+        """
+        流式生成：边生成边解码，逐块 yield 32kHz float32 音频
+        output_path: 不为 None 时边收边追加写入；finalize=True 时结束后
+                     对未修改的原始样本做完整的 _postprocess 后重写一次（与非流式输出一致）
+        stats: 传入 dict 时写入 time_to_first_chunk / total_time / num_chunks
+        """
+        t0 = time.perf_counter()
+        stats = stats if stats is not None else {}
+        stats.update(time_to_first_chunk=None, total_time=None, num_chunks=0)
+
+        mel, sr = self._load_melody(melody_path)
+        if max_new_tokens is None:
+            max_new_tokens = int(target_seconds / self.seconds_per_token)
+
+        inputs = self._build_inputs(prompt, mel, sr, guidance_scale)
+
+        streamer = MusicgenStreamer(
+            self.model, play_steps=max(int(play_seconds / self.seconds_per_token), 10)
+        )
+        post = StreamingPostProcessor(
+            sr, expected_samples=len(mel) + max_new_tokens * self.seconds_per_token * sr
+        )
+
+        errors = []
+
+        def run():
+            try:
+                with span("musicgen.generate_stream", tokens=max_new_tokens, guidance=guidance_scale,
+                          precision=self.precision), \
+                        torch.no_grad(), self._precision_context():
+                    self.model.generate(
+                        **inputs,
+                        do_sample=do_sample,
+                        temperature=temperature,
+                        top_p=top_p,
+                        guidance_scale=guidance_scale,
+                        max_new_tokens=max_new_tokens,
+                        streamer=streamer,
+                    )
+            except BaseException as e:
+                errors.append(e)
+                streamer.stop()
+
+        # 生成线程沿用调用方的 contextvars（tracing 父 span、transform_cache scope）
+        worker = threading.Thread(
+            target=contextvars.copy_context().run, args=(run,), name="musicgen-stream", daemon=True,
+        )
+        worker.start()
+
+        writer = sf.SoundFile(str(output_path), "w", samplerate=sr, channels=1) \
+            if output_path is not None else None
+
+        def emit(chunk):
+            if stats["time_to_first_chunk"] is None:
+                stats["time_to_first_chunk"] = time.perf_counter() - t0
+                print(f"[MusicGen] First chunk after {stats['time_to_first_chunk']:.2f}s")
+            stats["num_chunks"] += 1
+            if writer is not None:
+                writer.write(chunk)
+                writer.flush()
+
+        try:
+            for piece in streamer:
+                ready = post.push(piece)
+                if ready.size:
+                    emit(ready)
+                    yield ready
+            worker.join()
+            if errors:
+                raise errors[0]
+
+            ready = post.flush()
+            if ready.size:
+                emit(ready)
+                yield ready
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if output_path is not None and finalize:
+            # post.raw 未经流式修复，_postprocess 只作用一次
+            sf.write(str(output_path), self._postprocess(post.raw.copy(), sr), sr)
+            print(f"[MusicGen] Saved: {output_path}")
+
+        stats["total_time"] = time.perf_counter() - t0
+        print(f"[MusicGen] Stream done: first chunk {stats['time_to_first_chunk']}s, "
+              f"total {stats['total_time']:.2f}s")
+
+    def generate_with_melody_streaming(self, prompt, melody_path, output_path=None, sink=None, **kwargs):
+        """
+        阻塞版流式接口：每个音频块交给 sink(chunk)，同时增量写入 output_path
+        返回 {"output_path", "time_to_first_chunk", "total_time", "num_chunks"}
+        """
+        stats = {}
+        for chunk in self.iter_generate_with_melody(
+            prompt, melody_path, output_path=output_path, stats=stats, **kwargs
+        ):
+            if sink is not None:
+                sink(chunk)
+        stats["output_path"] = str(output_path) if output_path is not None else None
+        return stats
+
+    async def astream_with_melody(self, prompt, melody_path, output_path=None, **kwargs):
+        """异步迭代器版本：async for chunk in gen.astream_with_melody(...)"""
+        loop = asyncio.get_running_loop()
+        it = self.iter_generate_with_melody(prompt, melody_path, output_path=output_path, **kwargs)
+        done = object()
+        while True:
+            chunk = await loop.run_in_executor(None, next, it, done)
+            if chunk is done:
+                break
+            yield chunk
+
+    def _postprocess(self, audio, sr):
         # 新增中段修复
         audio = self._mid_collapse_fix(audio, sr)
         # 保留尾部修复
@@ -102,7 +416,77 @@ class MusicGenerator:
         # normalize
         if np.max(np.abs(audio)) > 1e-6:
             audio = audio / np.max(np.abs(audio)) * 0.98
+        return audio
 
-        sf.write(output_path, audio, 32000)
-        print(f"[MusicGen] Saved: {output_path}")
-        return output_path
+    def generate_batch_with_melody(
+        self, prompts, melody_paths, output_paths=None,
+        target_seconds=20.0,
+        guidance_scale=3.0,
+        temperature=1.0,
+        top_p=0.95,
+        do_sample=True,
+        max_new_tokens=None,
+        max_batch_size=None,
+    ):
+        """
+        多个候选一次 model.generate（batch=N），CPU 上单候选吞吐明显高于 N 次单独调用
+        prompts / melody_paths / output_paths 一一对应；
+        guidance_scale 等采样参数对整批相同（不同 guidance 请分组调用）
+        max_batch_size: 每次 generate 的最大 batch，None 表示全部一起
+        output_paths 为 None 时不写文件，返回 32kHz float32 数组列表
+        """
+        in_memory = output_paths is None
+        if in_memory:
+            output_paths = [None] * len(prompts)
+        if not (len(prompts) == len(melody_paths) == len(output_paths)):
+            raise ValueError("prompts / melody_paths / output_paths 长度不一致")
+
+        if max_new_tokens is None:
+            max_new_tokens = int(target_seconds / self.seconds_per_token)
+
+        results = []
+        step = max_batch_size or max(len(prompts), 1)
+        for i in range(0, len(prompts), step):
+            mels = [self._load_melody(m)[0] for m in melody_paths[i:i+step]]
+            sr = 32000
+
+            inputs = self.processor(
+                text=list(prompts[i:i+step]),
+                audio=mels,
+                sampling_rate=sr,
+                padding=True,
+                return_tensors="pt"
+            ).to(self.device)
+
+            print(f"[MusicGen] Batched generate: {len(mels)} candidates")
+            with span("musicgen.generate_batch", batch_size=len(mels), tokens=max_new_tokens,
+                      guidance=guidance_scale, precision=self.precision), \
+                    torch.no_grad(), self._precision_context():
+                audio = self.model.generate(
+                    **inputs,
+                    do_sample=do_sample,
+                    temperature=temperature,
+                    top_p=top_p,
+                    guidance_scale=guidance_scale,
+                    max_new_tokens=max_new_tokens,
+                )
+            audio = audio.float().cpu()
+
+            # 各条 melody 长度不同 → 按 padding_mask 去掉补齐部分
+            padding_mask = inputs.get("padding_mask")
+            if padding_mask is not None and hasattr(self.processor, "batch_decode"):
+                rows = self.processor.batch_decode(audio, padding_mask=padding_mask)
+            else:
+                rows = [a.numpy() for a in audio]
+
+            for row, output_path in zip(rows, output_paths[i:i+step]):
+                row = np.asarray(row, dtype=np.float32).reshape(-1)
+                row = self._postprocess(row, sr)
+                if in_memory:
+                    results.append(row.astype(np.float32))
+                    continue
+                sf.write(str(output_path), row, sr)
+                print(f"[MusicGen] Saved: {output_path}")
+                results.append(str(output_path))
+
+        return results
@@ -0,0 +1,72 @@
+# ============================
+# Melody extraction cache
+# ============================
+
+import threading
+from collections import OrderedDict
+
+
+class MelodyExtractionCache:
+    """
+    MelodyExtractor.extract_melody 结果的内存 LRU 缓存
+    value = (mel, sr, info)：最佳窗口旋律 + 窗口位置 / 整曲调性 / 窗口局部调性
+
+    key 只包含真正影响结果的输入：
+        - 源音频内容哈希（同一文件跨 attempt / 跨请求复用）
+        - target_sr、window_seconds、hop_seconds、search_mode
+        - coarse_top_k / refine_hop_seconds（仅 coarse 搜索）
+        - track_hpss（仅 low 模式）
+        - pitch tracker（窗口评分的 f0 后端）
+        - mode（low / 原样切片）
+    不参与 key：strength、weaken_level、target_style、target_emotion、输出路径、
+    min_score_threshold —— 它们不改变窗口搜索与旋律分离的结果。
+    缓存的数组在各 attempt 间共享，调用方不要原地修改。
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(extractor, asset, mode):
+        search = (extractor.search_mode,)
+        if extractor.search_mode == "coarse":
+            search += (extractor.coarse_top_k, extractor.refine_hop_seconds)
+        return (
+            "melody",
+            asset.content_hash(),
+            int(extractor.target_sr),
+            float(extractor.window_seconds),
+            float(extractor.hop_seconds),
+            search,
+            bool(extractor.track_hpss) if mode == "low" else None,
+            extractor.pitch_tracker.spec,
+            mode,
+        )
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
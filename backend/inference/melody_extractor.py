@@ -8,7 +8,12 @@ import librosa
 import soundfile as sf
 from scipy.signal import butter, filtfilt
 
+from backend.features.tonality import analyze_tonality
 from backend.inference.melody_scorer import MelodyScorer
+from backend.inference.melody_timeline import MelodyTimeline
+from backend.utils import transform_cache
+from backend.utils.audio_asset import as_audio_asset
+from backend.utils.tracing import span
 
 class MelodyExtractor:
     def __init__(
@@ -17,63 +22,71 @@ class MelodyExtractor:
         window_seconds: float = 5.0,     # ★★★ 从 3 秒 → 5 秒 ★★★
         hop_seconds: float = 0.5,
         min_score_threshold: float = 0.2,
+        search_mode: str = "exhaustive",
+        coarse_top_k: int = 5,
+        refine_hop_seconds: float = 0.1,
+        track_hpss: bool = False,
+        pitch_tracker=None,
+        cache=None,
     ):
+        """
+        search_mode:
+            - "exhaustive": 每个窗口单独跑 MelodyScorer.score（原逻辑）
+            - "timeline":   整曲 f0 / onset / RMS / ZCR 只算一次，窗口切片评分
+            - "coarse":     廉价代理分排序 → 只对 top-K 做完整评分，
+                            再在最佳窗口附近以 refine_hop_seconds 细化
+        track_hpss: True 时对整曲做一次 HPSS（任务内缓存），各窗口直接切片；
+                    片段边缘带整曲上下文，与逐片段 HPSS 略有差异
+        pitch_tracker: f0 后端（见 features/pitch_tracker.py），窗口评分与 _extract_f0 共用
+        cache: MelodyExtractionCache；同一音频、同一搜索参数的 extract_melody 只计算一次
+               （weaken_level / strength / 目标风格情绪不影响结果）
+        """
+        if search_mode not in ("exhaustive", "timeline", "coarse"):
+            raise ValueError(f"Unknown search_mode: {search_mode}")
         self.target_sr = target_sr
         self.window_seconds = window_seconds
         self.hop_seconds = hop_seconds
         self.min_score_threshold = min_score_threshold
-        self.scorer = MelodyScorer()
+        self.search_mode = search_mode
+        self.coarse_top_k = coarse_top_k
+        self.refine_hop_seconds = refine_hop_seconds
+        self.track_hpss = track_hpss
+        self.scorer = MelodyScorer(pitch_tracker=pitch_tracker)
+        self.pitch_tracker = self.scorer.pitch_tracker
+        self.cache = cache
 
     # -------------------------------------------
-    # Key detection（不变）
+    # 音频读取（路径或 AudioAsset，统一到 target_sr）
+    # -------------------------------------------
+    def _load_audio(self, audio):
+        return as_audio_asset(audio).load(self.target_sr)
+
+    # -------------------------------------------
+    # Key detection（24 调模板一次矩阵乘，见 features/tonality.py）
     # -------------------------------------------
     @staticmethod
     def _detect_key(y, sr):
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-        chroma_mean = np.mean(chroma, axis=1)
-        chroma_mean /= np.linalg.norm(chroma_mean) + 1e-9
-
-        major_profile = np.array([6.35,2.23,3.48,2.33,4.38,4.09,2.52,5.19,2.39,3.66,2.29,2.88])
-        minor_profile = np.array([6.33,2.68,3.52,5.38,2.60,3.53,2.54,4.75,3.98,2.69,3.34,3.17])
-        major_profile /= np.linalg.norm(major_profile)
-        minor_profile /= np.linalg.norm(minor_profile)
-
-        best = -1
-        tonic = 0
-        mode = "major"
-        for t in range(12):
-            if np.dot(chroma_mean, np.roll(major_profile, t)) > best:
-                best = np.dot(chroma_mean, np.roll(major_profile, t))
-                tonic = t
-                mode = "major"
-            if np.dot(chroma_mean, np.roll(minor_profile, t)) > best:
-                best = np.dot(chroma_mean, np.roll(minor_profile, t))
-                tonic = t
-                mode = "minor"
-
-        names = ["C","C#","D","D#","E","F","F#","G","G#","A","A#","B"]
-        print(f"[Key] {names[tonic]} {mode}")
-        return tonic, mode, f"{names[tonic]} {mode}"
-
-    # -------------------------------------------
-    # f0 提取（不变）
+        ka = analyze_tonality(y, sr)
+        print(f"[Key] {ka.name}")
+        return ka.tonic, ka.mode, ka.name
+
+    # -------------------------------------------
+    # f0 提取（后端可替换）
     # -------------------------------------------
     def _extract_f0(self, y, sr):
         try:
-            f0, _, _ = librosa.pyin(
-                y, fmin=65.4, fmax=1046.5,
-                sr=sr, frame_length=2048, hop_length=512
-            )
+            return self.pitch_tracker.track(y, sr, frame_length=2048, hop_length=512)
         except Exception:
             return None
-        return f0
 
     # -------------------------------------------
     # 低破坏旋律（不变）
     # -------------------------------------------
     @staticmethod
-    def _extract_low_destruction(clip, sr):
-        harm, _ = librosa.effects.hpss(clip)
+    def _extract_low_destruction(clip, sr, harm=None):
+        """harm: 预先得到的 harmonic 片段（如整曲 HPSS 切片）；不传则对 clip 做 HPSS"""
+        if harm is None:
+            harm = transform_cache.harmonic(clip)
         b, a = butter(4, [200/(sr/2), 1200/(sr/2)], btype='band')
         filtered = filtfilt(b, a, harm)
         peak = np.max(np.abs(filtered))
@@ -85,6 +98,11 @@ class MelodyExtractor:
     # Window selection（不变）
     # -------------------------------------------
     def _find_best_window(self, y, sr):
+        if self.search_mode == "timeline":
+            return self._find_best_window_timeline(y, sr)
+        if self.search_mode == "coarse":
+            return self._find_best_window_coarse(y, sr)
+
         total = len(y)
         win = int(self.window_seconds * sr)
         hop = int(self.hop_seconds * sr)
@@ -109,33 +127,180 @@ class MelodyExtractor:
         print(f"[Window] best {best_start} ~ {end}")
         return best_start, end
 
+    # -------------------------------------------
+    # Window selection（整曲时间线版）
+    # -------------------------------------------
+    def _find_best_window_timeline(self, y, sr):
+        total = len(y)
+        win = int(self.window_seconds * sr)
+        hop = int(self.hop_seconds * sr)
+
+        best_score = -1
+        best_start = 0
+
+        starts = np.arange(0, max(total - win, 0), hop)
+        if starts.size:
+            timeline = MelodyTimeline(y, sr, scorer=self.scorer)
+            rms = timeline.window_rms(starts, win)
+            zcr = timeline.window_zcr(starts, win)
+
+            for start, r, z in zip(starts, rms, zcr):
+                if r < 1e-4: continue
+                if z > 0.20: continue
+
+                s = timeline.score_window(int(start), win)
+                if s > best_score:
+                    best_score = s
+                    best_start = int(start)
+
+        end = best_start + win
+        print(f"[Window] best {best_start} ~ {end} (timeline)")
+        return best_start, end
+
+    # -------------------------------------------
+    # Window selection（coarse-to-fine 版）
+    # -------------------------------------------
+    def _find_best_window_coarse(self, y, sr):
+        total = len(y)
+        win = int(self.window_seconds * sr)
+        hop = int(self.hop_seconds * sr)
+        refine_hop = max(int(self.refine_hop_seconds * sr), 1)
+
+        best_score = -1
+        best_start = 0
+
+        starts = np.arange(0, max(total - win, 0), hop)
+        if starts.size:
+            timeline = MelodyTimeline(y, sr, scorer=self.scorer)
+
+            def passes_gates(cands):
+                return (timeline.window_rms(cands, win) >= 1e-4) & \
+                       (timeline.window_zcr(cands, win) <= 0.20)
+
+            def full_score(start):
+                return self.scorer.score(y[start:start+win], sr)
+
+            # ① 代理分排序（向量化），取 top-K
+            starts = starts[passes_gates(starts)]
+            proxy = timeline.window_proxy(starts, win)
+            order = np.argsort(-proxy, kind="stable")[: max(self.coarse_top_k, 1)]
+
+            # ② top-K 完整评分
+            for start in starts[order]:
+                s = full_score(int(start))
+                if s > best_score:
+                    best_score = s
+                    best_start = int(start)
+
+            # ③ 在最佳窗口 ±hop 内以 refine_hop 细化
+            if best_score >= 0:
+                lo = max(best_start - hop + refine_hop, 0)
+                hi = min(best_start + hop, total - win)
+                refine = np.arange(lo, hi, refine_hop)
+                refine = refine[(refine != best_start)]
+                refine = refine[passes_gates(refine)] if refine.size else refine
+                for start in refine:
+                    s = full_score(int(start))
+                    if s > best_score:
+                        best_score = s
+                        best_start = int(start)
+
+        end = best_start + win
+        print(f"[Window] best {best_start} ~ {end} (coarse)")
+        return best_start, end
+
     # -------------------------------------------
     # Public API（只输出 5 秒，逻辑完全不变）
     # -------------------------------------------
-    def extract_melody_to_wav(
+    def extract_melody(
         self,
-        audio_path,
+        audio,
         strength=0.5,
-        output_path=None,
         weaken_level=0,
         mode="low",
         target_style=None,
         target_emotion=None,
+        return_info=False,
     ):
-        y, sr = librosa.load(audio_path, sr=self.target_sr, mono=True)
+        """
+        audio: 音频路径或 AudioAsset
+        返回 (mel, sr)：target_sr 下的 float32 旋律片段，不落盘
+        return_info=True 时返回 (mel, sr, info)：
+            info = {"start", "end", "key", "window_key", "key_analysis"}
+            window_key 为所选窗口的局部调性（由同一次 CQT 的逐帧得分切片得到）
+        """
+        asset = as_audio_asset(audio)
+        with span("melody.extract", mode=mode, weaken_level=weaken_level) as sp:
+            key = self.cache.key(self, asset, mode) if self.cache is not None else None
+            result = self.cache.get(key) if key is not None else None
+            sp.set(cached=result is not None)
+            if result is None:
+                result = self._extract(asset, mode, sp)
+                if key is not None:
+                    self.cache.put(key, result)
+            else:
+                print(f"[MelodyExtractor] reuse best window {result[2]['start']} ~ {result[2]['end']}")
 
-        tonic_pc, mode_key, _ = self._detect_key(y, sr)
+        mel, sr, info = result
+        if return_info:
+            return mel, sr, info
+        return mel, sr
 
-        s, e = self._find_best_window(y, sr)
+    def _extract(self, asset, mode, sp):
+        """加载 → 调性 → 窗口搜索 → 旋律分离；结果只取决于 MelodyExtractionCache.key 中的输入"""
+        y, sr = self._load_audio(asset)
+        sp.set(audio_duration=len(y) / sr)
+
+        with span("melody.detect_key"):
+            ka = analyze_tonality(y, sr)
+        print(f"[Key] {ka.name}")
+
+        with span("melody.window_search", search_mode=self.search_mode) as ws:
+            s, e = self._find_best_window(y, sr)
+            ws.set(start_seconds=s / sr)
         clip = y[s:e]
 
-        if mode=="low":
-            mel = self._extract_low_destruction(clip, sr)
-        else:
-            mel = clip.astype(np.float32)
+        with span("melody.isolate"):
+            if mode=="low":
+                harm = transform_cache.harmonic_slice(y, s, e) if self.track_hpss else None
+                mel = self._extract_low_destruction(clip, sr, harm=harm)
+            else:
+                mel = clip.astype(np.float32)
+
+        window_key = ka.local_key(s, e)[2]
+        if window_key != ka.name:
+            print(f"[Key] window {window_key}")
+        return mel, sr, {
+            "start": s,
+            "end": e,
+            "key": ka.name,
+            "window_key": window_key,
+            "key_analysis": ka,
+        }
+
+    def extract_melody_to_wav(
+        self,
+        audio,
+        strength=0.5,
+        output_path=None,
+        weaken_level=0,
+        mode="low",
+        target_style=None,
+        target_emotion=None,
+    ):
+        """extract_melody 并写 wav，返回路径"""
+        asset = as_audio_asset(audio)
+        mel, sr = self.extract_melody(
+            asset,
+            strength=strength,
+            weaken_level=weaken_level,
+            mode=mode,
+            target_style=target_style,
+            target_emotion=target_emotion,
+        )
 
         if output_path is None:
-            output_path = Path(audio_path).parent / f"melody_best5s_attempt_{weaken_level+1}.wav"
+            output_path = asset.parent / f"melody_best5s_attempt_{weaken_level+1}.wav"
 
         sf.write(str(output_path), mel, sr)
         print(f"[MelodyExtractor] Saved (5s): {output_path}")
@@ -3,6 +3,8 @@
 import numpy as np
 import librosa
 
+from backend.features.pitch_tracker import get_pitch_tracker
+
 
 class MelodyScorer:
     """
@@ -17,22 +19,16 @@ class MelodyScorer:
     5. 调式匹配度 Scale Fit
     """
 
-    @staticmethod
-    def _extract_f0(y, sr):
-        """稳定版 f0 提取"""
-        try:
-            f0, _, _ = librosa.pyin(
-                y,
-                fmin=65.4,       # C2
-                fmax=1046.5,     # C6
-                sr=sr,
-                frame_length=2048,
-                hop_length=256,
-            )
-        except TypeError:
-            f0, _, _ = librosa.pyin(y, 65.4, 1046.5, sr=sr)
-
-        return f0
+    def __init__(self, pitch_tracker=None):
+        """
+        pitch_tracker: f0 追踪后端（"pyin" / "yin" / "autocorr"，可加 "+ds" 降采样），
+                       不传读 MELODY_PITCH_TRACKER（默认 pyin），见 features/pitch_tracker.py
+        """
+        self.pitch_tracker = get_pitch_tracker(pitch_tracker)
+
+    def _extract_f0(self, y, sr):
+        """稳定版 f0 提取（C2 ~ C6，hop=256）"""
+        return self.pitch_tracker.track(y, sr, frame_length=2048, hop_length=256)
 
     # ------------------------------------------------------------
     # 1. Smoothness（平滑度）
@@ -126,6 +122,11 @@ class MelodyScorer:
     @staticmethod
     def rhythm_score(y, sr):
         onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+        return MelodyScorer.rhythm_score_from_onset(onset_env, sr)
+
+    @staticmethod
+    def rhythm_score_from_onset(onset_env, sr):
+        """由已算好的 onset 包络评分（可直接切片整曲包络）"""
         onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env)
 
         if len(onset_frames) < 2:
@@ -167,11 +168,18 @@ class MelodyScorer:
     # ------------------------------------------------------------
     def score(self, y, sr):
         f0 = self._extract_f0(y, sr)
+        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+        return self.score_features(f0, onset_env, sr)
 
+    def score_features(self, f0, onset_env, sr):
+        """
+        由 f0 与 onset 包络直接评分
+        （MelodyTimeline 对整曲只算一次，窗口评分时传入切片）
+        """
         smooth = self.smoothness_score(f0)
         interval = self.interval_score(f0)
         hook = self.hook_score(f0)
-        rhythm = self.rhythm_score(y, sr)
+        rhythm = self.rhythm_score_from_onset(onset_env, sr)
         scale = self.scale_score(f0)
 
         total = (
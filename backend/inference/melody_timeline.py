@@ -0,0 +1,132 @@
+# backend/inference/melody_timeline.py
+
+import numpy as np
+import librosa
+
+from backend.inference.melody_scorer import MelodyScorer
+
+
+class MelodyTimeline:
+    """
+    整曲帧级时间线（只计算一次）
+
+    MelodyExtractor 的滑窗搜索原本对每个 5s 窗口单独跑 pyin / onset / zcr，
+    同一帧会被重复分析 ~10 次。这里对整曲一次性计算：
+        - f0（scorer 的 pitch tracker，参数与 MelodyScorer._extract_f0 一致，hop=256）
+        - onset 包络（hop=512）
+        - ZCR 帧序列（frame=2048, hop=512）
+        - y² 的累加和（窗口 RMS 精确值）
+    候选窗口只需切片这些数组；RMS / ZCR 预筛选用前缀和 O(1) 完成。
+
+    f0 / onset / 代理分（proxy）均为懒计算：coarse 搜索只用到
+    RMS / ZCR / proxy，不会触发整曲 f0 追踪。
+    """
+
+    F0_HOP = 256
+    ONSET_HOP = 512
+    ZCR_HOP = 512
+    PROXY_HOP = 512
+
+    def __init__(self, y, sr, scorer: MelodyScorer = None):
+        self.y = y
+        self.sr = sr
+        self.scorer = scorer or MelodyScorer()
+
+        self._f0 = None
+        self._onset_env = None
+        self._proxy_cumsum = None
+
+        # ---- 前缀和（预筛选） ----
+        zcr = librosa.feature.zero_crossing_rate(y, frame_length=2048, hop_length=self.ZCR_HOP)[0]
+        y64 = np.asarray(y, dtype=np.float64)
+        self._energy_cumsum = np.concatenate([[0.0], np.cumsum(y64 ** 2)])
+        self._zcr_cumsum = np.concatenate([[0.0], np.cumsum(zcr)])
+
+    # -------------------------------------------
+    # 帧级特征（整曲一次，懒计算）
+    # -------------------------------------------
+    @property
+    def f0(self):
+        if self._f0 is None:
+            self._f0 = self.scorer._extract_f0(self.y, self.sr)
+        return self._f0
+
+    @property
+    def onset_env(self):
+        if self._onset_env is None:
+            self._onset_env = librosa.onset.onset_strength(
+                y=self.y, sr=self.sr, hop_length=self.ONSET_HOP
+            )
+        return self._onset_env
+
+    def _proxy_frames(self):
+        """
+        廉价代理分（逐帧，0~1，越高越像清晰旋律）：
+            0.5 * (1 - spectral flatness)   —— 调性 / 谐波感
+          + 0.5 * chroma 相邻帧余弦相似度    —— 和声稳定度
+        整曲只做一次 STFT。
+        """
+        S = np.abs(librosa.stft(self.y, n_fft=2048, hop_length=self.PROXY_HOP))
+        flatness = librosa.feature.spectral_flatness(S=S)[0]
+
+        chroma = librosa.feature.chroma_stft(S=S ** 2, sr=self.sr)
+        chroma = chroma / (np.linalg.norm(chroma, axis=0, keepdims=True) + 1e-9)
+        stability = np.sum(chroma[:, 1:] * chroma[:, :-1], axis=0)
+        stability = np.concatenate([stability[:1], stability]) if stability.size else np.zeros(1)
+
+        return 0.5 * (1.0 - flatness) + 0.5 * stability[: len(flatness)]
+
+    # -------------------------------------------
+    # 帧索引（center=True：第 t 帧中心在 t*hop）
+    # -------------------------------------------
+    @staticmethod
+    def _window_mean(cumsum, starts, win, hop):
+        n_frames = len(cumsum) - 1
+        count = 1 + win // hop
+        first = np.minimum(np.rint(starts / hop).astype(np.int64), n_frames - 1)
+        last = np.minimum(first + count, n_frames)
+        return (cumsum[last] - cumsum[first]) / np.maximum(last - first, 1)
+
+    @staticmethod
+    def _frame_range(start, win, hop, n_frames):
+        first = int(round(start / hop))
+        count = 1 + win // hop
+        first = min(first, max(n_frames - 1, 0))
+        return first, min(first + count, n_frames)
+
+    # -------------------------------------------
+    # 预筛选（向量化，支持 starts 数组）
+    # -------------------------------------------
+    def window_rms(self, starts, win):
+        starts = np.asarray(starts, dtype=np.int64)
+        energy = self._energy_cumsum[starts + win] - self._energy_cumsum[starts]
+        return np.sqrt(np.maximum(energy, 0.0) / max(win, 1))
+
+    def window_zcr(self, starts, win):
+        starts = np.asarray(starts, dtype=np.int64)
+        return self._window_mean(self._zcr_cumsum, starts, win, self.ZCR_HOP)
+
+    def window_proxy(self, starts, win):
+        if self._proxy_cumsum is None:
+            self._proxy_cumsum = np.concatenate([[0.0], np.cumsum(self._proxy_frames())])
+        starts = np.asarray(starts, dtype=np.int64)
+        return self._window_mean(self._proxy_cumsum, starts, win, self.PROXY_HOP)
+
+    # -------------------------------------------
+    # 切片
+    # -------------------------------------------
+    def f0_slice(self, start, win):
+        a, b = self._frame_range(start, win, self.F0_HOP, len(self.f0))
+        return self.f0[a:b]
+
+    def onset_slice(self, start, win):
+        a, b = self._frame_range(start, win, self.ONSET_HOP, len(self.onset_env))
+        return self.onset_env[a:b]
+
+    def score_window(self, start, win):
+        """与 MelodyScorer.score(y[start:start+win], sr) 对应的切片版评分"""
+        return self.scorer.score_features(
+            self.f0_slice(start, win),
+            self.onset_slice(start, win),
+            self.sr,
+        )
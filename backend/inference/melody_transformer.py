@@ -21,11 +21,27 @@ class MelodyTransformer:
             return melody_path
 
         y, sr = sf.read(melody_path)
+        y, sr = self.transform_array(y, sr, attempt, prev_score)
+
+        out = Path(melody_path).with_name(Path(melody_path).stem + f"_t{attempt}.wav")
+        sf.write(str(out), y, sr)
+        print(f"[MelodyTransformer] Saved {out}")
+        return str(out)
+
+    def transform_array(self, y, sr, attempt: int, prev_score=None):
+        """
+        内存版 transform：(y, sr) → (y, target_sr) float32
+        attempt 1 原样返回（仅转 mono / 重采样）
+        """
+        y = np.asarray(y, dtype=np.float32)
         if y.ndim>1: y = y.mean(axis=1)
         if sr != self.target_sr:
-            y = librosa.resample(y, sr, self.target_sr)
+            y = librosa.resample(y, orig_sr=sr, target_sr=self.target_sr)
             sr = self.target_sr
 
+        if attempt <= 1:
+            return y, sr
+
         # ------ 安全范围（最终版） ------
         # time stretch：±3%
         rate = float(np.random.uniform(0.97, 1.03))
@@ -44,7 +60,5 @@ class MelodyTransformer:
         if peak > 1e-6:
             y = y / peak * 0.9
 
-        out = Path(melody_path).with_name(Path(melody_path).stem + f"_t{attempt}.wav")
-        sf.write(str(out), y, sr)
-        print(f"[MelodyTransformer] Saved {out} (rate={rate:.3f}, steps={steps:.2f})")
-        return str(out)
+        print(f"[MelodyTransformer] attempt {attempt} (rate={rate:.3f}, steps={steps:.2f})")
+        return y.astype(np.float32), sr
@@ -0,0 +1,176 @@
+# ============================
+# MusicGen streaming helpers
+# ============================
+
+from queue import Queue
+
+import numpy as np
+import torch
+from transformers.generation.streamers import BaseStreamer
+
+
+class MusicgenStreamer(BaseStreamer):
+    """
+    挂在 model.generate(streamer=...) 上的流式解码器
+
+    每收到 play_steps 个新 token，就把当前 token 序列去掉 delay pattern 后
+    交给 EnCodec 解码，只放出新增且已稳定的部分（末尾保留 stride 个采样点，
+    等下一轮解码覆盖）。消费端直接迭代本对象即可拿到 float32 音频块。
+    仅支持 batch size 1。
+    """
+
+    def __init__(self, model, play_steps=40, stride=None, timeout=None):
+        self.decoder = model.decoder
+        self.audio_encoder = model.audio_encoder
+        self.generation_config = model.generation_config
+        self.play_steps = play_steps
+
+        if stride is None:
+            hop_length = int(np.prod(self.audio_encoder.config.upsampling_ratios))
+            stride = hop_length * (play_steps - self.decoder.num_codebooks) // 6
+        if stride <= 0:
+            raise ValueError("play_steps 过小：需大于 codebook 数")
+        self.stride = stride
+
+        self.token_cache = None
+        self.to_yield = 0
+        self.audio_queue = Queue()
+        self.stop_signal = None
+        self.timeout = timeout
+
+    def _decode_tokens(self, input_ids):
+        _, delay_pattern_mask = self.decoder.build_delay_pattern_mask(
+            input_ids[:, :1],
+            pad_token_id=self.generation_config.decoder_start_token_id,
+            max_length=input_ids.shape[-1],
+        )
+        input_ids = self.decoder.apply_delay_pattern_mask(input_ids, delay_pattern_mask)
+        input_ids = input_ids[input_ids != self.generation_config.pad_token_id].reshape(
+            1, self.decoder.num_codebooks, -1
+        )
+        input_ids = input_ids[None, ...].to(self.audio_encoder.device)
+
+        with torch.no_grad():
+            output = self.audio_encoder.decode(input_ids, audio_scales=[None])
+        return output.audio_values[0, 0].cpu().float().numpy()
+
+    # -------------------------------------------
+    # BaseStreamer 接口（generate 内部调用）
+    # -------------------------------------------
+    def put(self, value):
+        if value.shape[0] // self.decoder.num_codebooks > 1:
+            raise ValueError("MusicgenStreamer 只支持 batch size 1")
+
+        if self.token_cache is None:
+            self.token_cache = value
+        else:
+            self.token_cache = torch.concatenate([self.token_cache, value[:, None]], dim=-1)
+
+        if self.token_cache.shape[-1] % self.play_steps == 0:
+            audio = self._decode_tokens(self.token_cache)
+            self._emit(audio[self.to_yield:-self.stride])
+            self.to_yield = max(len(audio) - self.stride, self.to_yield)
+
+    def end(self):
+        if self.token_cache is not None:
+            audio = self._decode_tokens(self.token_cache)
+            self._emit(audio[self.to_yield:])
+        self.stop()
+
+    def stop(self):
+        """结束流（generate 出错时由调用方直接调用，避免消费端阻塞）"""
+        self.audio_queue.put(self.stop_signal, timeout=self.timeout)
+
+    def _emit(self, audio):
+        if len(audio):
+            self.audio_queue.put(np.asarray(audio, dtype=np.float32), timeout=self.timeout)
+
+    # -------------------------------------------
+    # 消费端
+    # -------------------------------------------
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self.audio_queue.get(timeout=self.timeout)
+        if value is self.stop_signal:
+            raise StopIteration()
+        return value
+
+
+class StreamingPostProcessor:
+    """
+    MusicGenerator._postprocess 的流式版本
+
+    - 中段修复：用预计总长 N 判断；[N/2, 2N/3) 区间先暂存，
+      收到 2N/3 之前的样本后按原规则修复再放出
+    - 尾部修复：始终暂存最后 2 秒，flush 时按原规则修复
+    - 增益：流式块不做峰值归一化（开头安静的块会被大幅放大、之后又被压回，响度跳变）；
+      只在峰值超过 0.98 时衰减防削波，增益 ≤ 1 且只降不升，块内线性过渡。
+    - raw 保存未经任何修复的原始样本；中段 / 尾部修复只写入 out（放出的音频取自 out），
+      最终文件由调用方对未修改的 raw 整体做一次 _postprocess，与非流式输出一致
+    """
+
+    def __init__(self, sr, expected_samples):
+        self.sr = sr
+        self.expected = int(expected_samples)
+        self.raw = np.zeros(0, dtype=np.float32)      # 原始样本，不修改
+        self.out = np.zeros(0, dtype=np.float32)      # 修复后的样本（流式放出）
+        self.emitted = 0
+        self.peak = 0.0
+        self.gain = 1.0
+        self.mid_done = self.expected < sr * 6
+
+    def _mid_fix(self, n):
+        a = self.out[n//3 : n//2]
+        b = self.out[n//2 : 2*n//3]
+        rms_a = np.sqrt(np.mean(a**2)) if a.size else 0.0
+        rms_b = np.sqrt(np.mean(b**2)) if b.size else 0.0
+        if rms_a > 1e-5 and rms_b < rms_a * 0.33:
+            print("[MusicGen] Mid collapse detected → fixing (stream)...")
+            m = min(len(a), len(b))
+            self.out[n//2 : n//2+m] = 0.7 * a[:m] + 0.3 * b[:m]
+        self.mid_done = True
+
+    def _release(self, limit):
+        out = self.out[self.emitted:limit]
+        self.emitted = max(limit, self.emitted)
+        if not out.size:
+            return out.astype(np.float32)
+        self.peak = max(self.peak, float(np.max(np.abs(out))))
+        gain = min(1.0, 0.98 / self.peak) if self.peak > 1e-6 else 1.0
+        if gain < self.gain:
+            out = out * np.linspace(self.gain, gain, out.size, dtype=np.float32)
+            self.gain = gain
+        elif self.gain < 1.0:
+            out = out * self.gain
+        return out.astype(np.float32)
+
+    def push(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        self.raw = np.concatenate([self.raw, chunk])
+        self.out = np.concatenate([self.out, chunk])
+        n = self.expected
+
+        if not self.mid_done and len(self.raw) >= 2*n//3:
+            self._mid_fix(n)
+
+        limit = len(self.raw) - self.sr * 2          # 尾部 2 秒暂存
+        if not self.mid_done:
+            limit = min(limit, n // 2)               # 中段待判定区间暂存
+        if limit <= self.emitted:
+            return np.zeros(0, dtype=np.float32)
+        return self._release(limit)
+
+    def flush(self):
+        n = len(self.raw)
+        if not self.mid_done and n >= self.sr * 6 and n // 2 >= self.emitted:
+            self._mid_fix(n)
+
+        if n >= self.sr * 4:
+            tail = self.out[-self.sr*2:]
+            prev = self.out[-self.sr*4:-self.sr*2]
+            if np.sqrt(np.mean(tail**2)) < np.sqrt(np.mean(prev**2)) * 0.3:
+                print("[MusicGen] Tail collapse → fixing (stream)...")
+                self.out[-self.sr*2:] = 0.7 * prev + 0.3 * tail
+        return self._release(n)
@@ -0,0 +1,83 @@
+# ============================
+# Pipelined executor（生成 / 评分重叠）
+# ============================
+
+import contextvars
+import queue
+import threading
+
+
+class PipelinedExecutor:
+    """
+    两级流水线：后台线程依次执行 produce(item, cancel_event)，调用方按顺序迭代结果
+
+        with PipelinedExecutor(produce, range(1, 5)) as pipe:
+            for item, result in pipe:
+                ...                      # 处理第 N 个结果时，第 N+1 个已在后台生成
+                if good_enough: break    # 退出 with 时取消仍在进行的生成
+
+    - lookahead：后台最多领先调用方正在处理的结果几个（默认 1，避免多做无用功）
+    - produce 按 items 顺序串行执行，随机数的消耗顺序与顺序执行一致
+    - 取消：cancel_event 被设置后不再开始新的 item；进行中的 produce 应自行检查
+      cancel_event 提前结束，取消之后抛出的异常被忽略
+    - produce 的异常在调用方迭代到该位置时重新抛出
+    - 后台线程运行在创建时的 contextvars 副本中（tracing 父 span、transform_cache scope）
+    """
+
+    def __init__(self, produce, items, lookahead=1, name="pipeline-producer"):
+        self.cancel_event = threading.Event()
+        self._results = queue.Queue()
+        self._slots = threading.Semaphore(max(int(lookahead), 1))
+        ctx = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=ctx.run, args=(self._run, produce, list(items)), name=name, daemon=True,
+        )
+        self._finished = False
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.cancel()
+        return False
+
+    def _run(self, produce, items):
+        try:
+            for item in items:
+                self._slots.acquire()
+                if self.cancel_event.is_set():
+                    break
+                self._results.put(("ok", item, produce(item, self.cancel_event)))
+        except BaseException as e:
+            if not self.cancel_event.is_set():
+                self._results.put(("error", None, e))
+        finally:
+            self._results.put(("done", None, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished or self.cancel_event.is_set():
+            raise StopIteration
+        kind, item, value = self._results.get()
+        if kind == "done":
+            self._finished = True
+            raise StopIteration
+        if kind == "error":
+            raise value
+        # 调用方开始处理第 N 个结果 → 允许后台开始下一个
+        self._slots.release()
+        return item, value
+
+    def cancel(self):
+        """停止后台生成，丢弃未消费的结果，等待线程退出"""
+        self.cancel_event.set()
+        self._slots.release()
+        if self._thread.ident is None:
+            return
+        while not self._finished:
+            if self._results.get()[0] == "done":
+                self._finished = True
+        self._thread.join()
@@ -14,9 +14,9 @@ class PromptBuilder:
     避免让 MusicGen 往“黑暗/恐怖/混乱”方向生成。
     """
 
-    def __init__(self):
+    def __init__(self, pitch_tracker=None):
         # 给 full_pipeline 用的旋律评分器
-        self.scorer = MelodyScorer()
+        self.scorer = MelodyScorer(pitch_tracker=pitch_tracker)
 
     # -----------------------------
     # Melody Element Description
@@ -62,6 +62,14 @@ class PromptBuilder:
         else:
             return "melodically open, suitable for stylistic adaptation"
 
+    def describe_key(self, melody_info):
+        """整曲调性；旋律片段的局部调性不同时一并说明（转调 / 离调段落）"""
+        key = melody_info.get("key", "unknown")
+        window_key = melody_info.get("window_key")
+        if window_key and window_key != key and key != "unknown":
+            return f"{key} (the melody passage centers on {window_key})"
+        return key
+
     # -----------------------------
     # Style-specific description（核心增强）
     # -----------------------------
@@ -123,6 +131,7 @@ class PromptBuilder:
         target_emotion,
         creativity=1.0,
         attempt=1,
+        include_meta=False,
     ):
         """
         melody_info 字典字段:
@@ -132,6 +141,8 @@ class PromptBuilder:
             - rhythm_score
             - scale_corr
             - key
+            - window_key（可选：旋律片段所在窗口的局部调性）
+        include_meta: True 时在开头加入 attempt / creativity 头（仅调试；默认不进入条件文本）
         """
 
         pr_desc = self.describe_pitch_range(melody_info["pitch_range"])
@@ -149,7 +160,7 @@ The extracted melody features:
 - {hook_desc}
 - {rhythm_desc}
 - {scale_desc}
-- key signature: {melody_info.get("key", "unknown")}
+- key signature: {self.describe_key(melody_info)}
 """
 
         # 风格说明（风格增强）
@@ -182,8 +193,10 @@ Include:
 - Produce musically coherent, structured output with clear genre characteristics.
 """
 
-        # 提示 MusicGen 进行逐轮改善
-        meta = f"### Generation Attempt: {attempt}\nCreativity Level: {creativity:.2f}\n"
+        # attempt / creativity 头只用于日志：放进条件文本会让每个 attempt 的 T5 编码都不同，
+        # 文本条件缓存（ConditioningCache）无法命中，且 MusicGen 并不理解这两个字段
+        meta = f"### Generation Attempt: {attempt}\nCreativity Level: {creativity:.2f}\n" \
+            if include_meta else ""
 
         final_prompt = (
             "You are transforming music based on structured melodic analysis.\n\n"
@@ -1,9 +1,14 @@
+import os
+
 import librosa
 import numpy as np
-import joblib
 import scipy.signal
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
+from backend.features.style_engine import compute_style_features_shared
+from backend.models.registry import registry
+from backend.utils.audio_asset import as_audio_asset
+from backend.utils.feature_cache import file_fingerprint, get_feature_cache, make_key
 from backend.utils.safe_librosa import (
     safe_rms,
     safe_spectral_centroid,
@@ -15,35 +20,67 @@ from backend.utils.safe_librosa import (
 if not hasattr(scipy.signal, "hann"):
     scipy.signal.hann = scipy.signal.windows.hann
 
-MODEL_PATH = "backend/models/style_model.pkl"
-ENCODER_PATH = "backend/models/style_label_encoder.pkl"
+MODEL_PATH = registry.path("style_model")
+ENCODER_PATH = registry.path("style_label_encoder")
+
+# 特征引擎：shared（一次 STFT 派生全部频谱特征，默认）/ legacy（逐个 librosa 调用）
+STYLE_ENGINES = ("shared", "legacy")
+STYLE_ENGINE_ENV = "STYLE_FEATURE_ENGINE"
+
+
+def _resolve_engine(engine):
+    engine = engine or os.environ.get(STYLE_ENGINE_ENV, "shared")
+    if engine not in STYLE_ENGINES:
+        raise ValueError(f"Unknown style feature engine: {engine}")
+    return engine
+
 
 # =========================
-# 全局加载模型 & encoder
+# 模型 & encoder（首次使用时加载）
 # =========================
-try:
-    _STYLE_MODEL = joblib.load(MODEL_PATH)
-except Exception as e:
-    raise RuntimeError(
-        f"[style_recognition] 无法加载模型：{MODEL_PATH}\n{e}"
-    )
-
-try:
-    _STYLE_ENCODER = joblib.load(ENCODER_PATH)
-except Exception as e:
-    raise RuntimeError(
-        f"[style_recognition] 无法加载标签编码器：{ENCODER_PATH}\n{e}"
-    )
-
-
-def extract_style_features(path: str) -> np.ndarray:
+def _style_model():
+    return registry.get("style_model")
+
+
+def _style_encoder():
+    return registry.get("style_label_encoder")
+
+
+def extract_style_features(audio, engine=None) -> np.ndarray:
     """
     === 与训练一致的 68 维特征 ===
+    audio: 音频路径或 AudioAsset（使用原始采样率）
+    engine: "shared" / "legacy"，不传读 STYLE_FEATURE_ENGINE（默认 shared）
+    设置 MUSIC_FEATURE_CACHE_DIR 后，同一音频内容直接读缓存
     """
-    y, sr = librosa.load(path, sr=None, mono=True)
+    asset = as_audio_asset(audio)
+    engine = _resolve_engine(engine)
+    compute = _compute_style_features_shared if engine == "shared" else _compute_style_features
+
+    cache = get_feature_cache()
+    if cache is not None:
+        key = make_key(asset.content_hash(), "style_features", _feature_key_params(engine))
+        return cache.get_or_compute(key, lambda: compute(asset))
+
+    return compute(asset)
+
 
-    # ---- tempo ----
+def _feature_key_params(engine):
+    # legacy 沿用原有 key，已有缓存继续有效
+    return {"dim": 68} if engine == "legacy" else {"dim": 68, "engine": engine}
+
+
+def _compute_style_features_shared(asset) -> np.ndarray:
+    y, sr = asset.native()
+    return compute_style_features_shared(y, sr)
+
+
+def _compute_style_features(asset) -> np.ndarray:
+    y, sr = asset.native()
+
+    # ---- tempo（新版 librosa 返回 shape (1,) 数组） ----
     tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    tempo = float(np.atleast_1d(tempo)[0])
 
     # ---- RMS（兼容） ----
     rms = safe_rms(y, sr).mean()
@@ -80,24 +117,89 @@ def extract_style_features(path: str) -> np.ndarray:
     return feature.reshape(1, -1)
 
 
-def predict_style(path: str) -> Tuple[str, Dict[str, float]]:
-    feat = extract_style_features(path)
+def _style_prob_key(asset, engine=None):
+    params = {"model": file_fingerprint(MODEL_PATH), "encoder": file_fingerprint(ENCODER_PATH)}
+    params.update(_feature_key_params(_resolve_engine(engine)))
+    return make_key(asset.content_hash(), "style_prob", params)
 
-    model = _STYLE_MODEL
-    encoder = _STYLE_ENCODER
 
-    idx = model.predict(feat)[0]
-    label = encoder.inverse_transform([idx])[0]
+def _style_results_from_proba(probs):
+    """
+    (N, C) 概率 → [(label, prob_dict)]
+    label 取 argmax（与 XGBoost predict 一致），不再单独调用 predict
+    """
+    encoder = _style_encoder()
+    probs = np.atleast_2d(probs)
+    idx = np.argmax(probs, axis=1)
+    model_classes = getattr(_style_model(), "classes_", None)
+    if model_classes is not None:
+        idx = np.asarray(model_classes)[idx]
+    labels = encoder.inverse_transform(idx)
+    classes = encoder.classes_
+    return [
+        (labels[n], {classes[i]: float(prob[i]) for i in range(len(classes))})
+        for n, prob in enumerate(probs)
+    ]
+
+
+def predict_style(audio) -> Tuple[str, Dict[str, float]]:
+    asset = as_audio_asset(audio)
+    model = _style_model()
+    encoder = _style_encoder()
+
+    # ---- 概率缓存命中：跳过特征提取与模型推理 ----
+    cache = get_feature_cache()
+    if cache is not None:
+        cached = cache.get(_style_prob_key(asset))
+        if cached is not None:
+            return _style_results_from_proba(cached)[0]
+
+    feat = extract_style_features(asset)
 
     try:
         prob = model.predict_proba(feat)[0]
-        classes = encoder.classes_
-        prob_dict = {classes[i]: float(prob[i]) for i in range(len(classes))}
     except Exception:
+        idx = model.predict(feat)[0]
+        label = encoder.inverse_transform([idx])[0]
         classes = encoder.classes_
         prob_dict = {cls: (1.0 if cls == label else 0.0) for cls in classes}
+        return label, prob_dict
+
+    if cache is not None:
+        cache.put(_style_prob_key(asset), prob)
+    return _style_results_from_proba(prob)[0]
 
-    return label, prob_dict
+
+def predict_style_many(audios, executor=None) -> List[Tuple[str, Dict[str, float]]]:
+    """
+    批量风格识别：
+        - 特征提取可交给 executor 并行
+        - 所有特征行堆叠成一个矩阵，predict_proba 只调用一次
+    返回与 predict_style 相同的 (label, prob_dict) 列表
+    """
+    assets = [as_audio_asset(a) for a in audios]
+    results = [None] * len(assets)
+
+    cache = get_feature_cache()
+    pending = []
+    for i, asset in enumerate(assets):
+        if cache is not None:
+            cached = cache.get(_style_prob_key(asset))
+            if cached is not None:
+                results[i] = _style_results_from_proba(cached)[0]
+                continue
+        pending.append(i)
+
+    if pending:
+        map_fn = executor.map if executor is not None else map
+        feats = list(map_fn(extract_style_features, [assets[i] for i in pending]))
+        probs = _style_model().predict_proba(np.vstack(feats))
+        for i, prob, res in zip(pending, probs, _style_results_from_proba(probs)):
+            results[i] = res
+            if cache is not None:
+                cache.put(_style_prob_key(assets[i]), prob)
+
+    return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+# backend/models/registry.py
+
+import threading
+from pathlib import Path
+
+# 模型文件与本文件同目录，不再依赖启动时的 CWD
+MODELS_DIR = Path(__file__).resolve().parent
+
+MODEL_FILES = {
+    "style_model": "style_model.pkl",
+    "style_label_encoder": "style_label_encoder.pkl",
+    "emotion_model": "emotion_model.pkl",
+    "emotion_label_encoder": "emotion_label_encoder.pkl",
+}
+
+
+class ModelRegistry:
+    """
+    模型注册表
+        - 路径相对包目录解析
+        - get(name) 第一次使用时才 joblib.load（连带 sklearn / xgboost 的导入）
+        - preload() 在服务启动时显式加载
+    """
+
+    def __init__(self, root=MODELS_DIR, files=None):
+        self.root = Path(root)
+        self.files = dict(files or MODEL_FILES)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def path(self, name) -> Path:
+        if name not in self.files:
+            raise KeyError(f"Unknown model: {name}")
+        return self.root / self.files[name]
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    import joblib
+
+                    path = self.path(name)
+                    try:
+                        model = joblib.load(path)
+                    except Exception as e:
+                        raise RuntimeError(f"[registry] 无法加载模型：{path}\n{e}")
+                    self._models[name] = model
+        return model
+
+    def is_loaded(self, name) -> bool:
+        return name in self._models
+
+    def preload(self, names=None):
+        for name in names or self.files:
+            self.get(name)
+        return self
+
+
+# 全局单例
+registry = ModelRegistry()
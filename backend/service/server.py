@@ -0,0 +1,399 @@
+# backend/service/server.py
+#
+# 本地 HTTP 任务服务：
+#   - N 个 worker 进程常驻模型（见 worker.py），启动时只加载一次
+#   - 有界任务队列：排队任务数达到 max_queue 时直接返回 429（准入控制）
+#   - 每个任务记录排队等待时间、运行时间与分阶段耗时
+#
+# 接口：
+#   POST /jobs/analyze     {"audio_path": ...}
+#   POST /jobs/transform   {"audio_path": ..., "target_style": ..., "target_emotion": ...,
+#                           "max_attempts": 4, "generation_mode": "sequential", "output_dir": null}
+#   GET  /jobs/<id>         任务状态（queued / running / done / error）与耗时
+#   GET  /jobs/<id>/result  任务结果（未完成时 409）
+#   GET  /health            worker 状态与队列深度（没有存活 worker 时 503）
+#   worker 崩溃后自动重启；全部 worker 不可用时排队任务标记为 error，新任务返回 503
+# generation_mode: sequential / batched / pipelined（生成与评分重叠；
+# 线程拆分由 worker 进程继承的 MUSIC_THREAD_BUDGET 决定，如 "auto" 或 "4:4"）
+#
+# 用法（仓库根目录）：
+#   python -m backend.service.server --workers 2 --max-queue 8 --port 8765
+
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from backend.service.worker import JOB_KINDS, LOAD_FAILED_EXITCODE, worker_main
+
+
+class QueueFull(Exception):
+    """任务队列已满（HTTP 429）"""
+
+
+class NoWorkers(Exception):
+    """没有存活的 worker（HTTP 503）"""
+
+
+# ============================================================
+# Job manager
+# ============================================================
+class JobManager:
+    """
+    worker 进程池 + 任务表
+
+    - submit() 非阻塞入队，队列满时抛 QueueFull
+    - 后台线程消费 worker 事件，更新任务状态
+    - worker 异常退出时，其正在运行的任务标记为 error，并重启该 worker（最多 max_restarts 次）；
+      模型加载失败的 worker 不重启
+    - 每次事件 / submit / health 都检查 worker 存活；全部 worker 不可用时，
+      排队中的任务标记为 error，submit 返回 503
+    """
+
+    def __init__(self, workers=1, max_queue=8, preload_generator=True, max_finished=1000, max_restarts=3):
+        self.num_workers = workers
+        self.max_queue = max_queue
+        self.preload_generator = preload_generator
+        self.max_finished = max_finished
+        self.max_restarts = max_restarts
+
+        self._ctx = mp.get_context("spawn")
+        self._job_queue = self._ctx.Queue(maxsize=max_queue)
+        self._event_queue = self._ctx.Queue()
+        self._procs = {}
+        self._workers = {}          # worker_id → {"pid", "state", "job", "load_seconds", "restarts"}
+        self._jobs = OrderedDict()  # job_id → job record
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._collector = None
+
+    # ----------------------------------
+    # Lifecycle
+    # ----------------------------------
+    def start(self):
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id, restarts=0)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        return self
+
+    def _spawn(self, worker_id, restarts):
+        proc = self._ctx.Process(
+            target=worker_main,
+            args=(worker_id, self._job_queue, self._event_queue, self.preload_generator),
+            daemon=True,
+        )
+        proc.start()
+        self._procs[worker_id] = proc
+        self._workers[worker_id] = {"pid": proc.pid, "state": "loading", "job": None, "restarts": restarts}
+
+    def wait_ready(self, timeout=None):
+        """阻塞直到所有 worker 加载完成（或失败）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            with self._lock:
+                if all(w["state"] != "loading" for w in self._workers.values()):
+                    return all(w["state"] == "ready" for w in self._workers.values())
+            time.sleep(0.1)
+        return False
+
+    def shutdown(self, timeout=5.0):
+        self._stopping.set()
+        for _ in self._procs:
+            try:
+                self._job_queue.put_nowait(None)
+            except queue.Full:
+                break
+        for proc in self._procs.values():
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+    # ----------------------------------
+    # Jobs
+    # ----------------------------------
+    def submit(self, kind, params):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = uuid.uuid4().hex
+        record = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "params": params,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "queue_wait": None,
+            "run_seconds": None,
+            "timings": {},
+            "worker": None,
+            "error": None,
+            "result": None,
+        }
+        if not self._reap_dead_workers():
+            raise NoWorkers("no live workers")
+        with self._lock:
+            self._jobs[job_id] = record
+        try:
+            self._job_queue.put_nowait({"id": job_id, "kind": kind, "params": params})
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise QueueFull(f"job queue is full ({self.max_queue})")
+        return job_id
+
+    def status(self, job_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None:
+                return None
+            return {k: v for k, v in record.items() if k not in ("result", "traceback")}
+
+    def result(self, job_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return None if record is None else dict(record)
+
+    def health(self):
+        alive = self._reap_dead_workers()
+        with self._lock:
+            counts = {}
+            for record in self._jobs.values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            workers = {
+                wid: dict(w, alive=self._procs[wid].is_alive())
+                for wid, w in self._workers.items()
+            }
+        return {
+            "ok": alive > 0,
+            "workers": workers,
+            "max_queue": self.max_queue,
+            "queued": counts.get("queued", 0),
+            "jobs": counts,
+        }
+
+    # ----------------------------------
+    # Worker events
+    # ----------------------------------
+    def _collect(self):
+        while not self._stopping.is_set():
+            try:
+                event = self._event_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._reap_dead_workers()
+                continue
+            with self._lock:
+                self._apply(event)
+                self._prune()
+            self._reap_dead_workers()
+
+    def _apply(self, event):
+        kind = event["event"]
+        worker = self._workers.get(event["worker"])
+
+        if kind == "ready":
+            worker.update(state="ready", load_seconds=event["load_seconds"])
+            print(f"✅ Worker {event['worker']} ready (pid={event['pid']}, load {event['load_seconds']:.1f}s)")
+            return
+        if kind == "failed":
+            worker.update(state="failed", error=event["error"])
+            print(f"❌ Worker {event['worker']} failed to load models: {event['error']}")
+            return
+
+        record = self._jobs.get(event["job"])
+        if record is None:
+            return
+
+        if kind == "running":
+            record.update(status="running", started_at=event["time"], worker=event["worker"])
+            record["queue_wait"] = event["time"] - record["submitted_at"]
+            worker.update(state="busy", job=event["job"])
+        elif kind in ("done", "error"):
+            record.update(
+                status=kind,
+                finished_at=event["time"],
+                run_seconds=event["run_seconds"],
+                timings=event.get("timings", {}),
+                result=event.get("result"),
+                error=event.get("error"),
+            )
+            if kind == "error":
+                record["traceback"] = event.get("traceback")
+            worker.update(state="ready", job=None)
+
+    def _reap_dead_workers(self):
+        """
+        处理已退出的 worker：运行中的任务标记为 error，崩溃的 worker 重启；
+        模型加载失败（退出码 LOAD_FAILED_EXITCODE，不依赖 failed 事件是否已被处理）的不重启。
+        没有存活 worker 时清空任务队列并把排队任务标记为 error。返回存活 worker 数
+        """
+        with self._lock:
+            for wid, proc in list(self._procs.items()):
+                worker = self._workers[wid]
+                if proc.is_alive() or worker["state"] in ("dead", "failed"):
+                    continue
+                if proc.exitcode == LOAD_FAILED_EXITCODE:
+                    worker.update(state="failed", job=None)
+                    print(f"⚠ Worker {wid} exited after failing to load models")
+                    continue
+                job_id = worker.get("job")
+                if job_id in self._jobs and self._jobs[job_id]["status"] == "running":
+                    self._jobs[job_id].update(
+                        status="error",
+                        finished_at=time.time(),
+                        error=f"worker {wid} exited (code {proc.exitcode})",
+                    )
+                restarts = worker.get("restarts", 0)
+                if not self._stopping.is_set() and restarts < self.max_restarts:
+                    print(f"⚠ Worker {wid} exited (code {proc.exitcode}), restarting ({restarts + 1}/{self.max_restarts})")
+                    self._spawn(wid, restarts=restarts + 1)
+                else:
+                    worker.update(state="dead", job=None)
+                    print(f"⚠ Worker {wid} exited (code {proc.exitcode})")
+
+            alive = sum(proc.is_alive() for proc in self._procs.values())
+            if not alive and not self._stopping.is_set():
+                self._fail_queued("no live workers")
+            return alive
+
+    def _fail_queued(self, error):
+        """丢弃任务队列中的任务，对应记录标记为 error（调用方持有 _lock）"""
+        while True:
+            try:
+                self._job_queue.get_nowait()
+            except queue.Empty:
+                break
+        now = time.time()
+        for record in self._jobs.values():
+            if record["status"] == "queued":
+                record.update(status="error", finished_at=now, error=error)
+
+    def _prune(self):
+        """只保留最近 max_finished 个已完成任务"""
+        finished = [jid for jid, r in self._jobs.items() if r["status"] in ("done", "error")]
+        for jid in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[jid]
+
+
+# ============================================================
+# HTTP
+# ============================================================
+class JobRequestHandler(BaseHTTPRequestHandler):
+    manager: JobManager = None
+
+    def _send(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs" or parts[1] not in JOB_KINDS:
+            return self._send(404, {"error": "not found"})
+        kind = parts[1]
+
+        try:
+            params = self._read_json()
+        except (ValueError, UnicodeDecodeError):
+            return self._send(400, {"error": "invalid JSON body"})
+
+        audio_path = params.get("audio_path")
+        if not audio_path or not Path(audio_path).is_file():
+            return self._send(400, {"error": f"audio_path not found: {audio_path}"})
+        if kind == "transform":
+            missing = [k for k in ("target_style", "target_emotion") if not params.get(k)]
+            if missing:
+                return self._send(400, {"error": f"missing fields: {', '.join(missing)}"})
+
+        try:
+            job_id = self.manager.submit(kind, params)
+        except QueueFull as e:
+            return self._send(429, {"error": str(e)})
+        except NoWorkers as e:
+            return self._send(503, {"error": str(e)})
+        return self._send(202, {"job_id": job_id, "status": "queued"})
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+
+        if parts == ["health"]:
+            health = self.manager.health()
+            return self._send(200 if health["ok"] else 503, health)
+
+        if len(parts) == 2 and parts[0] == "jobs":
+            record = self.manager.status(parts[1])
+            if record is None:
+                return self._send(404, {"error": "unknown job"})
+            return self._send(200, record)
+
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            record = self.manager.result(parts[1])
+            if record is None:
+                return self._send(404, {"error": "unknown job"})
+            if record["status"] == "done":
+                return self._send(200, {"job_id": record["id"], "result": record["result"]})
+            if record["status"] == "error":
+                return self._send(500, {"job_id": record["id"], "error": record["error"]})
+            return self._send(409, {"job_id": record["id"], "status": record["status"]})
+
+        return self._send(404, {"error": "not found"})
+
+
+def serve(host="127.0.0.1", port=8765, workers=1, max_queue=8, preload_generator=True):
+    manager = JobManager(workers=workers, max_queue=max_queue, preload_generator=preload_generator)
+    manager.start()
+    print(f"⏳ Starting {workers} worker(s), loading models …")
+    if not manager.wait_ready():
+        print("⚠ Some workers failed to load models; see /health")
+
+    handler = type("BoundJobRequestHandler", (JobRequestHandler,), {"manager": manager})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    print(f"🚀 Serving on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        manager.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local music job service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="worker 进程数（每个进程各自常驻一份模型）")
+    parser.add_argument("--max-queue", type=int, default=8, help="排队任务上限，超出返回 429")
+    parser.add_argument("--no-preload-generator", action="store_true",
+                        help="启动时不加载 MusicGen（仅分析任务时节省内存）")
+    args = parser.parse_args()
+
+    serve(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_queue=args.max_queue,
+        preload_generator=not args.no_preload_generator,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# backend/service/worker.py
+#
+# 任务 worker 进程：
+#   - 启动时构建一次 FullMusicPipeline 并 preload（分类器 / YAMNet / MusicGen 常驻）
+#   - 循环从 job_queue 取任务，结果与分阶段耗时写回 event_queue
+#
+# 进程以 spawn 方式启动，只通过队列与主进程交换可 pickle 的 dict。
+
+import os
+import time
+import traceback
+
+JOB_KINDS = ("analyze", "transform")
+# 模型加载失败时的进程退出码：主进程据此区分加载失败与运行中崩溃，前者不重启
+LOAD_FAILED_EXITCODE = 3
+
+
+def _to_builtin(obj):
+    """numpy 标量 / 数组 → Python 内置类型，方便主进程直接 json.dumps"""
+    import numpy as np
+
+    if isinstance(obj, dict):
+        return {str(k): _to_builtin(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_builtin(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+
+def run_analyze(pipeline, params):
+    result = pipeline.analyzer.analyze(params["audio_path"])
+    timings = dict(result.get("timings", {}))
+    return _to_builtin(result), timings
+
+
+def run_transform(pipeline, params, job_id):
+    timings = {}
+    output_dir = params.get("output_dir") or os.path.join("backend", "output", "jobs", job_id)
+    best_output = pipeline.process(
+        audio_path=params["audio_path"],
+        target_style=params["target_style"],
+        target_emotion=params["target_emotion"],
+        output_dir=output_dir,
+        max_attempts=int(params.get("max_attempts", 4)),
+        generation_mode=params.get("generation_mode", "sequential"),
+        timings=timings,
+    )
+    return {"output": best_output, "output_dir": str(output_dir)}, timings
+
+
+def worker_main(worker_id, job_queue, event_queue, preload_generator=True):
+    """worker 进程入口；job_queue 中收到 None 时退出"""
+    pid = os.getpid()
+
+    t0 = time.perf_counter()
+    try:
+        from backend.inference.full_pipeline import FullMusicPipeline
+
+        pipeline = FullMusicPipeline()
+        if preload_generator:
+            pipeline.preload()
+        else:
+            pipeline.analyzer.preload()
+    except Exception as e:
+        event_queue.put({
+            "event": "failed", "worker": worker_id, "pid": pid,
+            "error": repr(e), "traceback": traceback.format_exc(),
+        })
+        # 确保 "failed" 事件在进程退出前已写入管道
+        event_queue.close()
+        event_queue.join_thread()
+        raise SystemExit(LOAD_FAILED_EXITCODE)
+
+    event_queue.put({
+        "event": "ready", "worker": worker_id, "pid": pid,
+        "load_seconds": time.perf_counter() - t0,
+    })
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+
+        job_id = job["id"]
+        event_queue.put({
+            "event": "running", "worker": worker_id, "job": job_id, "time": time.time(),
+        })
+
+        t0 = time.perf_counter()
+        try:
+            if job["kind"] == "analyze":
+                result, timings = run_analyze(pipeline, job["params"])
+            elif job["kind"] == "transform":
+                result, timings = run_transform(pipeline, job["params"], job_id)
+            else:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+        except Exception as e:
+            event_queue.put({
+                "event": "error", "worker": worker_id, "job": job_id, "time": time.time(),
+                "run_seconds": time.perf_counter() - t0,
+                "error": repr(e), "traceback": traceback.format_exc(),
+            })
+            continue
+
+        event_queue.put({
+            "event": "done", "worker": worker_id, "job": job_id, "time": time.time(),
+            "run_seconds": time.perf_counter() - t0,
+            "timings": timings, "result": result,
+        })
@@ -0,0 +1,148 @@
+# backend/utils/audio_asset.py
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import librosa
+
+
+class AudioAsset:
+    """
+    一次解码、按需重采样的共享音频对象
+
+    同一个输入在一次 FullMusicPipeline.process 中会被 style / emotion /
+    melody / MusicGen 多个阶段读取。AudioAsset 只解码一次（mono，原始采样率），
+    其它采样率（16k / 32k …）的视图在第一次请求时重采样并缓存。
+
+    注意：返回的数组在各阶段之间共享，调用方不要原地修改。
+    """
+
+    def __init__(self, path=None, y=None, sr=None):
+        if path is None and y is None:
+            raise ValueError("AudioAsset 需要 path 或 (y, sr)")
+        if y is not None and sr is None:
+            raise ValueError("AudioAsset.from_array 需要提供 sr")
+
+        self.path = str(path) if path is not None else None
+        self._lock = threading.RLock()
+        self._native_sr = None
+        self._views = {}  # sr -> np.ndarray(float32, mono)
+        self._content_hash = None
+        self._from_file = y is None
+
+        if y is not None:
+            y = np.asarray(y, dtype=np.float32)
+            if y.ndim > 1:
+                # soundfile 布局 (frames, channels)
+                y = y.mean(axis=1)
+            self._native_sr = int(sr)
+            self._views[self._native_sr] = y
+
+    @classmethod
+    def from_array(cls, y, sr, path=None):
+        """由内存中的波形构造（path 仅用于日志 / 默认输出位置）"""
+        return cls(path=path, y=y, sr=sr)
+
+    def __repr__(self):
+        src = self.path if self.path is not None else "<array>"
+        return f"AudioAsset({src!r}, native_sr={self._native_sr})"
+
+    # -------------------------------------------
+    # 解码 & 重采样（各自只做一次）
+    # -------------------------------------------
+    def _decode(self):
+        if self._native_sr is None:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"Audio file not found: {self.path}")
+            y, sr = librosa.load(self.path, sr=None, mono=True)
+            self._native_sr = int(sr)
+            self._views[self._native_sr] = y
+
+    @property
+    def is_decoded(self) -> bool:
+        """是否已经解码到内存（内存音频恒为 True）"""
+        return self._native_sr is not None
+
+    @property
+    def native_sr(self) -> int:
+        with self._lock:
+            self._decode()
+            return self._native_sr
+
+    def native(self):
+        """原始采样率的 mono 波形，等价于 librosa.load(path, sr=None)"""
+        return self.load(None)
+
+    def load(self, sr=None):
+        """
+        返回 (y, sr)，语义与 librosa.load(path, sr=sr, mono=True) 一致：
+        sr=None 表示原始采样率
+        """
+        with self._lock:
+            self._decode()
+            if sr is None:
+                sr = self._native_sr
+            sr = int(sr)
+            if sr not in self._views:
+                self._views[sr] = librosa.resample(
+                    self._views[self._native_sr],
+                    orig_sr=self._native_sr,
+                    target_sr=sr,
+                )
+            return self._views[sr], sr
+
+    def release(self, sr=None):
+        """
+        释放缓存的波形视图（批量处理大量文件时控制内存）
+        sr=None：释放全部视图，文件音频之后按需重新解码；内存音频保留原始波形
+        sr=整数：只释放该采样率的重采样视图（原始波形不释放）
+        """
+        with self._lock:
+            if sr is not None:
+                if int(sr) != self._native_sr:
+                    self._views.pop(int(sr), None)
+                return
+            if self._from_file:
+                self._views.clear()
+                self._native_sr = None
+            else:
+                self._views = {self._native_sr: self._views[self._native_sr]}
+
+    def content_hash(self) -> str:
+        """
+        内容哈希（sha256，只算一次）
+        文件：原始字节，无需解码；内存音频：波形字节 + 采样率
+        """
+        with self._lock:
+            if self._content_hash is None:
+                h = hashlib.sha256()
+                if self._from_file:
+                    with open(self.path, "rb") as f:
+                        for block in iter(lambda: f.read(1 << 20), b""):
+                            h.update(block)
+                else:
+                    y, sr = self.native()
+                    h.update(str(sr).encode("ascii"))
+                    h.update(np.ascontiguousarray(y).tobytes())
+                self._content_hash = h.hexdigest()
+            return self._content_hash
+
+    @property
+    def duration(self) -> float:
+        y, sr = self.native()
+        return len(y) / float(sr)
+
+    @property
+    def parent(self) -> Path:
+        """默认输出目录（内存音频时为当前目录）"""
+        return Path(self.path).parent if self.path is not None else Path(".")
+
+
+def as_audio_asset(audio) -> AudioAsset:
+    """路径 / AudioAsset 统一转换为 AudioAsset"""
+    if isinstance(audio, AudioAsset):
+        return audio
+    return AudioAsset(path=audio)
@@ -0,0 +1,220 @@
+# backend/utils/feature_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# ==============================
+# 🔥 内容寻址的特征磁盘缓存
+# ==============================
+CACHE_DIR_ENV = "MUSIC_FEATURE_CACHE_DIR"
+CACHE_MAX_MB_ENV = "MUSIC_FEATURE_CACHE_MAX_MB"
+DEFAULT_MAX_MB = 1024
+# 本进程写入量超过 max_bytes 的该比例后，在文件锁内按磁盘重新统计总大小
+RESCAN_FRACTION = 0.05
+
+
+def make_key(content_hash: str, namespace: str, params: dict = None) -> str:
+    """音频内容哈希 + 提取器名 + 参数 → 缓存 key"""
+    payload = json.dumps(
+        {"content": content_hash, "ns": namespace, "params": params or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path) -> str:
+    """模型文件指纹（大小 + mtime），模型更新后旧缓存自动失效"""
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+class FeatureCache:
+    """
+    特征缓存（.npy，按 key 前两位分目录）
+
+    - 写入：临时文件 + os.replace，原子可见，多进程读无需加锁
+    - 命中：更新 mtime，作为 LRU 时间戳
+    - 淘汰：总大小超过 max_bytes 时，在跨进程文件锁内按 mtime 删除最旧条目，
+            直到降到 max_bytes 的 90%
+    - 总大小估计：上次磁盘统计值 + 本进程之后的写入增量（覆盖写只计差值）；
+            本进程写入累计超过 RESCAN_FRACTION × max_bytes 时在文件锁内重新统计磁盘，
+            其他进程的写入因此最迟在这时被计入。N 个进程共用目录时，
+            超出 max_bytes 的部分不超过约 N × RESCAN_FRACTION × max_bytes
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock_path = self.root / ".lock"
+        self._approx_bytes = None
+        self._since_scan = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npy"
+
+    # -------------------------------------------
+    # 读 / 写
+    # -------------------------------------------
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            arr = np.load(path, allow_pickle=False)
+        except (FileNotFoundError, ValueError, OSError):
+            # 不存在 / 正被淘汰 / 写入中断的残缺文件 → 视为未命中
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return arr
+
+    def put(self, key: str, value) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(value), allow_pickle=False)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        delta = path.stat().st_size - old_size
+        if self._approx_bytes is None:
+            self.rescan()
+            return
+        self._approx_bytes += delta
+        self._since_scan += max(delta, 0)
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+        elif self._since_scan > self.max_bytes * RESCAN_FRACTION:
+            self.rescan()
+
+    def get_or_compute(self, key: str, fn):
+        value = self.get(key)
+        if value is None:
+            value = np.asarray(fn())
+            self.put(key, value)
+        return value
+
+    # -------------------------------------------
+    # LRU 淘汰
+    # -------------------------------------------
+    def _entries(self):
+        for path in self.root.glob("*/*.npy"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    @contextmanager
+    def _process_lock(self):
+        with open(self._lock_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def rescan(self) -> None:
+        """在文件锁内按磁盘重新统计总大小（包含其他进程的写入），超限则淘汰"""
+        with self._process_lock():
+            total = self._scan_total()
+            if total > self.max_bytes:
+                self._evict_locked()
+            else:
+                self._approx_bytes = total
+                self._since_scan = 0
+
+    def evict(self) -> None:
+        with self._process_lock():
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except FileNotFoundError:
+                continue
+        self._approx_bytes = total
+        self._since_scan = 0
+
+    def clear(self) -> None:
+        with self._process_lock():
+            for _, _, path in list(self._entries()):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._approx_bytes = 0
+            self._since_scan = 0
+
+
+# ==============================
+# 🔥 全局默认缓存（环境变量开启）
+# ==============================
+_default_cache = None
+_default_loaded = False
+
+
+def get_feature_cache():
+    """
+    MUSIC_FEATURE_CACHE_DIR 未设置时返回 None（不缓存）
+    MUSIC_FEATURE_CACHE_MAX_MB 控制容量，默认 1024MB
+    """
+    global _default_cache, _default_loaded
+    if not _default_loaded:
+        root = os.environ.get(CACHE_DIR_ENV)
+        if root:
+            max_mb = float(os.environ.get(CACHE_MAX_MB_ENV, DEFAULT_MAX_MB))
+            _default_cache = FeatureCache(root, max_bytes=max_mb * 1024 * 1024)
+        _default_loaded = True
+    return _default_cache
+
+
+def set_feature_cache(cache) -> None:
+    """显式指定（或传 None 关闭）全局缓存"""
+    global _default_cache, _default_loaded
+    _default_cache = cache
+    _default_loaded = True
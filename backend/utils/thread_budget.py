@@ -0,0 +1,76 @@
+# backend/utils/thread_budget.py
+#
+# 分析（TF / librosa）与生成（torch）两个阶段的线程预算
+#
+# pipelined 模式下两个阶段同时运行；各自默认都会占满全部核，互相抢占。
+# 这里把 CPU 核数拆成两份：
+#   - 分析：TF intra / inter-op 线程
+#   - 生成：torch.set_num_threads
+# 二者都是进程级设置。TF 在运行时初始化之后不能再修改线程数，
+# 因此应在模型加载之前（FullMusicPipeline 构造时）配置；
+# TF 尚未导入时通过 TF_NUM_INTRAOP_THREADS / TF_NUM_INTEROP_THREADS 环境变量设置，不额外导入 TF。
+#
+# 环境变量 MUSIC_THREAD_BUDGET：
+#   "auto"  按核数对半拆分
+#   "4:8"   分析 4 线程、生成 8 线程
+#   未设置  不修改（各库默认值）
+
+import os
+import sys
+
+THREAD_BUDGET_ENV = "MUSIC_THREAD_BUDGET"
+
+
+def split_thread_budget(total=None, generate_share=0.5):
+    """总线程数 → (analysis_threads, generate_threads)，各至少 1"""
+    total = total or os.cpu_count() or 1
+    generate = min(max(int(round(total * generate_share)), 1), max(total - 1, 1))
+    analysis = max(total - generate, 1)
+    return analysis, generate
+
+
+def resolve_thread_budget(budget=None):
+    """
+    budget: None（读 MUSIC_THREAD_BUDGET）/ "auto" / "a:g" / (a, g)
+    返回 (analysis_threads, generate_threads)；未配置时返回 None
+    """
+    budget = budget if budget is not None else os.environ.get(THREAD_BUDGET_ENV)
+    if not budget:
+        return None
+    if isinstance(budget, (tuple, list)):
+        analysis, generate = budget
+    elif budget == "auto":
+        return split_thread_budget()
+    else:
+        try:
+            analysis, generate = (int(v) for v in str(budget).split(":"))
+        except ValueError:
+            raise ValueError(f"Invalid thread budget: {budget!r} (expected 'auto' or 'A:G')")
+    if analysis < 1 or generate < 1:
+        raise ValueError(f"Invalid thread budget: {budget!r}")
+    return int(analysis), int(generate)
+
+
+def configure_analysis_threads(n):
+    """TF intra / inter-op 线程数；TF 已初始化时无法修改，打印警告后忽略"""
+    if "tensorflow" not in sys.modules:
+        os.environ["TF_NUM_INTRAOP_THREADS"] = str(n)
+        os.environ["TF_NUM_INTEROP_THREADS"] = str(max(min(n, 2), 1))
+        return True
+
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(n)
+        tf.config.threading.set_inter_op_parallelism_threads(max(min(n, 2), 1))
+    except RuntimeError as e:
+        print(f"[ThreadBudget] TF already initialized, analysis threads unchanged ({e})")
+        return False
+    return True
+
+
+def configure_generate_threads(n):
+    """torch intra-op 线程数（进程级，可随时修改）"""
+    import torch
+
+    torch.set_num_threads(n)
@@ -0,0 +1,227 @@
+# backend/utils/tracing.py
+#
+# 轻量 tracing：
+#   with span("generate", attempt=2, tokens=491) as s:
+#       ...
+#       s.set(score=87.5)
+#
+#   @traced("pipeline.process")
+#   def process(...): ...
+#
+# 输出格式（环境变量或 configure() 选择）：
+#   MUSIC_TRACE=trace.json                 → Chrome / Perfetto trace（chrome://tracing、ui.perfetto.dev），
+#                                            JSON Array 格式，每个根 span 结束（或积累 CHROME_FLUSH_EVENTS 个事件）时追加写出，
+#                                            常驻进程（service worker）无需退出即可查看；末尾的 "]" 在关闭时补上，
+#                                            Chrome / Perfetto 允许缺省
+#   MUSIC_TRACE=trace.jsonl                → JSON-lines，每个 span 结束时写一行（含 parent id）
+#   MUSIC_TRACE_FORMAT=chrome|jsonl        → 覆盖按扩展名推断的格式
+# 路径中的 {pid} 会替换为进程号（多 worker 进程各写各的文件）。
+# 未启用时 span() 返回共享的空对象，开销只有一次全局变量判断。
+
+import atexit
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+TRACE_ENV = "MUSIC_TRACE"
+TRACE_FORMAT_ENV = "MUSIC_TRACE_FORMAT"
+TRACE_FORMATS = ("chrome", "jsonl")
+# chrome 格式：未写出的事件达到该数量时即使根 span 未结束也写出
+CHROME_FLUSH_EVENTS = 1000
+
+_current_span = contextvars.ContextVar("music_trace_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "id", "parent", "start", "_token")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent = None
+        self.start = None
+        self._token = None
+
+    def set(self, **attrs):
+        """补充属性（如结束时才知道的 score）"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.id if parent is not None else None
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._record(self, end)
+        return False
+
+
+class Tracer:
+    """
+    收集 span 并写出
+        - chrome：事件先缓存，根 span 结束或缓存达到 CHROME_FLUSH_EVENTS 时追加到文件并清空；
+          close()（进程退出时自动调用）写出剩余事件并补上 "]"
+        - jsonl：每个 span 结束立即追加一行
+    """
+
+    def __init__(self, path, fmt=None):
+        path = str(path).format(pid=os.getpid())
+        if fmt is None:
+            fmt = "jsonl" if path.endswith(".jsonl") else "chrome"
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format: {fmt}")
+
+        self.path = path
+        self.format = fmt
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._written = 0
+        self._pid = os.getpid()
+        # perf_counter 的零点 → 墙钟时间，JSONL 里给出可读时间戳
+        self._t0 = time.perf_counter()
+        self._wall0 = time.time()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if fmt == "jsonl":
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._file.write("[\n")
+            self._file.flush()
+        atexit.register(self.close)
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def _record(self, span, end):
+        if self.format == "jsonl":
+            line = json.dumps({
+                "name": span.name,
+                "id": span.id,
+                "parent": span.parent,
+                "pid": self._pid,
+                "tid": threading.get_ident(),
+                "start": self._wall0 + (span.start - self._t0),
+                "duration": end - span.start,
+                "attrs": span.attrs,
+            }, ensure_ascii=False, default=str)
+            with self._lock:
+                if self._file is not None:
+                    self._file.write(line + "\n")
+            return
+
+        event = {
+            "name": span.name,
+            "ph": "X",
+            "ts": (span.start - self._t0) * 1e6,
+            "dur": (end - span.start) * 1e6,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": span.attrs,
+        }
+        with self._lock:
+            self._pending.append(event)
+            if span.parent is None or len(self._pending) >= CHROME_FLUSH_EVENTS:
+                self._write_pending()
+
+    def _write_pending(self):
+        """追加写出缓存的 chrome 事件（调用方持有 _lock）"""
+        if self._file is None or not self._pending:
+            return
+        for event in self._pending:
+            sep = ",\n" if self._written else ""
+            self._file.write(sep + json.dumps(event, ensure_ascii=False, default=str))
+            self._written += 1
+        self._pending.clear()
+        self._file.flush()
+
+    def flush(self):
+        with self._lock:
+            if self.format == "chrome":
+                self._write_pending()
+            elif self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if self.format == "chrome":
+                self._write_pending()
+                self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+
+# ============================================================
+# 全局 tracer
+# ============================================================
+_tracer = None
+_configured = False
+
+
+def configure(path=None, fmt=None):
+    """
+    显式启用 / 关闭 tracing（path=None 关闭）
+    不调用时第一次 span() 按 MUSIC_TRACE / MUSIC_TRACE_FORMAT 初始化
+    """
+    global _tracer, _configured
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path, fmt) if path else None
+    _configured = True
+    return _tracer
+
+
+def get_tracer():
+    if not _configured:
+        configure(os.environ.get(TRACE_ENV), os.environ.get(TRACE_FORMAT_ENV))
+    return _tracer
+
+
+def span(name, **attrs):
+    """嵌套 span；未启用 tracing 时返回空对象"""
+    tracer = _tracer if _configured else get_tracer()
+    if tracer is None:
+        return _NOOP_SPAN
+    return tracer.span(name, **attrs)
+
+
+def traced(name):
+    """函数级 span 装饰器"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
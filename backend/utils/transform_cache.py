@@ -0,0 +1,202 @@
+# backend/utils/transform_cache.py
+#
+# 单次任务内的频谱变换缓存（STFT / HPSS / chroma_cqt）
+#
+#   with transform_scope():              # FullMusicPipeline.process 整个任务一个 scope
+#       D = stft(y)                      # 同一信号、同一参数只算一次
+#       y_h = harmonic(clip)             # 等价于 librosa.effects.hpss(clip)[0]
+#       y_h = harmonic_slice(y, s, e)    # 整曲 HPSS 后取样本 [s, e)（多个窗口共享一次计算）
+#       chroma = chroma_cqt(y, sr)
+#
+# key = (变换名, 信号身份, sr, 参数)。信号身份取数组的数据指针 / shape / strides / dtype，
+# 条目同时持有该数组的引用，保证 scope 内身份不会被复用。
+# scope 之外调用时直接计算、不缓存；scope 结束即释放。
+# 缓存的数组在各模块间共享，调用方不要原地修改。
+
+import contextlib
+import functools
+import inspect
+import os
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+
+import librosa
+import numpy as np
+
+TRANSFORM_CACHE_MAX_MB_ENV = "MUSIC_TRANSFORM_CACHE_MAX_MB"
+DEFAULT_MAX_MB = 512
+
+_current = ContextVar("music_transform_cache", default=None)
+
+
+def librosa_default(fn, name, fallback):
+    """读取 librosa 函数参数的默认值（不同版本默认值不同时保持一致）"""
+    try:
+        param = inspect.signature(fn).parameters.get(name)
+    except (TypeError, ValueError):
+        return fallback
+    if param is None or param.default is inspect.Parameter.empty:
+        return fallback
+    return param.default
+
+
+# effects.hpss / effects.harmonic 内部 STFT 的 pad_mode（0.10 起为 "constant"）
+HPSS_PAD_MODE = librosa_default(
+    librosa.effects.hpss, "pad_mode", librosa_default(librosa.stft, "pad_mode", "reflect")
+)
+
+
+class TransformCache:
+    """按字节数上限做 LRU 淘汰的内存缓存（线程安全）"""
+
+    def __init__(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = float(os.environ.get(TRANSFORM_CACHE_MAX_MB_ENV, DEFAULT_MAX_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key → (value, source_ref, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, source, fn):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = fn()
+        nbytes = _nbytes(value)
+        if nbytes > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, source, nbytes)
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+def _signal_key(y):
+    y = np.asarray(y)
+    return (y.__array_interface__["data"][0], y.shape, y.strides, y.dtype.str)
+
+
+def _freeze(params):
+    return tuple(sorted((k, v if np.isscalar(v) or v is None else repr(v)) for k, v in params.items()))
+
+
+# ============================================================
+# Scope
+# ============================================================
+@contextlib.contextmanager
+def transform_scope(max_bytes=None):
+    """
+    开启一个任务级缓存；嵌套调用时复用外层 scope
+    退出时清空（只有最外层 scope 退出才释放）
+    """
+    if _current.get() is not None:
+        yield _current.get()
+        return
+
+    cache = TransformCache(max_bytes)
+    token = _current.set(cache)
+    try:
+        yield cache
+    finally:
+        _current.reset(token)
+        cache.clear()
+
+
+def transform_scoped(fn):
+    """函数级 transform_scope 装饰器"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with transform_scope():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def get_transform_cache():
+    return _current.get()
+
+
+def _cached(name, y, sr, params, fn):
+    cache = _current.get()
+    if cache is None:
+        return fn()
+    key = (name, _signal_key(y), sr, _freeze(params))
+    return cache.get_or_compute(key, y, fn)
+
+
+# ============================================================
+# Transforms
+# ============================================================
+def stft(y, n_fft=2048, hop_length=512, center=True, pad_mode=HPSS_PAD_MODE):
+    params = dict(n_fft=n_fft, hop_length=hop_length, center=center, pad_mode=pad_mode)
+    return _cached("stft", y, None, params, lambda: librosa.stft(y, **params))
+
+
+def hpss_stft(y, n_fft=2048, hop_length=512, pad_mode=HPSS_PAD_MODE):
+    """(H, P) 复数 STFT，复用缓存中的 STFT"""
+    params = dict(n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode)
+    return _cached(
+        "hpss_stft", y, None, params,
+        lambda: librosa.decompose.hpss(stft(y, n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode)),
+    )
+
+
+def hpss(y, n_fft=2048, hop_length=512, pad_mode=HPSS_PAD_MODE):
+    """时域 (harmonic, percussive)，等价于 librosa.effects.hpss(y)"""
+    def compute():
+        H, P = hpss_stft(y, n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode)
+        return tuple(
+            librosa.istft(X, n_fft=n_fft, hop_length=hop_length, length=len(y), dtype=y.dtype)
+            for X in (H, P)
+        )
+
+    params = dict(n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode)
+    return _cached("hpss", y, None, params, compute)
+
+
+def harmonic(y, n_fft=2048, hop_length=512, pad_mode=HPSS_PAD_MODE):
+    return hpss(y, n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode)[0]
+
+
+def harmonic_slice(y, start, end, **kwargs):
+    """
+    整曲 harmonic 的 [start, end) 片段
+    与直接对片段做 HPSS 不完全相同：片段边缘的中值滤波带有整曲上下文
+    """
+    return harmonic(y, **kwargs)[start:end]
+
+
+def chroma_cqt(y, sr, **kwargs):
+    return _cached("chroma_cqt", y, sr, kwargs, lambda: librosa.feature.chroma_cqt(y=y, sr=sr, **kwargs))